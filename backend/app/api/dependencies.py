@@ -1,8 +1,40 @@
-from fastapi import Depends
+import secrets
+from typing import Optional
+
+from fastapi import Depends, Header, Request, Response
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.db.database import get_db
 
 def get_database_session(db: Session = Depends(get_db)):
     """Dependency to get database session."""
-    return db
\ No newline at end of file
+    return db
+
+def get_current_user_id(x_user_id: Optional[int] = Header(None)) -> Optional[int]:
+    """
+    Dependency to get the calling user's ID from the X-User-Id header.
+    Returns None for anonymous requests.
+    """
+    return x_user_id
+
+CART_COOKIE = "cart_session"
+CART_COOKIE_MAX_AGE = int(settings.GUEST_CART_TTL)  # seconds an anonymous cart is remembered
+
+def get_guest_token(
+    request: Request,
+    response: Response,
+    user_id: Optional[int] = Depends(get_current_user_id),
+) -> Optional[str]:
+    """
+    Dependency identifying an anonymous client by its cart_session cookie,
+    issuing a new token on the first request. None for identified users.
+    The token alone stores nothing: a cart row is only created on the first write.
+    """
+    if user_id is not None:
+        return None
+    token = request.cookies.get(CART_COOKIE)
+    if not token or len(token) > 64:
+        token = secrets.token_urlsafe(24)
+        response.set_cookie(CART_COOKIE, token, max_age=CART_COOKIE_MAX_AGE, httponly=True, samesite="lax")
+    return token
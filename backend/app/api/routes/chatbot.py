@@ -1,15 +1,20 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from typing import Any, AsyncIterator, Dict, Optional
+import json
 
-from app.services.chatbot_service import chatbot_service
+from app.services.chatbot_service import chatbot_service, DEFAULT_SESSION
 
 router = APIRouter()
 
 class ChatMessage(BaseModel):
     user_message: str
+    user_id: Optional[str] = DEFAULT_SESSION
 
 class ChatResponseModel(BaseModel):
     bot_response: str
+    retrieval_ms: Optional[float] = None
 
 @router.post("/chat", response_model=ChatResponseModel)
 async def chat_with_bot(message: ChatMessage):
@@ -18,13 +23,69 @@ async def chat_with_bot(message: ChatMessage):
         raise HTTPException(status_code=400, detail="Message cannot be empty")
     
     try:
-        response = chatbot_service.get_response(message.user_message)
-        return ChatResponseModel(bot_response=response.response)
+        response = await chatbot_service.aget_response(message.user_message, message.user_id or DEFAULT_SESSION)
+        return ChatResponseModel(bot_response=response.response, retrieval_ms=response.retrieval_ms)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chatbot error: {str(e)}")
 
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class _LimitedStreamingResponse(StreamingResponse):
+    """StreamingResponse that gives back its chat limiter slot however the stream ends."""
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            chatbot_service.limiter.release()
+
+async def stream_chat(request: Request, message: str, session_id: str) -> StreamingResponse:
+    """
+    Stream a chatbot answer as text/event-stream. A chat limiter slot is taken
+    before the response starts, so overload still surfaces as 429/503. The
+    "start" frame is sent before the answer is built so the client sees
+    progress immediately; the answer itself is built in one step and then
+    sent word by word (see ChatbotService.stream_response). When the client
+    disconnects the service generator is closed, which stops sending and
+    keeps the partial answer out of the history.
+    """
+    await chatbot_service.limiter.acquire()
+
+    async def events() -> AsyncIterator[str]:
+        stream = chatbot_service.stream_response(message, session_id)
+        try:
+            yield format_sse("start", {"session_id": session_id})
+            async for event, data in stream:
+                if await request.is_disconnected():
+                    break
+                yield format_sse(event, data)
+        finally:
+            await stream.aclose()
+
+    return _LimitedStreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/chat/stream")
+async def stream_chat_with_bot(message: ChatMessage, request: Request):
+    """Chat with the AI chatbot, streaming the answer as Server-Sent Events."""
+    if not message.user_message or not message.user_message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty")
+    return await stream_chat(request, message.user_message, message.user_id or DEFAULT_SESSION)
+
 @router.delete("/history")
-async def clear_chat_history():
-    """Clear the chat history."""
-    chatbot_service.clear_history()
-    return {"message": "Chat history cleared"}
\ No newline at end of file
+async def clear_chat_history(user_id: Optional[str] = None):
+    """Clear the chat history for one user, or for everyone when no user_id is given."""
+    chatbot_service.clear_history(user_id)
+    return {"message": "Chat history cleared"}
+
+@router.get("/stats")
+async def get_chat_stats():
+    """Get chatbot retrieval and history statistics."""
+    return chatbot_service.stats()
\ No newline at end of file
@@ -1,21 +1,36 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 
+from app.api.dependencies import get_current_user_id
 from app.models.order import Order
 from app.schemas.order import OrderCreate, OrderUpdate, Order as OrderSchema
-from app.services.order_service import OrderService
-from app.db.database import get_db
+from app.services.order_service import AsyncOrderService
+from app.db.routing import get_read_db, get_write_db
 
 router = APIRouter()
 
 @router.get("/", response_model=List[OrderSchema])
-async def get_orders(db: Session = Depends(get_db)):
-    """Get all orders with error handling."""
+async def get_orders(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    user_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Get a page of orders (newest first) with their items.
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
     try:
-        order_service = OrderService(db)
-        return order_service.get_orders()
+        order_service = AsyncOrderService(db)
+        orders, next_cursor = await order_service.get_orders_page(limit=limit, cursor=cursor, user_id=user_id)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return orders
+    except HTTPException:
+        raise
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=500, 
@@ -28,11 +43,11 @@ async def get_orders(db: Session = Depends(get_db)):
         )
 
 @router.get("/{order_id}", response_model=OrderSchema)
-async def get_order(order_id: int, db: Session = Depends(get_db)):
+async def get_order(order_id: int, db: AsyncSession = Depends(get_read_db)):
     """Get a specific order by ID."""
     try:
-        order_service = OrderService(db)
-        order = order_service.get_order(order_id)
+        order_service = AsyncOrderService(db)
+        order = await order_service.get_order(order_id)
         if not order:
             raise HTTPException(status_code=404, detail=f"Order with ID {order_id} not found")
         return order
@@ -50,11 +65,17 @@ async def get_order(order_id: int, db: Session = Depends(get_db)):
         )
 
 @router.post("/", response_model=OrderSchema, status_code=201)
-async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
-    """Create a new order."""
+async def create_order(
+    order: OrderCreate,
+    caller_id: Optional[int] = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_write_db),
+):
+    """Create a new order, using up the calling user's cart holds (X-User-Id)."""
     try:
-        order_service = OrderService(db)
-        return order_service.create_order(order)
+        order_service = AsyncOrderService(db)
+        return await order_service.create_order(order, caller_id)
+    except HTTPException:
+        raise
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=500, 
@@ -67,11 +88,11 @@ async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
         )
 
 @router.put("/{order_id}", response_model=OrderSchema)
-async def update_order(order_id: int, order: OrderUpdate, db: Session = Depends(get_db)):
+async def update_order(order_id: int, order: OrderUpdate, db: AsyncSession = Depends(get_write_db)):
     """Update an order."""
     try:
-        order_service = OrderService(db)
-        updated_order = order_service.update_order(order_id, order)
+        order_service = AsyncOrderService(db)
+        updated_order = await order_service.update_order(order_id, order)
         if not updated_order:
             raise HTTPException(status_code=404, detail=f"Order with ID {order_id} not found")
         return updated_order
@@ -89,11 +110,11 @@ async def update_order(order_id: int, order: OrderUpdate, db: Session = Depends(
         )
 
 @router.delete("/{order_id}")
-async def delete_order(order_id: int, db: Session = Depends(get_db)):
+async def delete_order(order_id: int, db: AsyncSession = Depends(get_write_db)):
     """Delete an order."""
     try:
-        order_service = OrderService(db)
-        result = order_service.delete_order(order_id)
+        order_service = AsyncOrderService(db)
+        result = await order_service.delete_order(order_id)
         if not result:
             raise HTTPException(status_code=404, detail=f"Order with ID {order_id} not found")
         return {"message": "Order deleted successfully", "order_id": order_id}
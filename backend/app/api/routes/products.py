@@ -1,23 +1,82 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import JSONResponse
-from typing import List
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Literal, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
 
 from app.models.product import Product
 from app.schemas.product import ProductCreate, ProductUpdate, Product as ProductSchema
-from app.services.product_service import ProductService
-from app.db.database import get_db
+from app.services.product_service import (
+    AsyncProductService, EXPORT_BATCH_SIZE, IMPORT_BATCH_SIZE, catalog_payloads, catalog_version,
+    stock_dependents, stock_items,
+)
+from app.config import settings
+from app.db.routing import from_replica, get_read_db, get_write_db, replica_router
+from app.utils.bulk_io import MEDIA_TYPES, detect_format, iter_lines, iter_records
+from app.utils.compression import CachedPayload
+from app.utils.http_cache import is_not_modified, last_modified, make_etag, not_modified, validator_headers
+from app.utils.serialization import dump_products
 
 router = APIRouter()
 
+def _render(content) -> bytes:
+    """Serialize validated schema objects the same way response_model would."""
+    return JSONResponse(jsonable_encoder(content)).body
+
+def _render_products(products) -> bytes:
+    """Render a product listing, through orjson when FAST_JSON is on (same bytes)."""
+    if settings.FAST_JSON:
+        body = dump_products(products)
+        if body is not None:
+            return body
+    return _render([ProductSchema(**p) for p in products])
+
 @router.get("/", response_model=List[ProductSchema])
-async def get_products(db: Session = Depends(get_db)):
-    """Get all products with error handling."""
+async def get_products(
+    request: Request,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Literal["id", "price"] = "id",
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: bool = False,
+    name_prefix: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Get a page of products with error handling.
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    Supports If-None-Match: an unchanged page is answered with an empty 304.
+    The rendered page (and its gzip/brotli variants) is cached per catalog
+    version, so repeat requests skip serialization and compression.
+    """
     try:
-        product_service = ProductService(db)
-        products = product_service.get_products()
-        return products
+        key = ("page", catalog_version.value, limit, cursor, sort,
+               min_price, max_price, in_stock, name_prefix)
+        payload = catalog_payloads.get(key)
+        if payload is None:
+            generation = stock_dependents.generation
+            product_service = AsyncProductService(db)
+            products, next_cursor = await product_service.get_product_page(
+                limit=limit,
+                cursor=cursor,
+                sort=sort,
+                min_price=min_price,
+                max_price=max_price,
+                in_stock=in_stock,
+                name_prefix=name_prefix,
+            )
+            payload = CachedPayload(
+                _render_products(products),
+                make_etag(products, next_cursor),
+                headers={"X-Next-Cursor": next_cursor} if next_cursor else None,
+            )
+            if not from_replica(db):
+                stock_dependents.store(catalog_payloads, key, payload, stock_items(products, in_stock), generation)
+        return payload.response(request)
+    except HTTPException:
+        raise
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=500, 
@@ -29,15 +88,103 @@ async def get_products(db: Session = Depends(get_db)):
             detail=f"Unexpected error while fetching products: {str(e)}"
         )
 
+@router.get("/search", response_model=List[ProductSchema])
+async def search_products(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Full-text search products by name and description."""
+    try:
+        product_service = AsyncProductService(db)
+        products = await product_service.search_products(q, limit=limit, offset=offset)
+        etag = make_etag(products)
+        if is_not_modified(request, etag):
+            return not_modified(etag)
+        return Response(_render_products(products), media_type="application/json",
+                        headers=validator_headers(etag))
+    except SQLAlchemyError as e:
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Database error while searching products: {str(e)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, 
+            detail=f"Unexpected error while searching products: {str(e)}"
+        )
+
+@router.post("/import", response_model=dict)
+async def import_products(
+    request: Request,
+    format: Optional[Literal["ndjson", "csv"]] = None,
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=10000),
+    db: AsyncSession = Depends(get_write_db),
+):
+    """
+    Bulk import products from an NDJSON or CSV request body (format taken
+    from the Content-Type unless given). The body is parsed as it streams in
+    and inserted in batches; the summary lists the rows that were rejected.
+    """
+    fmt = format or detect_format(request.headers.get("content-type"))
+    try:
+        product_service = AsyncProductService(db)
+        records = iter_records(iter_lines(request.stream()), fmt)
+        return await product_service.import_products(records, batch_size=batch_size)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Unexpected error while importing products: {str(e)}"
+        )
+
+@router.get("/export")
+async def export_products(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=10000),
+):
+    """Stream the whole catalog as NDJSON or CSV."""
+    async def rows():
+        # The stream outlives the request handler, so it owns its session
+        async with replica_router.session() as session:
+            async for chunk in AsyncProductService(session).export_products(format, batch_size):
+                yield chunk
+
+    return StreamingResponse(
+        rows(),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="products.{format}"'},
+    )
+
+@router.get("/cache/stats", response_model=dict)
+async def get_product_cache_stats():
+    """Get product cache hit/miss/eviction counters."""
+    return AsyncProductService.cache_stats()
+
 @router.get("/{product_id}", response_model=ProductSchema)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
-    """Get a specific product by ID with error handling."""
+async def get_product(product_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
+    """
+    Get a specific product by ID with error handling.
+    Supports If-None-Match / If-Modified-Since with 304 responses; the
+    rendered body is cached per catalog version like the listing.
+    """
     try:
-        product_service = ProductService(db)
-        product = product_service.get_product(product_id)
-        if not product:
-            raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
-        return product
+        key = ("product", catalog_version.value, product_id)
+        payload = catalog_payloads.get(key)
+        if payload is None:
+            generation = stock_dependents.generation
+            product_service = AsyncProductService(db)
+            product = await product_service.get_product(product_id)
+            if not product:
+                raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
+            payload = CachedPayload(
+                _render(ProductSchema(**product)), make_etag([product]), last_modified(product))
+            if not from_replica(db):
+                stock_dependents.store(catalog_payloads, key, payload, [product_id], generation)
+        return payload.response(request)
     except HTTPException:
         raise
     except SQLAlchemyError as e:
@@ -52,11 +199,11 @@ async def get_product(product_id: int, db: Session = Depends(get_db)):
         )
 
 @router.post("/", response_model=ProductSchema, status_code=201)
-async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
+async def create_product(product: ProductCreate, db: AsyncSession = Depends(get_write_db)):
     """Create a new product with error handling."""
     try:
-        product_service = ProductService(db)
-        return product_service.create_product(product)
+        product_service = AsyncProductService(db)
+        return await product_service.create_product(product)
     except SQLAlchemyError as e:
         raise HTTPException(
             status_code=500, 
@@ -69,11 +216,11 @@ async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
         )
 
 @router.put("/{product_id}", response_model=ProductSchema)
-async def update_product(product_id: int, product: ProductUpdate, db: Session = Depends(get_db)):
+async def update_product(product_id: int, product: ProductUpdate, db: AsyncSession = Depends(get_write_db)):
     """Update a product with error handling."""
     try:
-        product_service = ProductService(db)
-        updated_product = product_service.update_product(product_id, product)
+        product_service = AsyncProductService(db)
+        updated_product = await product_service.update_product(product_id, product)
         if not updated_product:
             raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
         return updated_product
@@ -90,15 +237,18 @@ async def update_product(product_id: int, product: ProductUpdate, db: Session =
             detail=f"Unexpected error while updating product: {str(e)}"
         )
 
-@router.delete("/{product_id}", status_code=200)
-async def delete_product(product_id: int, db: Session = Depends(get_db)):
+@router.delete("/{product_id}", status_code=204)
+async def delete_product(product_id: int, response: Response, db: AsyncSession = Depends(get_write_db)):
     """Delete a product with error handling."""
     try:
-        product_service = ProductService(db)
-        result = product_service.delete_product(product_id)
+        product_service = AsyncProductService(db)
+        result = await product_service.delete_product(product_id)
         if not result:
             raise HTTPException(status_code=404, detail=f"Product with ID {product_id} not found")
-        return {"message": "Product deleted successfully", "product_id": product_id}
+        # Answer on the injected response so headers set by dependencies
+        # (the read-your-writes cookie from get_write_db) are kept
+        response.status_code = 204
+        return None
     except HTTPException:
         raise
     except SQLAlchemyError as e:
@@ -1,18 +1,19 @@
 from fastapi import APIRouter, HTTPException, Depends
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.schemas.user import User, UserCreate
 from app.models.user import User as UserModel
-from app.db.database import get_db
+from app.db.database import get_async_db
 
 router = APIRouter()
 
 @router.post("/", response_model=User, status_code=201)
-async def create_user(user: UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new user."""
     # Check if user already exists
-    existing_user = db.query(UserModel).filter(UserModel.email == user.email).first()
+    existing_user = await db.scalar(select(UserModel).where(UserModel.email == user.email))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -22,29 +23,29 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
         hashed_password=user.password  # In production, hash the password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.get("/", response_model=List[User])
-async def get_users(db: Session = Depends(get_db)):
+async def get_users(db: AsyncSession = Depends(get_async_db)):
     """Get all users."""
-    return db.query(UserModel).all()
+    return (await db.scalars(select(UserModel))).all()
 
 @router.get("/{user_id}", response_model=User)
-async def get_user(user_id: int, db: Session = Depends(get_db)):
+async def get_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a specific user by ID."""
-    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    user = await db.get(UserModel, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @router.delete("/{user_id}")
-async def delete_user(user_id: int, db: Session = Depends(get_db)):
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete a user."""
-    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    user = await db.get(UserModel, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(user)
-    db.commit()
-    return {"message": "User deleted successfully"}
\ No newline at end of file
+    await db.delete(user)
+    await db.commit()
+    return {"message": "User deleted successfully"}
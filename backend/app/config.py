@@ -1,11 +1,64 @@
-from pydantic import BaseSettings
+from typing import List, Optional
+
+try:
+    from pydantic import BaseSettings
+except ImportError:  # pydantic v2 moved BaseSettings into pydantic-settings
+    from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
-    DATABASE_URL: str
-    SECRET_KEY: str
-    AI_MODEL: str
+    DATABASE_URL: str = "sqlite:///./test.db"
+    SECRET_KEY: Optional[str] = None
+    AI_MODEL: Optional[str] = None
+
+    # Engine / connection pool (pool sizing doesn't apply to in-memory SQLite)
+    DB_POOL_SIZE: int = 5  # connections kept open per engine
+    DB_MAX_OVERFLOW: int = 10  # extra connections opened under load, closed when returned
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds before a connection is replaced; -1 never
+    DB_POOL_PRE_PING: bool = True  # test connections on checkout (survives server restarts)
+    DB_QUERY_CACHE_SIZE: int = 500  # SQLAlchemy's compiled statement cache, per engine
+
+    # Read replicas (comma-separated URLs); catalog/order reads use the primary when empty
+    DATABASE_REPLICA_URLS: str = ""
+    REPLICA_SELECTION: str = "round_robin"  # or "least_loaded"
+    READ_YOUR_WRITES_SECONDS: float = 5.0  # a client's reads stay on the primary this long after its write
+
+    # SQLite connection pragmas (empty / 0 leaves the SQLite default)
+    SQLITE_JOURNAL_MODE: str = "WAL"  # readers no longer block behind a writer
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # safe with WAL; fsync at checkpoints only
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024  # bytes of the file read through mmap
+    SQLITE_CACHE_SIZE: int = -64 * 1024  # page cache per connection; negative means KiB
+    SQLITE_BUSY_TIMEOUT: float = 5.0  # seconds a writer waits for the lock before failing
+    SQLITE_STATEMENT_CACHE_SIZE: int = 256  # prepared statements kept per connection
+
+    # Query diagnostics (off by default)
+    SLOW_QUERY_MS: Optional[float] = None  # log statements slower than this, with their plan
+    N_PLUS_ONE_THRESHOLD: Optional[int] = None  # warn when a request repeats one statement this often
+
+    # Serialize catalog listings with orjson instead of per-row pydantic validation
+    FAST_JSON: bool = False
+
+    # Cart stock reservations
+    STOCK_RESERVATION_TTL: float = 900.0  # seconds a cart holds its items' stock
+    RESERVATION_SWEEP_INTERVAL: float = 30.0  # seconds between releases of expired holds
+
+    # Anonymous carts
+    GUEST_CART_TTL: float = 30 * 24 * 3600.0  # seconds a guest cart is kept after its last change
+    GUEST_CART_SWEEP_INTERVAL: float = 3600.0  # seconds between deletions of idle guest carts
+
+    # Chatbot
+    CHAT_RESPONSE_CACHE_SIZE: int = 1024  # memoized answers; 0 disables the cache
+    CHAT_MAX_IN_FLIGHT: int = 4  # answers generated concurrently
+    CHAT_MAX_QUEUE: int = 16  # requests allowed to wait for a slot; more get 429
+    CHAT_QUEUE_TIMEOUT: float = 5.0  # seconds a request may wait before a 503
+    CHAT_INDEX_REFRESH_INTERVAL: float = 5.0  # seconds between checks for catalog changes made by other workers
 
     class Config:
         env_file = ".env"
+        extra = "ignore"
+
+    @property
+    def replica_urls(self) -> List[str]:
+        return [url.strip() for url in self.DATABASE_REPLICA_URLS.split(",") if url.strip()]
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
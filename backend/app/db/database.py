@@ -1,12 +1,103 @@
-from sqlalchemy import create_engine
+from typing import Any, Dict
+
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-DATABASE_URL = "sqlite:///./test.db"  # Update with your database URL
+from app.config import settings
+
+DATABASE_URL = settings.DATABASE_URL  # set DATABASE_URL in the environment or .env
+
+# Async drivers used for each sync backend when no driver is given explicitly
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def to_async_url(url: str) -> str:
+    """Map a sync database URL onto its async driver (e.g. sqlite -> sqlite+aiosqlite)."""
+    parsed = make_url(url)
+    if "+" in parsed.drivername:
+        backend, driver = parsed.drivername.split("+", 1)
+        if driver in ("aiosqlite", "asyncpg"):
+            return url
+    else:
+        backend = parsed.drivername
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend}'")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+def engine_options(url: str) -> Dict[str, Any]:
+    """create_engine() keyword arguments for `url`, taken from Settings."""
+    parsed = make_url(url)
+    options: Dict[str, Any] = {
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "query_cache_size": settings.DB_QUERY_CACHE_SIZE,
+    }
+    if parsed.get_backend_name() == "sqlite":
+        options["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": settings.SQLITE_BUSY_TIMEOUT,
+            "cached_statements": settings.SQLITE_STATEMENT_CACHE_SIZE,
+        }
+        if _is_memory_sqlite(parsed):
+            return options  # one shared connection; there is no pool to size
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+    )
+    return options
+
+def sqlite_pragmas() -> Dict[str, Any]:
+    """Per-connection SQLite pragmas from Settings; unset ones keep SQLite's default."""
+    pragmas = {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+    }
+    return {name: value for name, value in pragmas.items() if value}
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in sqlite_pragmas().items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+def _configure(engine: Engine) -> None:
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+
+def create_db_engine(url: str = DATABASE_URL) -> Engine:
+    """Sync engine for `url`, with pool settings and SQLite pragmas from Settings."""
+    engine = create_engine(url, **engine_options(url))
+    _configure(engine)
+    return engine
+
+def create_async_db_engine(url: str = DATABASE_URL) -> AsyncEngine:
+    """Async counterpart of create_db_engine (the URL is mapped onto its async driver)."""
+    async_url = to_async_url(url)
+    engine = create_async_engine(async_url, **engine_options(async_url))
+    _configure(engine.sync_engine)
+    return engine
+
+engine = create_db_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_db_engine()
+AsyncSessionLocal = sessionmaker(
+    bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 def get_db():
@@ -14,4 +105,41 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def init_db(bind: Engine = engine):
+    """Create missing tables, columns and indexes."""
+    import app.models  # noqa: F401 - register all models on Base.metadata
+    from app.db.search import create_search_index
+
+    Base.metadata.create_all(bind=bind)
+    # Existing tables may predate some columns; add them before indexing them
+    _add_missing_columns(bind)
+    # create_all() skips existing tables, so add indexes introduced later explicitly
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    create_search_index(bind)
+
+def _add_missing_columns(bind: Engine = engine):
+    """
+    Add columns introduced after a table was first created (there are no migrations).
+    Only nullable columns or columns with a server default can be added this way.
+    """
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or column.primary_key:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(bind.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                conn.execute(text(ddl))
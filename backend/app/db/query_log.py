@@ -0,0 +1,134 @@
+"""
+Opt-in query diagnostics for the SQLAlchemy engines.
+
+- Slow-query log: statements slower than a threshold are logged together with
+  their EXPLAIN QUERY PLAN (EXPLAIN on other databases).
+- N+1 detector: within one request, a statement shape (the SQL text with
+  bound parameters, so the same query for different ids counts as one shape)
+  executed at least N times is logged as a likely lazy-load loop.
+- Query budgets for tests: `capture_queries` / `assert_query_budget` collect
+  every statement run on the given engines while the block executes.
+
+The first two reuse the request metrics' statement timing and per-request
+counters (app/utils/metrics.py) rather than hooking the engines again.
+"""
+
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.utils.metrics import RequestStats, add_query_observer
+
+logger = logging.getLogger(__name__)
+
+
+class QueryLog:
+    """Statements executed while a capture_queries block runs."""
+
+    def __init__(self):
+        self.queries: List[Tuple[str, float]] = []
+
+    def record(self, statement: str, duration: float) -> None:
+        self.queries.append((statement, duration))
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    @property
+    def statements(self) -> List[str]:
+        return [statement for statement, _ in self.queries]
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statement shapes executed at least `threshold` times, most frequent first."""
+        counts = Counter(self.statements)
+        return [(statement, count) for statement, count in counts.most_common() if count >= threshold]
+
+
+def _explain(conn, statement: str, parameters) -> str:
+    """Query plan for `statement`, run straight on the DBAPI connection so no events fire."""
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(" ".join(str(column) for column in row) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def enable_query_log(engine: Engine, slow_query_ms: float) -> None:
+    """
+    Log statements on `engine` slower than `slow_query_ms` with their plan.
+    Durations come from the metrics instrumentation (see instrument_engine).
+    For async engines pass `async_engine.sync_engine`.
+    """
+
+    def log_slow_query(conn, statement, parameters, executemany, duration):
+        if duration * 1000 < slow_query_ms:
+            return
+        plan = ""
+        if not executemany and statement.lstrip()[:6].upper() in ("SELECT", "WITH"):
+            try:
+                plan = _explain(conn, statement, parameters)
+            except Exception as e:  # diagnostics must never break the query itself
+                plan = f"(EXPLAIN failed: {e})"
+        logger.warning("Slow query (%.1f ms): %s\nparameters: %r\nplan:\n%s",
+                       duration * 1000, statement, parameters, plan)
+
+    add_query_observer(engine, log_slow_query)
+
+
+class NPlusOneDetector:
+    """
+    MetricsMiddleware request observer warning when one statement shape ran
+    `threshold` times or more during a request.
+    """
+
+    def __init__(self, threshold: int = 10):
+        self.threshold = threshold
+
+    def __call__(self, scope, stats: RequestStats) -> None:
+        for statement, count in stats.repeated(self.threshold):
+            logger.warning("Possible N+1: %s %s ran the same statement %d times "
+                           "(%d queries in the request): %s",
+                           scope["method"], scope["path"], count, stats.queries, statement)
+
+
+@contextmanager
+def capture_queries(*engines: Engine) -> Iterator[QueryLog]:
+    """Collect every statement executed on `engines` inside the block, from any thread."""
+    query_log = QueryLog()
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        query_log.record(statement, 0.0)
+
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before)
+    try:
+        yield query_log
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", before)
+
+
+@contextmanager
+def assert_query_budget(max_queries: int, *engines: Engine,
+                        max_repeats: Optional[int] = None) -> Iterator[QueryLog]:
+    """
+    Fail with the offending statements when the block runs more than
+    `max_queries` statements, or any one statement more than `max_repeats` times.
+    """
+    with capture_queries(*engines) as query_log:
+        yield query_log
+    listing = "\n".join(f"  {i + 1}. {statement}" for i, statement in enumerate(query_log.statements))
+    if len(query_log) > max_queries:
+        raise AssertionError(f"Expected at most {max_queries} queries, got {len(query_log)}:\n{listing}")
+    if max_repeats is not None:
+        repeated = query_log.repeated(max_repeats + 1)
+        if repeated:
+            statement, count = repeated[0]
+            raise AssertionError(
+                f"Statement ran {count} times (limit {max_repeats}), likely an N+1:\n  {statement}")
@@ -0,0 +1,172 @@
+"""
+Read/write session routing for read replicas.
+
+Routes declare what they do with the database:
+
+- `get_write_db` always yields a session on the primary. When replicas are
+  configured it also sets a short-lived cookie on the response, so the same
+  client's reads stick to the primary for READ_YOUR_WRITES_SECONDS and see
+  their own writes despite replication lag.
+- `get_read_db` yields a session on a replica picked round-robin or by
+  fewest sessions in flight, or on the primary when no replicas are
+  configured or the client wrote recently.
+
+Only reads on the primary fill the process-local catalog caches (see
+`from_replica`). A lagging replica's rows are served to the request that
+read them and then dropped, so a cached entry is never older than the
+primary was when it was loaded, and a client reading back its own write
+from the cache gets what it wrote.
+
+Replicas are listed in DATABASE_REPLICA_URLS. Locally they can be file copies
+of the SQLite primary; `python -m app.db.routing` refreshes them.
+"""
+
+import itertools
+import math
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.config import settings
+from app.db.database import DATABASE_URL, AsyncSessionLocal, create_async_db_engine
+
+REPLICA_SELECTIONS = ("round_robin", "least_loaded")
+STICKY_COOKIE = "db_primary_until"
+
+
+def _query_only(dbapi_connection, connection_record):
+    # SQLite replicas are plain file copies; refuse writes rather than letting them diverge
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA query_only=ON")
+    finally:
+        cursor.close()
+
+
+class Replica:
+    def __init__(self, url: str):
+        self.url = url
+        self.engine = create_async_db_engine(url)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine.sync_engine, "connect", _query_only)
+        self.session_factory = sessionmaker(
+            bind=self.engine, class_=AsyncSession, autoflush=False, expire_on_commit=False,
+            info={"replica": True},
+        )
+        self.in_flight = 0  # open sessions; only touched from the event loop
+        self.sessions = 0
+
+    def __repr__(self):
+        return f"<Replica({make_url(self.url).render_as_string(hide_password=True)}, in_flight={self.in_flight})>"
+
+
+class ReplicaRouter:
+    """Picks the replica for each read session; falls back to the primary when there are none."""
+
+    def __init__(self, urls: List[str], selection: str = "round_robin"):
+        if selection not in REPLICA_SELECTIONS:
+            raise ValueError(f"Unknown replica selection '{selection}', expected one of {REPLICA_SELECTIONS}")
+        self.selection = selection
+        self.replicas = [Replica(url) for url in urls]
+        self._turn = itertools.count()
+
+    def choose(self) -> Optional[Replica]:
+        if not self.replicas:
+            return None
+        start = next(self._turn) % len(self.replicas)
+        if self.selection == "round_robin":
+            return self.replicas[start]
+        # Least loaded; ties rotate so idle replicas share the traffic
+        rotated = self.replicas[start:] + self.replicas[:start]
+        return min(rotated, key=lambda replica: replica.in_flight)
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        """A read session on the chosen replica (or on the primary)."""
+        replica = self.choose()
+        if replica is None:
+            async with AsyncSessionLocal() as db:
+                yield db
+            return
+        replica.in_flight += 1
+        replica.sessions += 1
+        try:
+            async with replica.session_factory() as db:
+                yield db
+        finally:
+            replica.in_flight -= 1
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+
+def from_replica(db: AsyncSession) -> bool:
+    """True for sessions on a replica, whose possibly lagging rows must not fill the shared caches."""
+    return db.info.get("replica", False)
+
+
+replica_router = ReplicaRouter(settings.replica_urls, settings.REPLICA_SELECTION)
+
+
+def _recently_wrote(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+async def get_write_db(response: Response):
+    """Session on the primary for routes that write."""
+    if replica_router.replicas and settings.READ_YOUR_WRITES_SECONDS > 0:
+        window = settings.READ_YOUR_WRITES_SECONDS
+        response.set_cookie(STICKY_COOKIE, f"{time.time() + window:.3f}",
+                            max_age=math.ceil(window), httponly=True, samesite="lax")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_read_db(request: Request):
+    """Session on a replica for read-only routes (the primary right after the client's own write)."""
+    if _recently_wrote(request):
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    async with replica_router.session() as db:
+        yield db
+
+
+def refresh_sqlite_replicas(primary_url: str = DATABASE_URL, replica_urls: Optional[List[str]] = None) -> List[str]:
+    """
+    Copy the SQLite primary onto every SQLite replica file with the online
+    backup API (consistent even while the app is writing). Returns the paths.
+    """
+    source_path = make_url(primary_url).database
+    paths = []
+    for url in settings.replica_urls if replica_urls is None else replica_urls:
+        parsed = make_url(url)
+        if parsed.get_backend_name() != "sqlite" or not parsed.database or parsed.database == source_path:
+            continue
+        source, target = sqlite3.connect(source_path), sqlite3.connect(parsed.database)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        paths.append(parsed.database)
+    return paths
+
+
+if __name__ == "__main__":
+    copied = refresh_sqlite_replicas()
+    if not copied:
+        print("No SQLite replicas in DATABASE_REPLICA_URLS")
+    for path in copied:
+        print(f"Refreshed replica {path} from {make_url(DATABASE_URL).database}")
@@ -0,0 +1,87 @@
+"""
+SQLite FTS5 index over product name/description.
+
+The index is an external-content FTS5 table kept in sync with `products` by
+triggers, so every write updates only the affected rows.
+"""
+
+import re
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+FTS_TABLE = "products_fts"
+FTS_INSERT_TRIGGER = "products_fts_ai"
+
+_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_INSERT_TRIGGER} AFTER INSERT ON products BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_available(engine: Engine) -> bool:
+    """FTS5 is only used on SQLite."""
+    return engine.dialect.name == "sqlite"
+
+
+def create_search_index(engine: Engine) -> None:
+    """Create the FTS table and sync triggers; backfill once if the table is new."""
+    if not fts_available(engine):
+        return
+    existed = inspect(engine).has_table(FTS_TABLE)
+    with engine.begin() as conn:
+        for statement in _DDL:
+            conn.execute(text(statement))
+        if not existed:
+            # One-time backfill for databases created before the index existed
+            conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def rebuild_search_index(engine: Engine) -> None:
+    """Re-index every product from scratch (faster than the triggers after a bulk load)."""
+    if not fts_available(engine):
+        return
+    with engine.begin() as conn:
+        conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+
+
+def search_terms(query: str) -> List[str]:
+    """Split a user query into plain word tokens."""
+    return _TOKEN_RE.findall(query.lower())
+
+
+def build_match_query(query: str) -> str:
+    """
+    Turn free text into an FTS5 MATCH expression.
+    Every token is quoted (so FTS operators in user input are inert) and
+    prefix-matched; tokens are ANDed together.
+    """
+    return " ".join(f'"{term}"*' for term in search_terms(query))
@@ -3,22 +3,22 @@ Database seeding script for Phone E-commerce App.
 Inserts dummy phone products for testing and RAG chatbot functionality.
 """
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, select, text
 import os
+import random
 import sys
+import time
 
-# Add parent directory to path for imports
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Add the backend directory to path so `app` is importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
-from models.product import Product, Base
-from models.user import User, Base as UserBase
-
-# Database URL - use environment variable or default to SQLite
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./phone_ecommerce.db")
-
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from app.db.database import SessionLocal, engine, init_db
+from app.db.search import FTS_INSERT_TRIGGER, create_search_index, rebuild_search_index
+from app.models.cart import Cart, CartItem, StockReservation
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.models.user import User
 
 # Sample phone products for seeding
 PHONE_PRODUCTS = [
@@ -117,8 +117,7 @@ SAMPLE_USERS = [
 def create_tables():
     """Create all database tables."""
     print("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
-    UserBase.metadata.create_all(bind=engine)
+    init_db(bind=engine)
     print("Tables created successfully!")
 
 
@@ -189,12 +188,220 @@ def list_products(db):
 def clear_database(db):
     """Clear all data from the database (use with caution)."""
     print("Clearing database...")
-    db.query(Product).delete()
-    db.query(User).delete()
+    for model in (OrderItem, Order, StockReservation, CartItem, Cart, Product, User):
+        db.query(model).delete()
     db.commit()
     print("Database cleared!")
 
 
+# --- Scale mode: reproducible synthetic dataset for performance work ---
+
+# Rows generated per unit of --scale (scale 1 is roughly 300k rows in total)
+SCALE_BASE = {
+    "products": 100_000,
+    "users": 10_000,
+    "carts": 5_000,
+    "orders": 50_000,
+}
+SCALE_BATCH_SIZE = 10_000
+# Fixed anchor so order timestamps don't depend on when the seeder runs
+SCALE_EPOCH = datetime(2024, 1, 1)
+
+BRANDS = {
+    "Apple": ["iPhone", "iPhone Pro", "iPhone Pro Max", "iPhone Plus", "iPhone mini"],
+    "Samsung": ["Galaxy S", "Galaxy S Ultra", "Galaxy A", "Galaxy Z Fold", "Galaxy Z Flip"],
+    "Google": ["Pixel", "Pixel Pro", "Pixel a", "Pixel Fold"],
+    "OnePlus": ["OnePlus", "OnePlus Nord", "OnePlus Open"],
+    "Xiaomi": ["Xiaomi", "Xiaomi Ultra", "Redmi Note", "POCO F"],
+    "Sony": ["Xperia 1", "Xperia 5", "Xperia 10"],
+    "Nothing": ["Phone", "Phone a"],
+    "Motorola": ["Edge", "Razr", "Moto G"],
+}
+COLORS = ["Black", "White", "Blue", "Green", "Titanium", "Pink", "Silver", "Graphite"]
+STORAGE = [64, 128, 256, 512, 1024]
+FEATURES = [
+    "a 120Hz OLED display", "a 50MP main camera", "5x optical zoom", "fast wired charging",
+    "wireless charging", "a 5000mAh battery", "IP68 water resistance", "a titanium frame",
+    "7 years of updates", "stereo speakers", "a periscope telephoto lens", "satellite SOS",
+]
+ORDER_STATUSES = ["pending", "paid", "shipped", "delivered", "cancelled"]
+ORDER_STATUS_WEIGHTS = [10, 15, 20, 50, 5]
+
+
+def scale_counts(scale: float):
+    """Row counts for each generated table at the given scale."""
+    return {name: max(1, int(count * scale)) for name, count in SCALE_BASE.items()}
+
+
+def _tune_for_load(dbapi_connection, connection_record):
+    """
+    SQLite pragmas trading durability for load speed. A crash mid-load can
+    corrupt the file, which is fine for a throwaway benchmark database.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=MEMORY")
+    cursor.execute("PRAGMA synchronous=OFF")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-262144")  # 256 MiB
+    cursor.close()
+
+
+def _next_id(conn, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _bulk_insert(conn, model, rows, batch_size: int) -> int:
+    """executemany INSERT of `rows` (any iterable) in batches; returns the row count."""
+    table = model.__table__
+    batch, count = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.execute(table.insert(), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        conn.execute(table.insert(), batch)
+        count += len(batch)
+    return count
+
+
+def _products(rng: random.Random, first_id: int, count: int, prices: list):
+    brands = list(BRANDS)
+    for product_id in range(first_id, first_id + count):
+        brand = rng.choice(brands)
+        series = rng.choice(BRANDS[brand])
+        storage = rng.choice(STORAGE)
+        color = rng.choice(COLORS)
+        price = round(rng.uniform(99, 1999) + storage * 0.25, 2)
+        prices.append(price)
+        features = ", ".join(rng.sample(FEATURES, 3))
+        yield {
+            "id": product_id,
+            "name": f"{brand} {series} {rng.randint(5, 16)} {storage}GB {color}",
+            "description": f"{brand} {series} in {color} with {storage}GB of storage, featuring {features}.",
+            "price": price,
+            "stock": 0 if rng.random() < 0.05 else rng.randint(1, 500),
+            "image_url": None,
+        }
+
+
+def _users(first_id: int, count: int):
+    for user_id in range(first_id, first_id + count):
+        yield {
+            "id": user_id,
+            "username": f"loaduser{user_id}",
+            "email": f"loaduser{user_id}@example.com",
+            "hashed_password": "not-a-real-hash",
+            "is_active": True,
+        }
+
+
+def _line_items(rng: random.Random, first_product: int, prices: list, max_lines: int):
+    """Distinct (product_id, quantity, unit_price) lines for one cart or order."""
+    offsets = rng.sample(range(len(prices)), min(len(prices), rng.randint(1, max_lines)))
+    return [(first_product + offset, rng.randint(1, 3), prices[offset]) for offset in offsets]
+
+
+def seed_scale(scale: float, seed: int = 42, batch_size: int = SCALE_BATCH_SIZE):
+    """
+    Generate a synthetic catalog with users, carts and orders. The same
+    scale and seed always produce the same data (ids continue after any
+    existing rows). Rows are inserted with executemany in batches, with the
+    FTS insert trigger dropped during the load and the index rebuilt once
+    at the end.
+    """
+    counts = scale_counts(scale)
+    rng = random.Random(seed)
+    sqlite = engine.dialect.name == "sqlite"
+    if sqlite:
+        event.listen(engine, "connect", _tune_for_load)
+        engine.dispose()  # make the pragmas apply to a fresh connection
+
+    create_tables()
+    report = []
+    started = time.perf_counter()
+    try:
+        with engine.begin() as conn:
+            if sqlite:
+                conn.execute(text(f"DROP TRIGGER IF EXISTS {FTS_INSERT_TRIGGER}"))
+
+            def load(model, rows):
+                table_started = time.perf_counter()
+                count = _bulk_insert(conn, model, rows, batch_size)
+                elapsed = time.perf_counter() - table_started
+                report.append((model.__tablename__, count, elapsed))
+                print(f"  {model.__tablename__:<12} {count:>10,} rows  {elapsed:7.2f}s  "
+                      f"{count / elapsed if elapsed else 0:>10,.0f} rows/s")
+
+            print(f"Generating scale {scale} dataset (seed {seed})...")
+            first_product = _next_id(conn, Product)
+            prices: list = []
+            load(Product, _products(rng, first_product, counts["products"], prices))
+
+            first_user = _next_id(conn, User)
+            load(User, _users(first_user, counts["users"]))
+
+            first_cart, first_cart_item = _next_id(conn, Cart), _next_id(conn, CartItem)
+            cart_users = rng.sample(range(first_user, first_user + counts["users"]),
+                                    min(counts["carts"], counts["users"]))
+            carts, cart_items = [], []
+            for cart_id, user_id in enumerate(cart_users, start=first_cart):
+                lines = _line_items(rng, first_product, prices, 5)
+                carts.append({"id": cart_id, "user_id": user_id,
+                              "total_price": round(sum(q * p for _, q, p in lines), 2)})
+                cart_items.extend({"cart_id": cart_id, "product_id": product_id, "quantity": quantity}
+                                  for product_id, quantity, _ in lines)
+            load(Cart, carts)
+            load(CartItem, ({"id": item_id, **item}
+                            for item_id, item in enumerate(cart_items, start=first_cart_item)))
+            del carts, cart_items
+
+            first_order = _next_id(conn, Order)
+            first_order_item = _next_id(conn, OrderItem)
+            order_lines = []
+
+            def orders():
+                for order_id in range(first_order, first_order + counts["orders"]):
+                    lines = _line_items(rng, first_product, prices, 4)
+                    order_lines.append((order_id, lines))
+                    yield {
+                        "id": order_id,
+                        "user_id": rng.randint(first_user, first_user + counts["users"] - 1),
+                        "total_amount": round(sum(q * p for _, q, p in lines), 2),
+                        "status": rng.choices(ORDER_STATUSES, ORDER_STATUS_WEIGHTS)[0],
+                        "created_at": SCALE_EPOCH + timedelta(seconds=rng.randint(0, 365 * 86400)),
+                    }
+
+            def order_items():
+                item_id = first_order_item
+                for order_id, lines in order_lines:
+                    for product_id, quantity, unit_price in lines:
+                        yield {"id": item_id, "order_id": order_id, "product_id": product_id,
+                               "quantity": quantity, "unit_price": unit_price}
+                        item_id += 1
+
+            load(Order, orders())
+            load(OrderItem, order_items())
+    finally:
+        if sqlite:
+            event.remove(engine, "connect", _tune_for_load)
+            engine.dispose()
+
+    # Restore the insert trigger, index the new products and refresh planner statistics
+    index_started = time.perf_counter()
+    create_search_index(engine)
+    rebuild_search_index(engine)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    print(f"  {'index+analyze':<12} {'':>10}       {time.perf_counter() - index_started:7.2f}s")
+
+    total_rows = sum(count for _, count, _ in report)
+    elapsed = time.perf_counter() - started
+    print(f"Loaded {total_rows:,} rows in {elapsed:.2f}s ({total_rows / elapsed:,.0f} rows/s)")
+    return report
+
+
 def main():
     """Main function to run the seeding process."""
     print("=" * 50)
@@ -233,10 +440,22 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Database seeder for Phone E-commerce App")
     parser.add_argument("--clear", action="store_true", help="Clear database before seeding")
     parser.add_argument("--list", action="store_true", help="Only list current products")
+    parser.add_argument("--scale", type=float,
+                        help="Generate a synthetic dataset instead (1.0 = 100k products, 10k users, "
+                             "5k carts, 50k orders)")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed for --scale")
+    parser.add_argument("--batch-size", type=int, default=SCALE_BATCH_SIZE,
+                        help="Rows per INSERT batch for --scale")
     
     args = parser.parse_args()
     
-    if args.list:
+    if args.scale:
+        if args.clear:
+            db = SessionLocal()
+            clear_database(db)
+            db.close()
+        seed_scale(args.scale, seed=args.seed, batch_size=args.batch_size)
+    elif args.list:
         db = SessionLocal()
         list_products(db)
         db.close()
@@ -1,17 +1,43 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 from typing import Optional
 
 # Import the centralized API router - CORRECTED IMPORT
 from app.api.api import api_router
-from app.services.chatbot_service import chatbot_service
+from app.api.routes.chatbot import stream_chat
+from app.services.chatbot_service import chatbot_service, DEFAULT_SESSION
+from app.services.cart_service import run_guest_cart_sweeper
+from app.services.inventory_service import run_reservation_sweeper
+from app.config import settings
+from app.db.database import async_engine, engine, init_db
+from app.db.query_log import NPlusOneDetector, enable_query_log
+from app.db.routing import replica_router
+from app.utils.compression import CompressionMiddleware
+from app.utils.metrics import MetricsMiddleware, instrument_engine, metrics
+
+# Create tables and indexes if they don't exist yet
+init_db()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Return the stock of expired cart reservations and drop idle guest carts in the background
+    sweepers = [asyncio.create_task(run_reservation_sweeper()), asyncio.create_task(run_guest_cart_sweeper())]
+    try:
+        yield
+    finally:
+        for sweeper in sweepers:
+            sweeper.cancel()
 
 app = FastAPI(
     title="Phone E-commerce API",
     description="Backend API for Phone E-commerce Web App with AI Chatbot",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS Configuration - Allow ALL localhost ports for development
@@ -35,6 +61,20 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# gzip/brotli for larger JSON/text responses (precompressed catalog payloads pass through)
+app.add_middleware(CompressionMiddleware)
+
+# Per-route latency/status/DB query metrics, served on /metrics; the opt-in
+# N+1 detector and slow-query log (app/db/query_log.py) build on the same hooks
+request_observers = []
+if settings.N_PLUS_ONE_THRESHOLD:
+    request_observers.append(NPlusOneDetector(settings.N_PLUS_ONE_THRESHOLD))
+app.add_middleware(MetricsMiddleware, request_observers=request_observers)
+for db_engine in [engine, async_engine.sync_engine] + [r.engine.sync_engine for r in replica_router.replicas]:
+    instrument_engine(db_engine)
+    if settings.SLOW_QUERY_MS is not None:
+        enable_query_log(db_engine, settings.SLOW_QUERY_MS)
+
 # Global exception handler for proper JSON error responses
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
@@ -46,11 +86,12 @@ async def global_exception_handler(request: Request, exc: Exception):
 # Pydantic models for chat endpoint
 class ChatRequest(BaseModel):
     message: str
-    user_id: Optional[str] = "anonymous"
+    user_id: Optional[str] = DEFAULT_SESSION
 
 class ChatResponse(BaseModel):
     response: str
     success: bool = True
+    retrieval_ms: Optional[float] = None
 
 # Include the centralized API router with /api prefix
 app.include_router(api_router, prefix="/api")
@@ -63,6 +104,11 @@ def read_root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    """Request and database metrics in Prometheus text format."""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Direct chat endpoint for frontend integration
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
@@ -75,10 +121,23 @@ async def chat_endpoint(request: ChatRequest):
     
     try:
         # Get response from chatbot service
-        chat_response = chatbot_service.get_response(request.message)
+        chat_response = await chatbot_service.aget_response(request.message, request.user_id or DEFAULT_SESSION)
         return ChatResponse(
             response=chat_response.response,
-            success=True
+            success=True,
+            retrieval_ms=chat_response.retrieval_ms
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Chatbot error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Chatbot error: {str(e)}")
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest, http_request: Request):
+    """
+    Streaming variant of /api/chat: the answer arrives as Server-Sent Events
+    (start, chunk..., done) instead of a single JSON body.
+    """
+    if not request.message or not request.message.strip():
+        raise HTTPException(status_code=400, detail="Message cannot be empty.")
+    return await stream_chat(http_request, request.message, request.user_id or DEFAULT_SESSION)
\ No newline at end of file
@@ -1,19 +1,33 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from app.db.database import Base
 
 class Cart(Base):
     __tablename__ = 'carts'
+    __table_args__ = (
+        Index('ux_carts_user_id', 'user_id', unique=True),
+        Index('ux_carts_guest_token', 'guest_token', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'))
-    total_price = Column(Integer, default=0)
+    guest_token = Column(String(64), nullable=True)  # Anonymous client's cart_session cookie
+    total_price = Column(Float, default=0)  # Cached; maintained by CartService
+    # Bumped whenever the cart's items change, so workers can tell their cached copy is stale
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Last change to the cart (Core UPDATEs bump it too); idle guest carts are deleted
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
 
     user = relationship("User", back_populates="cart")
     items = relationship("CartItem", back_populates="cart")
 
 class CartItem(Base):
     __tablename__ = 'cart_items'
+    __table_args__ = (
+        Index('ux_cart_items_cart_product', 'cart_id', 'product_id', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     cart_id = Column(Integer, ForeignKey('carts.id'))
@@ -21,4 +35,18 @@ class CartItem(Base):
     quantity = Column(Integer, default=1)
 
     cart = relationship("Cart", back_populates="items")
-    product = relationship("Product")
\ No newline at end of file
+    product = relationship("Product")
+
+class StockReservation(Base):
+    """Stock held for a cart line until expires_at; expired holds go back to the product's stock."""
+    __tablename__ = 'stock_reservations'
+    __table_args__ = (
+        Index('ux_stock_reservations_cart_product', 'cart_id', 'product_id', unique=True),
+        Index('ix_stock_reservations_expires_at', 'expires_at'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    cart_id = Column(Integer, ForeignKey('carts.id'), nullable=False)
+    product_id = Column(Integer, ForeignKey('products.id'), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
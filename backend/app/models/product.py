@@ -1,8 +1,17 @@
-from sqlalchemy import Column, Integer, String, Float, Text
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Float, Text, DateTime, Index
 from app.db.database import Base
 
 class Product(Base):
     __tablename__ = 'products'
+    __table_args__ = (
+        # Keyset pagination / filtering indexes for the catalog listing
+        Index('ix_products_price_id', 'price', 'id'),
+        Index('ix_products_stock_id', 'stock', 'id'),
+        # The chatbot's product index re-reads rows changed since its last refresh
+        Index('ix_products_updated_at', 'updated_at'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), index=True)
@@ -10,6 +19,16 @@ class Product(Base):
     price = Column(Float)
     stock = Column(Integer, default=0)
     image_url = Column(String(500), nullable=True)
+    # Row version for conditional GETs; also bumped by Core UPDATEs (e.g. stock decrements)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=True)
+    # Optimistic lock: ORM updates only apply if the version is unchanged since the row was loaded
+    # (StaleDataError otherwise); Core stock UPDATEs bump it explicitly
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
+
+    def to_dict(self):
+        return {column.name: getattr(self, column.name) for column in self.__table__.columns}
 
     def __repr__(self):
-        return f"<Product(id={self.id}, name={self.name}, price={self.price})>"
\ No newline at end of file
+        return f"<Product(id={self.id}, name={self.name}, price={self.price})>"
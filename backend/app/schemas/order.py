@@ -1,23 +1,34 @@
+from datetime import datetime
 from pydantic import BaseModel
 from typing import List, Optional
 
-class OrderItem(BaseModel):
+from app.schemas.product import Product
+
+class OrderItemCreate(BaseModel):
     product_id: int
     quantity: int
 
+class OrderItem(OrderItemCreate):
+    unit_price: Optional[float] = None
+    product: Optional[Product] = None
+
+    class Config:
+        orm_mode = True
+
 class Order(BaseModel):
     id: int
-    user_id: int
+    user_id: Optional[int] = None
     items: List[OrderItem]
-    total_price: float
+    total_amount: float
     status: str
-    created_at: str
-    updated_at: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
 
 class OrderCreate(BaseModel):
     user_id: int
-    items: List[OrderItem]
+    items: List[OrderItemCreate]
 
 class OrderUpdate(BaseModel):
     status: str
-    updated_at: str
\ No newline at end of file
@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel
 from typing import List, Optional
 
@@ -12,9 +13,12 @@ class ProductCreate(ProductBase):
 
 class ProductUpdate(ProductBase):
     stock: Optional[int] = None
+    version: Optional[int] = None  # the version last read; the update is rejected (409) if it changed
 
 class Product(ProductBase):
     id: int
+    updated_at: Optional[datetime] = None
+    version: Optional[int] = None
 
     class Config:
         orm_mode = True
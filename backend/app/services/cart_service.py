@@ -1,44 +1,404 @@
-from typing import List, Dict, Any
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Hashable, Iterable, Optional
+from sqlalchemy import and_, delete, exists, func, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.cart import Cart, CartItem, StockReservation
+from app.models.product import Product
+from app.services.inventory_service import InventoryService, invalidate_stock_changes
+from app.services.product_service import catalog_version
+from app.utils.cache import LRUCache
+
+# Working set of recently used carts. The database is the source of truth:
+# every request reads the cart row, and the cached items are only reused while
+# its version matches, so changes made by other workers are picked up at once.
+CART_CACHE_SIZE = 10000
+CART_CACHE_TTL = 30.0
+GUEST_CART_SWEEP_BATCH = 1000  # idle guest carts deleted per transaction
+
+logger = logging.getLogger(__name__)
+
+
+class CartState:
+    """
+    In-memory view of one cart: product_id -> quantity, plus the cached total.
+    cart_id is None for a caller who has no cart row yet (an empty cart).
+    """
+
+    __slots__ = ("cart_id", "version", "items", "total", "priced_at", "repriced")
+
+    def __init__(self, cart_id: Optional[int], version: int, items: Optional[Dict[int, int]] = None,
+                 total: float = 0.0, priced_at: Optional[int] = None):
+        self.cart_id = cart_id
+        self.version = version  # carts.version the items were read at
+        self.items: Dict[int, int] = items or {}
+        self.total = total
+        # Catalog version the total was last checked against
+        self.priced_at = priced_at
+        # The total was re-priced on a read and differs from carts.total_price;
+        # the next change to the cart stores the re-priced total
+        self.repriced = False
+
+
+cart_store = LRUCache(maxsize=CART_CACHE_SIZE, ttl=CART_CACHE_TTL)
+
+
+def _insert(db: AsyncSession, table):
+    """Dialect-specific INSERT supporting ON CONFLICT."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Cart upserts are not supported on {dialect}")
+
+
+def _unit_price(product_id: int):
+    """Scalar subquery for a product's current price (0 if unknown)."""
+    return func.coalesce(
+        select(Product.price).where(Product.id == product_id).scalar_subquery(), 0
+    )
+
 
 class CartService:
-    def __init__(self):
-        self.cart_items: List[Dict[str, Any]] = []
-
-    def add_item(self, item: Dict[str, Any]) -> None:
-        """Add an item to the cart."""
-        # Check if item already exists
-        for existing_item in self.cart_items:
-            if existing_item.get('id') == item.get('id'):
-                existing_item['quantity'] += item.get('quantity', 1)
-                return
-        self.cart_items.append(item)
-
-    def remove_item(self, item_id: str) -> None:
+    """
+    Per-user cart persisted in the carts/cart_items tables (AsyncSession).
+    Anonymous clients each get their own cart, keyed on their guest token.
+    Each line of a user's cart holds its quantity in stock (see
+    InventoryService) for STOCK_RESERVATION_TTL seconds after it was last
+    changed. Guest carts hold nothing: a client can mint guest tokens at
+    will, and with them could take the whole stock off sale.
+    """
+
+    def __init__(self, db: AsyncSession, user_id: Optional[int] = None, guest_token: Optional[str] = None):
+        if user_id is None and not guest_token:
+            raise ValueError("A cart needs a user id or a guest token")
+        self.db = db
+        self.user_id = user_id
+        self.guest_token = guest_token if user_id is None else None
+        self.inventory = InventoryService(db)
+
+    @property
+    def _key(self) -> Hashable:
+        return ("user", self.user_id) if self.user_id is not None else ("guest", self.guest_token)
+
+    def _owner(self) -> Dict[str, Any]:
+        if self.user_id is not None:
+            return {"user_id": self.user_id}
+        return {"guest_token": self.guest_token}
+
+    def _changed(self, state: CartState, version: int) -> None:
+        """
+        Record a committed change to the cart's items. If another request got
+        in between (the version moved by more than one), drop the cached copy.
+        """
+        if version == state.version + 1:
+            state.version = version
+        else:
+            cart_store.pop(self._key)
+
+    async def _hold(self, cart_id: int, product_id: int, quantity: int) -> Dict[int, int]:
+        if self.user_id is None:
+            return {}
+        return await self.inventory.hold(cart_id, product_id, quantity)
+
+    async def _release(self, cart_id: int, product_ids: Optional[List[int]] = None) -> Dict[int, int]:
+        if self.user_id is None:
+            return {}
+        return await self.inventory.release(cart_id, product_ids)
+
+    async def _commit(self, stock_changes: Dict[int, int]) -> None:
+        await self.db.commit()
+        invalidate_stock_changes(stock_changes)
+
+    async def _load_state(self, create: bool = False) -> CartState:
+        """
+        Return the caller's cart. The cart row is read every time; the items
+        come from the working set unless the cart's version moved since they
+        were cached. A caller without a cart gets an empty one, which is only
+        stored when `create` is set (i.e. on the first write).
+        """
+        cart = await self._find_cart()
+        if cart is None and not create:
+            return CartState(None, 0)
+        if cart is None:
+            owner = self._owner()
+            # Concurrent requests may race to create the cart; the unique index settles it
+            await self.db.execute(
+                _insert(self.db, Cart).values(total_price=0, **owner)
+                .on_conflict_do_nothing(index_elements=list(owner))
+            )
+            await self.db.commit()
+            cart = await self._find_cart()
+
+        state = cart_store.get(self._key)
+        if state is None or state.cart_id != cart.id or state.version != cart.version:
+            result = await self.db.execute(
+                select(CartItem.product_id, CartItem.quantity).where(CartItem.cart_id == cart.id)
+            )
+            state = CartState(cart.id, cart.version, {product_id: quantity for product_id, quantity in result.all()},
+                              total=cart.total_price or 0.0)
+            cart_store.set(self._key, state)
+        return state
+
+    async def _find_cart(self):
+        if self.user_id is not None:
+            condition = Cart.user_id == self.user_id
+        else:
+            condition = Cart.guest_token == self.guest_token
+        result = await self.db.execute(
+            select(Cart.id, Cart.total_price, Cart.version).where(condition).order_by(Cart.id).limit(1)
+        )
+        return result.first()
+
+    async def _fetch_products(self, product_ids: Iterable[int]) -> Dict[int, Any]:
+        """Resolve price and stock for many products in a single IN (...) query."""
+        product_ids = list(product_ids)
+        if not product_ids:
+            return {}
+        result = await self.db.execute(
+            select(Product.id, Product.price, Product.stock).where(Product.id.in_(product_ids))
+        )
+        return {row.id: row for row in result.all()}
+
+    def _stored_total(self, state: CartState):
+        """
+        SQL expression for the cart total a change starts from: the stored
+        total, or the cart re-priced at current prices when a read found the
+        stored one out of date.
+        """
+        if not state.repriced:
+            return func.coalesce(Cart.total_price, 0)
+        return func.coalesce(
+            select(func.sum(CartItem.quantity * Product.price))
+            .join(Product, Product.id == CartItem.product_id)
+            .where(CartItem.cart_id == state.cart_id)
+            .scalar_subquery(),
+            0,
+        )
+
+    async def _adjust_total(self, state: CartState, product_id: int, new_quantity) -> int:
+        """
+        Move the cached cart total by (new_quantity - current quantity) * price
+        and bump the cart's version, which is returned.
+        Must run before the cart_items change, inside the same transaction.
+        """
+        old_quantity = func.coalesce(
+            select(CartItem.quantity)
+            .where(CartItem.cart_id == state.cart_id, CartItem.product_id == product_id)
+            .scalar_subquery(),
+            0,
+        )
+        result = await self.db.execute(
+            update(Cart)
+            .where(Cart.id == state.cart_id)
+            .values(total_price=self._stored_total(state)
+                    + (new_quantity - old_quantity) * _unit_price(product_id),
+                    version=Cart.version + 1)
+            .returning(Cart.total_price, Cart.version)
+        )
+        state.total, version = result.one()
+        return version
+
+    async def _refresh_prices(self, state: CartState) -> Dict[int, Any]:
+        """
+        Re-price the whole cart with one query. Reads never write: a total that
+        drifted is kept in the working set and stored by the next change to the cart.
+        """
+        products = await self._fetch_products(state.items)
+        total = sum(
+            (products[pid].price or 0) * quantity
+            for pid, quantity in state.items.items() if pid in products
+        )
+        if round(total, 2) != round(state.total, 2):
+            state.repriced = True
+        state.total = total
+        state.priced_at = catalog_version.value
+        return products
+
+    async def get_cart_id(self) -> int:
+        return (await self._load_state(create=True)).cart_id
+
+    async def add_item(self, product_id: int, quantity: int = 1) -> int:
+        """Add an item to the cart (or increase its quantity). Returns the cart id."""
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        state = await self._load_state(create=True)
+        result = await self.db.execute(
+            update(Cart)
+            .where(Cart.id == state.cart_id)
+            .values(total_price=self._stored_total(state) + quantity * _unit_price(product_id),
+                    version=Cart.version + 1)
+            .returning(Cart.total_price, Cart.version)
+        )
+        total, version = result.one()
+        stmt = _insert(self.db, CartItem).values(
+            cart_id=state.cart_id, product_id=product_id, quantity=quantity
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["cart_id", "product_id"],
+            set_={"quantity": CartItem.quantity + stmt.excluded.quantity},
+        ).returning(CartItem.quantity)
+        new_quantity = (await self.db.execute(stmt)).scalar_one()
+        try:
+            stock_changes = await self._hold(state.cart_id, product_id, new_quantity)
+        except Exception:
+            await self.db.rollback()
+            raise
+        await self._commit(stock_changes)
+        state.items[product_id] = new_quantity
+        state.total = total
+        state.repriced = False
+        self._changed(state, version)
+        return state.cart_id
+
+    async def remove_item(self, product_id: int) -> None:
         """Remove an item from the cart."""
-        self.cart_items = [item for item in self.cart_items if item.get('id') != item_id]
+        state = await self._load_state()
+        if state.cart_id is None:
+            return
+        version = await self._adjust_total(state, product_id, 0)
+        await self.db.execute(
+            delete(CartItem).where(CartItem.cart_id == state.cart_id, CartItem.product_id == product_id)
+        )
+        await self._commit(await self._release(state.cart_id, [product_id]))
+        state.items.pop(product_id, None)
+        state.repriced = False
+        self._changed(state, version)
 
-    def get_cart_items(self) -> List[Dict[str, Any]]:
-        """Get all items in the cart."""
-        return self.cart_items
+    async def get_cart_items(self) -> List[Dict[str, Any]]:
+        """Get all items in the cart with their current price and stock."""
+        state = await self._load_state()
+        products = await self._refresh_prices(state)
+        items = []
+        for product_id, quantity in state.items.items():
+            product = products.get(product_id)
+            price = product.price if product else None
+            items.append({
+                "id": product_id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "price": price,
+                "stock": product.stock if product else 0,
+                "subtotal": round((price or 0) * quantity, 2),
+            })
+        return items
 
-    def clear_cart(self) -> None:
+    async def clear_cart(self) -> None:
         """Clear all items from the cart."""
-        self.cart_items = []
+        state = await self._load_state()
+        if state.cart_id is None:
+            return
+        await self.db.execute(delete(CartItem).where(CartItem.cart_id == state.cart_id))
+        result = await self.db.execute(
+            update(Cart).where(Cart.id == state.cart_id)
+            .values(total_price=0, version=Cart.version + 1)
+            .returning(Cart.version)
+        )
+        version = result.scalar_one()
+        await self._commit(await self._release(state.cart_id))
+        state.items.clear()
+        state.total = 0.0
+        state.repriced = False
+        self._changed(state, version)
 
-    def calculate_total(self) -> float:
-        """Calculate the total price of all items in the cart."""
-        return sum(item.get('price', 0) * item.get('quantity', 1) for item in self.cart_items)
+    async def calculate_total(self) -> float:
+        """
+        Get the total price of all items in the cart.
+        Served from the cached total; re-priced (one query) only after catalog changes.
+        """
+        state = await self._load_state()
+        if state.priced_at != catalog_version.value:
+            await self._refresh_prices(state)
+        return round(state.total, 2)
 
-    def update_item_quantity(self, item_id: str, quantity: int) -> bool:
+    async def update_item_quantity(self, product_id: int, quantity: int) -> bool:
         """Update the quantity of an item in the cart."""
-        for item in self.cart_items:
-            if item.get('id') == item_id:
-                if quantity <= 0:
-                    self.remove_item(item_id)
-                else:
-                    item['quantity'] = quantity
-                return True
-        return False
-
-# Shared instance for the application
-cart_service = CartService()
\ No newline at end of file
+        state = await self._load_state()
+        if state.cart_id is None:
+            return False
+        previous_total = state.total
+        version = await self._adjust_total(state, product_id, max(quantity, 0))
+        if quantity <= 0:
+            result = await self.db.execute(
+                delete(CartItem).where(CartItem.cart_id == state.cart_id, CartItem.product_id == product_id)
+            )
+        else:
+            result = await self.db.execute(
+                update(CartItem)
+                .where(CartItem.cart_id == state.cart_id, CartItem.product_id == product_id)
+                .values(quantity=quantity)
+            )
+        if result.rowcount == 0:
+            await self.db.rollback()
+            state.total = previous_total
+            state.items.pop(product_id, None)
+            return False
+        try:
+            stock_changes = await self._hold(state.cart_id, product_id, max(quantity, 0))
+        except Exception:
+            await self.db.rollback()
+            state.total = previous_total
+            raise
+        await self._commit(stock_changes)
+        if quantity <= 0:
+            state.items.pop(product_id, None)
+        else:
+            state.items[product_id] = quantity
+        state.repriced = False
+        self._changed(state, version)
+        return True
+
+
+async def delete_idle_guest_carts(db: AsyncSession, now: Optional[datetime] = None,
+                                  ttl: Optional[float] = None,
+                                  batch_size: int = GUEST_CART_SWEEP_BATCH) -> int:
+    """
+    Delete guest carts unchanged for `ttl` seconds, with their items, one
+    committed batch at a time. Empty guest carts without a timestamp (made by
+    reads before carts were only created on write) go too. Carts still
+    holding stock are left for the reservation sweep. Returns how many were deleted.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(seconds=settings.GUEST_CART_TTL if ttl is None else ttl)
+    idle = and_(
+        Cart.user_id.is_(None),
+        Cart.guest_token.isnot(None),
+        or_(
+            Cart.updated_at < cutoff,
+            and_(Cart.updated_at.is_(None), ~exists().where(CartItem.cart_id == Cart.id)),
+        ),
+        ~exists().where(StockReservation.cart_id == Cart.id),
+    )
+    deleted = 0
+    while True:
+        batch = select(Cart.id).where(idle).limit(batch_size).scalar_subquery()
+        # Re-check idleness so a cart changed meanwhile is kept
+        cart_ids = (await db.execute(
+            delete(Cart).where(Cart.id.in_(batch), idle).returning(Cart.id)
+        )).scalars().all()
+        if cart_ids:
+            await db.execute(delete(CartItem).where(CartItem.cart_id.in_(cart_ids)))
+        await db.commit()
+        deleted += len(cart_ids)
+        if len(cart_ids) < batch_size:
+            return deleted
+
+
+async def run_guest_cart_sweeper(interval: Optional[float] = None) -> None:
+    """Background task: delete idle guest carts every `interval` seconds until cancelled."""
+    interval = settings.GUEST_CART_SWEEP_INTERVAL if interval is None else interval
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as db:
+                deleted = await delete_idle_guest_carts(db)
+            if deleted:
+                logger.info("Deleted %d idle guest carts", deleted)
+        except Exception:  # keep sweeping; the next run retries the same rows
+            logger.exception("Guest cart sweep failed")
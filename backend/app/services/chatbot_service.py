@@ -1,7 +1,20 @@
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List, Optional
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+import asyncio
 import os
+import re
+import threading
+import time
+
+from app.config import settings
+from app.services.intent_matcher import IntentMatcher, tokenize
+from app.services.product_service import catalog_version
+from app.services.retrieval_service import ProductIndex, RetrievalResult, product_index
+from app.utils.cache import LRUCache
+from app.utils.concurrency import ConcurrencyLimiter
 
 class ChatMessage(BaseModel):
     user: str
@@ -10,69 +23,243 @@ class ChatMessage(BaseModel):
 class ChatResponse(BaseModel):
     response: str
     context: Optional[str] = None
+    retrieval_ms: Optional[float] = None
+    cached: bool = False
+
+DEFAULT_SESSION = "anonymous"
+
+# How many products an answer lists, and the cosine score below which a
+# free-form question isn't considered to be about a product
+RETRIEVAL_TOP_K = 3
+MIN_RETRIEVAL_SCORE = 0.08
+
+# Streamed answers are sent word by word (each chunk keeps its trailing whitespace)
+_STREAM_CHUNK_RE = re.compile(r"\S+\s*|\s+")
+
+class ChatHistoryStore:
+    """
+    Chat history keyed by session/user with a bounded footprint:
+    - each session keeps at most `max_messages_per_session` messages (ring buffer);
+    - sessions idle for longer than `idle_ttl` seconds are dropped;
+    - once more than `max_total_messages` are held, least recently used sessions are evicted.
+    """
+
+    def __init__(self, max_messages_per_session: int = 50, max_total_messages: int = 100_000,
+                 idle_ttl: float = 30 * 60, clock=time.monotonic):
+        self.max_messages_per_session = max_messages_per_session
+        self.max_total_messages = max_total_messages
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        # session_id -> (messages, last activity); ordered least to most recently used
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self.evicted_sessions = 0
+        self.expired_sessions = 0
+
+    def append(self, session_id: str, message: ChatMessage) -> None:
+        now = self._clock()
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            messages: Deque[ChatMessage] = entry[0] if entry else deque(maxlen=self.max_messages_per_session)
+            if len(messages) < self.max_messages_per_session:
+                self._total += 1
+            messages.append(message)
+            self._sessions[session_id] = (messages, now)
+            self._expire(now)
+            while self._total > self.max_total_messages and len(self._sessions) > 1:
+                self._drop_oldest()
+                self.evicted_sessions += 1
+
+    def get(self, session_id: str) -> List[ChatMessage]:
+        with self._lock:
+            self._expire(self._clock())
+            entry = self._sessions.get(session_id)
+            return list(entry[0]) if entry else []
+
+    def clear(self, session_id: Optional[str] = None) -> None:
+        with self._lock:
+            if session_id is None:
+                self._sessions.clear()
+                self._total = 0
+            else:
+                entry = self._sessions.pop(session_id, None)
+                if entry:
+                    self._total -= len(entry[0])
+
+    def _expire(self, now: float) -> None:
+        # Sessions are in last-activity order, so idle ones are all at the front
+        while self._sessions:
+            _, (_, last_seen) = next(iter(self._sessions.items()))
+            if now - last_seen <= self.idle_ttl:
+                break
+            self._drop_oldest()
+            self.expired_sessions += 1
+
+    def _drop_oldest(self) -> None:
+        _, (messages, _) = self._sessions.popitem(last=False)
+        self._total -= len(messages)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "messages": self._total,
+                "max_total_messages": self.max_total_messages,
+                "evicted_sessions": self.evicted_sessions,
+                "expired_sessions": self.expired_sessions,
+            }
+
+def normalize_message(message: str) -> str:
+    """Fold case, punctuation and whitespace so equivalent messages share a cache key."""
+    return " ".join(tokenize(message))
+
+def _describe(product: Dict[str, Any]) -> str:
+    price = product.get("price")
+    return f"{product['name']} (${price:.2f})" if price is not None else product["name"]
 
 class ChatbotService:
-    def __init__(self):
-        self.history: List[ChatMessage] = []
+    def __init__(self, index: ProductIndex = product_index,
+                 cache_size: int = settings.CHAT_RESPONSE_CACHE_SIZE):
+        self.history = ChatHistoryStore()
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
+        self.intent_matcher = IntentMatcher.from_file()
+        self.index = index
+        # Answers keyed on (normalized message, catalog version, index version):
+        # a catalog write here or a change the index picked up from another
+        # worker moves one of them, so stale answers are not served
+        self.response_cache = LRUCache(maxsize=cache_size, ttl=None) if cache_size > 0 else None
+        # Bounds how many answers are generated at once so a burst of chat
+        # traffic can't take every worker thread from the catalog and cart routes
+        self.limiter = ConcurrencyLimiter(
+            max_in_flight=settings.CHAT_MAX_IN_FLIGHT,
+            max_queue=settings.CHAT_MAX_QUEUE,
+            queue_timeout=settings.CHAT_QUEUE_TIMEOUT,
+            name="chat",
+        )
     
-    def add_message(self, user: str, message: str):
-        """Add a message to the chat history."""
+    def add_message(self, user: str, message: str, session_id: str = DEFAULT_SESSION):
+        """Add a message to the session's chat history."""
         chat_message = ChatMessage(user=user, message=message)
-        self.history.append(chat_message)
+        self.history.append(session_id, chat_message)
+    
+    def get_history(self, session_id: str = DEFAULT_SESSION) -> List[ChatMessage]:
+        """Get the session's chat history, oldest first."""
+        return self.history.get(session_id)
     
-    def get_response(self, message: str) -> ChatResponse:
+    def get_response(self, message: str, session_id: str = DEFAULT_SESSION) -> ChatResponse:
         """
         Process user message and return chatbot response.
-        Currently returns keyword-based response. 
-        TODO: Integrate with LangChain + RAG for intelligent responses.
+        The compiled intent matcher answers greetings and other canned
+        intents directly; product questions are answered from rows retrieved
+        from the product index. Answers are memoized per catalog version.
         """
-        self.add_message("User", message)
+        self.add_message("User", message, session_id)
         
-        # Basic response logic (replace with RAG implementation later)
-        response_message = self._generate_response(message)
+        response = self._cached_response(message)
         
-        self.add_message("Bot", response_message)
-        return ChatResponse(response=response_message)
+        self.add_message("Bot", response.response, session_id)
+        return response
     
-    def _generate_response(self, message: str) -> str:
+    async def aget_response(self, message: str, session_id: str = DEFAULT_SESSION) -> ChatResponse:
+        """
+        get_response behind the chat limiter, run in the threadpool so the
+        event loop stays free. Raises 429/503 (with Retry-After) when overloaded.
+        """
+        async with self.limiter:
+            return await run_in_threadpool(self.get_response, message, session_id)
+    
+    async def stream_response(
+        self, message: str, session_id: str = DEFAULT_SESSION
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Streaming variant of get_response yielding (event, data) pairs:
+        one "chunk" event per word of the answer, then a "done" event.
+        Only delivery is streamed: the whole answer (one intent match plus an
+        index lookup, milliseconds) is built in the threadpool before the
+        first chunk, and that step can't be cancelled. If the consumer stops
+        early (client disconnect, task cancellation) the remaining chunks are
+        not sent and the answer is not added to the history. Callers are
+        expected to hold a limiter slot.
+        """
+        self.add_message("User", message, session_id)
+        response = await run_in_threadpool(self._cached_response, message)
+
+        for piece in _STREAM_CHUNK_RE.findall(response.response):
+            yield "chunk", {"delta": piece}
+            await asyncio.sleep(0)
+
+        self.add_message("Bot", response.response, session_id)
+        yield "done", {
+            "context": response.context,
+            "retrieval_ms": response.retrieval_ms,
+            "cached": response.cached,
+        }
+    
+    def _cached_response(self, message: str) -> ChatResponse:
+        """Return a memoized answer for this message and catalog version, generating it on a miss."""
+        if self.response_cache is None:
+            return self._generate_response(message)
+        self.index.refresh()
+        key = (normalize_message(message), catalog_version.value, self.index.version)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            return ChatResponse(**{**cached.dict(), "cached": True})
+        response = self._generate_response(message)
+        self.response_cache.set(key, response)
+        return response
+    
+    def _generate_response(self, message: str) -> ChatResponse:
         """
         Generate response based on message content.
-        This is a placeholder for RAG integration.
+        Product answers are built from catalog rows retrieved from the product index.
         """
-        message_lower = message.lower()
-        
-        # Simple keyword-based responses
-        if any(word in message_lower for word in ["hello", "hi", "hey"]):
-            return "Hello! Welcome to Phone E-commerce. How can I help you find the perfect phone today?"
-        
-        if any(word in message_lower for word in ["iphone", "apple"]):
-            return "We have the latest iPhone models including the iPhone 15 Pro Max ($1199.99) and iPhone 15 ($799.99). Would you like more details about any specific model?"
-        
-        if any(word in message_lower for word in ["samsung", "galaxy"]):
-            return "We carry Samsung Galaxy phones including the S24 Ultra ($1299.99) and the foldable Z Fold 5 ($1799.99). What features are you looking for?"
-        
-        if any(word in message_lower for word in ["pixel", "google"]):
-            return "Google Pixel phones are known for their AI features! We have the Pixel 8 Pro ($999.99) and the budget-friendly Pixel 8a ($499.99)."
-        
-        if any(word in message_lower for word in ["cheap", "budget", "affordable"]):
-            return "For budget-friendly options, check out the Google Pixel 8a ($499.99) or Nothing Phone 2 ($599.99). Both offer great value!"
-        
-        if any(word in message_lower for word in ["camera", "photo", "photography"]):
-            return "For the best camera phones, I recommend the Xiaomi 14 Ultra with Leica lenses, iPhone 15 Pro Max, or Google Pixel 8 Pro with its AI-powered photography."
-        
-        if any(word in message_lower for word in ["price", "cost", "how much"]):
-            return "Our phones range from $499.99 (Pixel 8a) to $1799.99 (Galaxy Z Fold 5). What's your budget range?"
-        
-        if any(word in message_lower for word in ["help", "support"]):
-            return "I'm here to help! You can ask me about phone specifications, prices, comparisons, or recommendations based on your needs."
-        
-        # Default response
-        return f"Thanks for your message! I can help you find phones, compare specs, or answer questions about our products. What would you like to know?"
+        intent = self.intent_matcher.match(message)
+        if intent is not None and intent.action is None:
+            return ChatResponse(response=intent.response)
+
+        action = intent.action if intent else "search"
+        if action == "cheapest":
+            result = self.index.cheapest(RETRIEVAL_TOP_K)
+        elif action == "price_range":
+            result = self.index.price_range()
+        else:
+            result = self.index.search(message, RETRIEVAL_TOP_K)
+            if intent is None:
+                # Free-form message: only answer from the catalog on a confident match
+                keep = [i for i, score in enumerate(result.scores) if score >= MIN_RETRIEVAL_SCORE]
+                result.products = [result.products[i] for i in keep]
+
+        return ChatResponse(
+            response=self._format_answer(intent, action, result),
+            context=", ".join(str(p["id"]) for p in result.products) or None,
+            retrieval_ms=round(result.latency_ms, 3),
+        )
+    
+    def _format_answer(self, intent, action: str, result: RetrievalResult) -> str:
+        """Turn retrieved catalog rows into a reply."""
+        messages = self.intent_matcher.messages
+        if not result.products:
+            return self.intent_matcher.default if intent is None else messages.get(
+                "no_results", self.intent_matcher.default)
+        if action == "price_range":
+            low, high = result.products
+            return intent.response.format(low=_describe(low), high=_describe(high))
+        intro = intent.response if intent else messages.get("suggestions", "")
+        return "\n".join([intro] + [f"- {_describe(p)}" for p in result.products])
+    
+    def stats(self) -> Dict[str, Any]:
+        """Retrieval latency and history footprint counters."""
+        return {
+            "retrieval": self.index.stats(),
+            "history": self.history.stats(),
+            "response_cache": self.response_cache.stats() if self.response_cache else None,
+            "limiter": self.limiter.stats(),
+        }
     
-    def clear_history(self):
-        """Clear conversation history."""
-        self.history = []
+    def clear_history(self, session_id: Optional[str] = None):
+        """Clear one session's conversation history, or all of it."""
+        self.history.clear(session_id)
 
 # Singleton instance
 chatbot_service = ChatbotService()
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+Keyword intent matching for the chatbot.
+
+The intent table is compiled once into a word-level trie: single-word
+keywords are plain dict entries, multi-word keywords ("how much") hang off
+their first word. A message is lowercased and tokenized once (C-level
+translate/split) and intersected with the keyword map in one C-level set
+operation, so the cost does not grow with the number of intents or keywords,
+and keywords only match whole words ("hi" no longer matches "this" or
+"shipping"). ASCII messages, the common case, are tokenized as bytes: a
+256-entry bytes.translate table is several times cheaper than str.translate
+with a dict, and the trie has a bytes copy of its ASCII keywords.
+
+Intents are ordered by priority: the first intent in the table wins when a
+message matches several.
+"""
+
+import json
+import os
+import string
+from typing import Any, Dict, FrozenSet, Hashable, List, Optional, Tuple
+
+DEFAULT_INTENTS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "chat_intents.json"
+)
+
+# Punctuation becomes whitespace so tokens are bare words
+_PUNCTUATION = string.punctuation + "‘’“”…–—¡¿«»"
+_SEPARATORS = str.maketrans({c: " " for c in _PUNCTUATION})
+# Same separators for ASCII text as bytes; \x1c-\x1f are whitespace to str.split() but not bytes.split()
+_ASCII_SEPARATORS_CHARS = (string.punctuation + "\x1c\x1d\x1e\x1f").encode("ascii")
+_ASCII_SEPARATORS = bytes.maketrans(_ASCII_SEPARATORS_CHARS, b" " * len(_ASCII_SEPARATORS_CHARS))
+
+# words: keyword -> best intent priority; phrases: first word -> [(remaining words, priority)];
+# keys: every word a lookup can start from
+Words = Dict[Hashable, int]
+Phrases = Dict[Hashable, List[Tuple[Tuple[Hashable, ...], int]]]
+
+
+def tokenize(message: str) -> List[str]:
+    """Lowercase `message` and split it into word tokens."""
+    return message.lower().translate(_SEPARATORS).split()
+
+
+def _ascii_tokens(message: str) -> List[bytes]:
+    """tokenize() for an ASCII message, as bytes tokens."""
+    return message.lower().encode("ascii").translate(_ASCII_SEPARATORS).split()
+
+
+class _Trie:
+    __slots__ = ("words", "phrases", "keys")
+
+    def __init__(self, words: Words, phrases: Phrases):
+        self.words = words
+        self.phrases = phrases
+        self.keys: FrozenSet[Hashable] = frozenset(words).union(phrases)
+
+    def ascii_copy(self) -> "_Trie":
+        """The ASCII keywords with bytes tokens (other keywords can't occur in an ASCII message)."""
+        words = {w.encode("ascii"): p for w, p in self.words.items() if w.isascii()}
+        phrases: Phrases = {}
+        for first, entries in self.phrases.items():
+            for rest, priority in entries:
+                if first.isascii() and all(token.isascii() for token in rest):
+                    phrases.setdefault(first.encode("ascii"), []).append(
+                        (tuple(token.encode("ascii") for token in rest), priority))
+        return _Trie(words, phrases)
+
+
+class Intent:
+    __slots__ = ("name", "keywords", "response", "priority", "action")
+
+    def __init__(self, name: str, keywords: List[str], response: str, priority: int,
+                 action: Optional[str] = None):
+        self.name = name
+        self.keywords = keywords
+        self.response = response
+        self.priority = priority
+        self.action = action  # how the answer is built from the catalog, None for a canned reply
+
+
+class IntentMatcher:
+    def __init__(self, intents: List[Dict[str, Any]], default: str, messages: Optional[Dict[str, str]] = None):
+        self.messages = messages or {}  # other reply templates from the table (no_results, ...)
+        self.intents = [
+            Intent(item["name"], list(item["keywords"]), item["response"], priority, item.get("action"))
+            for priority, item in enumerate(intents)
+        ]
+        self.default = default
+        self._trie = _Trie(*self._compile(self.intents))
+        self._ascii_trie = self._trie.ascii_copy()
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_INTENTS_PATH) -> "IntentMatcher":
+        """Build a matcher from a JSON intent table."""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        messages = {k: v for k, v in data.items() if k not in ("intents", "default")}
+        return cls(data["intents"], data["default"], messages)
+
+    @staticmethod
+    def _compile(intents: List[Intent]) -> Tuple[Words, Phrases]:
+        """
+        Build the lookup tables:
+        - words: single-word keyword -> best (lowest) intent priority
+        - phrases: first word -> [(remaining words, priority)] for multi-word keywords
+        """
+        words: Words = {}
+        phrases: Phrases = {}
+        for intent in intents:
+            for keyword in intent.keywords:
+                tokens = tokenize(keyword)
+                if not tokens:
+                    continue
+                if len(tokens) == 1:
+                    words[tokens[0]] = min(words.get(tokens[0], intent.priority), intent.priority)
+                else:
+                    phrases.setdefault(tokens[0], []).append((tuple(tokens[1:]), intent.priority))
+        return words, phrases
+
+    def match(self, message: str) -> Optional[Intent]:
+        """Return the highest-priority intent mentioned in `message`, if any."""
+        if message.isascii():
+            tokens: List[Any] = _ascii_tokens(message)
+            trie = self._ascii_trie
+        else:
+            tokens, trie = tokenize(message), self._trie
+        # One pass over the tokens, in C; most messages share no word with the table
+        present = trie.keys.intersection(tokens)
+        if not present:
+            return None
+
+        best: Optional[int] = None
+        for word in present:
+            priority = trie.words.get(word)
+            if priority is not None and (best is None or priority < best):
+                best = priority
+
+        # Multi-word keywords are only checked when their first word occurs
+        for first in present.intersection(trie.phrases):
+            candidates = [(rest, p) for rest, p in trie.phrases[first] if best is None or p < best]
+            if not candidates:
+                continue
+            # list.index finds each occurrence of the first word in C
+            i = tokens.index(first)
+            while True:
+                for rest, priority in candidates:
+                    if tuple(tokens[i + 1:i + 1 + len(rest)]) == rest and (best is None or priority < best):
+                        best = priority
+                try:
+                    i = tokens.index(first, i + 1)
+                except ValueError:
+                    break
+
+        return self.intents[best] if best is not None else None
+
+    def respond(self, message: str) -> str:
+        """Return the response for the best matching intent, or the default reply."""
+        intent = self.match(message)
+        return intent.response if intent else self.default
@@ -0,0 +1,197 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.cart import Cart, StockReservation
+from app.models.product import Product
+from app.services.product_service import invalidate_stock
+
+logger = logging.getLogger(__name__)
+
+RESERVATION_SWEEP_BATCH = 1000  # expired holds released per transaction
+
+
+# Statement builders shared with the order service
+
+def decrement_stock_statement(quantities: Dict[int, int]):
+    """
+    Guarded stock decrement for every line in one statement:
+    UPDATE products SET stock = stock - CASE id ... END, version = version + 1
+    WHERE id IN (...) AND stock >= CASE id ... END RETURNING id, price
+    The stock check and the write are one atomic compare-and-swap, so
+    concurrent buyers can't oversell and nobody has to retry. Products
+    lacking stock are not updated, so fewer rows come back.
+    """
+    quantity = case(quantities, value=Product.id)
+    return (
+        update(Product)
+        .where(Product.id.in_(list(quantities)), Product.stock >= quantity)
+        .values(stock=Product.stock - quantity, version=Product.version + 1)
+        .returning(Product.id, Product.price)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def restock_statement(quantities: Dict[int, int]):
+    """Return released quantities to stock (product_id -> quantity)."""
+    quantity = case(quantities, value=Product.id)
+    return (
+        update(Product)
+        .where(Product.id.in_(list(quantities)))
+        .values(stock=Product.stock + quantity, version=Product.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def consume_reservations_statement(user_id: int, product_ids: Iterable[int]):
+    """
+    Delete the holds of user `user_id`'s cart on `product_ids`, returning what
+    they held. `user_id` must be the caller's identity, not one taken from a
+    request body, or a client could use up someone else's holds.
+    """
+    return (
+        delete(StockReservation)
+        .where(
+            StockReservation.cart_id.in_(select(Cart.id).where(Cart.user_id == user_id)),
+            StockReservation.product_id.in_(list(product_ids)),
+        )
+        .returning(StockReservation.product_id, StockReservation.quantity)
+    )
+
+
+def _sum_by_product(rows: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+    quantities: Dict[int, int] = {}
+    for product_id, quantity in rows:
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def invalidate_stock_changes(changes: Dict[int, int]) -> None:
+    """Drop the cached catalog entries for a committed set of stock changes (product_id -> delta)."""
+    if changes:
+        invalidate_stock(changes, restocked=any(delta > 0 for delta in changes.values()))
+
+
+class InventoryService:
+    """
+    Cart-time stock reservations (AsyncSession). A hold moves units from the
+    product's stock into stock_reservations until it expires, so stock shown
+    to other shoppers excludes what sits in carts. Only users' carts hold
+    stock (see CartService). Placing an order consumes the caller's holds; expired ones are returned by `release_expired`.
+
+    `hold` and `release` run inside the caller's transaction and report the
+    stock they changed; the caller commits, then passes that report to
+    `invalidate_stock_changes`.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def hold(self, cart_id: int, product_id: int, quantity: int,
+                   ttl: Optional[float] = None) -> Dict[int, int]:
+        """
+        Hold `quantity` units for the cart line (0 releases it) and renew its
+        expiry. Raises 409 when the product lacks the extra stock. Unknown
+        products are not held. Returns the stock change ({product_id: delta},
+        empty when stock is unchanged).
+        """
+        ttl = settings.STOCK_RESERVATION_TTL if ttl is None else ttl
+        result = await self.db.execute(
+            select(StockReservation.id, StockReservation.quantity)
+            .where(StockReservation.cart_id == cart_id, StockReservation.product_id == product_id)
+        )
+        existing = result.first()
+        held = existing.quantity if existing else 0
+        delta = quantity - held
+
+        if delta > 0:
+            taken = (await self.db.execute(decrement_stock_statement({product_id: delta}))).all()
+            if not taken:
+                stock = (await self.db.execute(
+                    select(Product.stock).where(Product.id == product_id)
+                )).first()
+                if stock is None:
+                    return {}
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Insufficient stock for product {product_id}: {stock.stock or 0} available",
+                )
+        elif delta < 0:
+            await self.db.execute(restock_statement({product_id: -delta}))
+
+        expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+        if quantity <= 0:
+            if existing:
+                await self.db.execute(delete(StockReservation).where(StockReservation.id == existing.id))
+        elif existing:
+            await self.db.execute(
+                update(StockReservation).where(StockReservation.id == existing.id)
+                .values(quantity=quantity, expires_at=expires_at)
+            )
+        else:
+            await self.db.execute(insert(StockReservation).values(
+                cart_id=cart_id, product_id=product_id, quantity=quantity, expires_at=expires_at))
+        return {product_id: -delta} if delta else {}
+
+    async def release(self, cart_id: int, product_ids: Optional[List[int]] = None) -> Dict[int, int]:
+        """Return the cart's holds (all, or on `product_ids`) to stock. Returns the stock change."""
+        stmt = delete(StockReservation).where(StockReservation.cart_id == cart_id)
+        if product_ids is not None:
+            stmt = stmt.where(StockReservation.product_id.in_(product_ids))
+        rows = (await self.db.execute(
+            stmt.returning(StockReservation.product_id, StockReservation.quantity)
+        )).all()
+        returned = _sum_by_product(rows)
+        if returned:
+            await self.db.execute(restock_statement(returned))
+        return returned
+
+    async def release_expired(self, now: Optional[datetime] = None,
+                              batch_size: int = RESERVATION_SWEEP_BATCH) -> int:
+        """Return expired holds to stock, one committed batch at a time. Returns how many were released."""
+        now = now or datetime.utcnow()
+        released = 0
+        while True:
+            expired = (
+                select(StockReservation.id)
+                .where(StockReservation.expires_at <= now)
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            # Re-check the expiry so a hold renewed meanwhile is kept
+            rows = (await self.db.execute(
+                delete(StockReservation)
+                .where(StockReservation.id.in_(expired), StockReservation.expires_at <= now)
+                .returning(StockReservation.product_id, StockReservation.quantity)
+            )).all()
+            if not rows:
+                await self.db.commit()
+                return released
+            returned = _sum_by_product(rows)
+            await self.db.execute(restock_statement(returned))
+            await self.db.commit()
+            invalidate_stock_changes(returned)
+            released += len(rows)
+            if len(rows) < batch_size:
+                return released
+
+
+async def run_reservation_sweeper(interval: Optional[float] = None) -> None:
+    """Background task: release expired holds every `interval` seconds until cancelled."""
+    interval = settings.RESERVATION_SWEEP_INTERVAL if interval is None else interval
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with AsyncSessionLocal() as db:
+                released = await InventoryService(db).release_expired()
+            if released:
+                logger.info("Released %d expired stock reservations", released)
+        except Exception:  # keep sweeping; the next run retries the same rows
+            logger.exception("Stock reservation sweep failed")
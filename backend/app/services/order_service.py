@@ -1,48 +1,171 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
-from app.models.order import Order
-from app.schemas.order import OrderCreate, OrderUpdate
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.schemas.order import OrderCreate, OrderItemCreate, OrderUpdate
+from app.services.inventory_service import consume_reservations_statement, decrement_stock_statement
+from app.services.product_service import invalidate_stock
+from app.utils.pagination import decode_cursor, encode_cursor
 
-class OrderService:
-    def __init__(self, db: Session):
+
+def _merge_lines(items: Iterable[OrderItemCreate]) -> Dict[int, int]:
+    """Collapse order lines into product_id -> total quantity."""
+    quantities: Dict[int, int] = {}
+    for item in items:
+        if item.quantity <= 0:
+            raise HTTPException(status_code=400, detail="Quantity must be positive")
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    if not quantities:
+        raise HTTPException(status_code=400, detail="Order must contain at least one item")
+    return quantities
+
+
+def _net_quantities(quantities: Dict[int, int], held: Iterable[Tuple[int, int]]) -> Dict[int, int]:
+    """
+    Stock still to take per line once the user's cart holds are used up
+    (negative when a hold exceeded the line, returning the excess to stock).
+    """
+    net = dict(quantities)
+    for product_id, quantity in held:
+        net[product_id] -= quantity
+    return net
+
+
+def _stock_error(quantities: Dict[int, int], updated: Iterable[int], stock: Dict[int, int]) -> HTTPException:
+    """
+    Explain why the guarded decrement didn't cover every line. The lines it
+    didn't update are unknown products or lacked stock when it ran; `stock`
+    is re-read afterwards, so it only tells which products exist.
+    """
+    missing = sorted(pid for pid in quantities if pid not in stock)
+    if missing:
+        return HTTPException(status_code=404, detail=f"Products not found: {missing}")
+    updated = set(updated)
+    short = sorted(pid for pid in quantities if pid not in updated)
+    return HTTPException(status_code=409, detail=f"Insufficient stock for products: {short}")
+
+
+def _order_item_rows(quantities: Dict[int, int], prices: Dict[int, float]) -> List[Dict]:
+    """Parameter sets for the executemany INSERT of the order's items."""
+    return [
+        {"product_id": product_id, "quantity": quantity, "unit_price": prices[product_id]}
+        for product_id, quantity in quantities.items()
+    ]
+
+
+def _orders_statement():
+    """
+    Orders with items and their products eagerly loaded: one query for the
+    orders plus one IN (...) query per relationship, whatever the page size.
+    """
+    return select(Order).options(selectinload(Order.items).selectinload(OrderItem.product))
+
+
+def _order_statement(order_id: int):
+    # populate_existing so an order already in the session is reloaded with its items
+    return (
+        _orders_statement()
+        .where(Order.id == order_id)
+        .execution_options(populate_existing=True)
+    )
+
+
+def _orders_page_statement(limit: int, cursor: Optional[str], user_id: Optional[int]):
+    """Newest-first keyset page of orders (fetches one extra row to detect the next page)."""
+    stmt = _orders_statement()
+    if user_id is not None:
+        stmt = stmt.where(Order.user_id == user_id)
+    if cursor:
+        (last_id,) = decode_cursor("-id", cursor, 1)
+        stmt = stmt.where(Order.id < last_id)
+    return stmt.order_by(Order.id.desc()).limit(limit + 1)
+
+
+def _orders_page_result(orders: List[Order], limit: int) -> Tuple[List[Order], Optional[str]]:
+    if len(orders) <= limit:
+        return orders, None
+    page = orders[:limit]
+    return page, encode_cursor("-id", [page[-1].id])
+
+
+class AsyncOrderService:
+    """Order placement and lookups on an AsyncSession."""
+
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def create_order(self, order: OrderCreate) -> Order:
-        """Create a new order."""
-        db_order = Order(
-            user_id=order.user_id,
-            total_amount=0,  # Calculate from items
-            status="pending"
-        )
-        self.db.add(db_order)
-        self.db.commit()
-        self.db.refresh(db_order)
-        return db_order
+    async def create_order(self, order: OrderCreate, caller_id: Optional[int] = None) -> Order:
+        """
+        Create a new order: use up the caller's cart holds, decrement the rest
+        of the stock, price the lines and insert the order with all its items
+        in a single transaction. Anonymous callers have no holds to use up.
+        """
+        quantities = _merge_lines(order.items)
+        try:
+            held = []
+            if caller_id is not None:
+                held = (await self.db.execute(consume_reservations_statement(caller_id, quantities))).all()
+            net = _net_quantities(quantities, held)
+            rows = (await self.db.execute(decrement_stock_statement(net))).all()
+            if len(rows) != len(quantities):
+                await self.db.rollback()
+                stock = (await self.db.execute(
+                    select(Product.id, Product.stock).where(Product.id.in_(list(quantities)))
+                )).all()
+                raise _stock_error(net, (row.id for row in rows), dict(stock))
+            item_rows = _order_item_rows(quantities, {row.id: row.price or 0 for row in rows})
+            total = sum(row["unit_price"] * row["quantity"] for row in item_rows)
+            db_order = Order(user_id=order.user_id, total_amount=round(total, 2), status="pending")
+            self.db.add(db_order)
+            await self.db.flush()
+            await self.db.execute(insert(OrderItem), [dict(row, order_id=db_order.id) for row in item_rows])
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+        # Only these products' stock moved; the rest of the catalog stays cached
+        invalidate_stock(net, restocked=any(quantity < 0 for quantity in net.values()))
+        return await self.get_order(db_order.id)
 
-    def get_order(self, order_id: int) -> Optional[Order]:
-        """Get an order by ID."""
-        return self.db.query(Order).filter(Order.id == order_id).first()
+    async def get_order(self, order_id: int) -> Optional[Order]:
+        """Get an order by ID with its items and products."""
+        result = await self.db.execute(_order_statement(order_id))
+        return result.scalars().first()
 
-    def update_order(self, order_id: int, order_update: OrderUpdate) -> Optional[Order]:
+    async def update_order(self, order_id: int, order_update: OrderUpdate) -> Optional[Order]:
         """Update an order."""
-        db_order = self.get_order(order_id)
+        db_order = await self.get_order(order_id)
         if db_order:
             for key, value in order_update.dict(exclude_unset=True).items():
                 setattr(db_order, key, value)
-            self.db.commit()
-            self.db.refresh(db_order)
+            await self.db.commit()
+            db_order = await self.get_order(order_id)
         return db_order
 
-    def delete_order(self, order_id: int) -> bool:
+    async def delete_order(self, order_id: int) -> bool:
         """Delete an order."""
-        db_order = self.get_order(order_id)
+        db_order = await self.get_order(order_id)
         if db_order:
-            self.db.delete(db_order)
-            self.db.commit()
+            await self.db.delete(db_order)
+            await self.db.commit()
             return True
         return False
 
-    def get_all_orders(self) -> List[Order]:
+    async def get_all_orders(self) -> List[Order]:
         """Get all orders."""
-        return self.db.query(Order).all()
\ No newline at end of file
+        result = await self.db.execute(_orders_statement().order_by(Order.id))
+        return result.scalars().all()
+
+    async def get_orders_page(
+        self, limit: int = 20, cursor: Optional[str] = None, user_id: Optional[int] = None
+    ) -> Tuple[List[Order], Optional[str]]:
+        """
+        Get one page of orders, newest first.
+        Returns the page and the cursor for the next one (None on the last page).
+        """
+        result = await self.db.execute(_orders_page_statement(limit, cursor, user_id))
+        return _orders_page_result(result.scalars().all(), limit)
@@ -1,49 +1,393 @@
-from typing import List, Dict, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Iterable, List, Dict, Optional, Tuple
 from fastapi import HTTPException
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import and_, insert, or_, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.sql import Select
 
+from app.db.routing import from_replica
+from app.db.search import FTS_TABLE, build_match_query, fts_available, search_terms
 from app.models.product import Product
 from app.schemas.product import ProductCreate, ProductUpdate
+from app.services.retrieval_service import product_index
+from app.utils.bulk_io import BulkRecord, format_rows
+from app.utils.cache import DependencyIndex, LRUCache, VersionCounter
+from app.utils.pagination import decode_cursor, encode_cursor
 
-class ProductService:
-    def __init__(self, db: Session):
+SORT_KEYS = ("id", "price")
+
+# Process-wide read-through cache for catalog reads. Entries are keyed on the
+# catalog version, so a catalog edit makes every previously cached entry
+# unreachable; stock-only changes drop just the affected entries instead.
+PRODUCT_CACHE_SIZE = 2048
+PRODUCT_CACHE_TTL = 60.0
+
+catalog_version = VersionCounter()
+product_cache = LRUCache(maxsize=PRODUCT_CACHE_SIZE, ttl=PRODUCT_CACHE_TTL)
+# Rendered (and lazily compressed) bodies of the hottest catalog responses,
+# keyed on the catalog version like product_cache
+CATALOG_PAYLOAD_CACHE_SIZE = 512
+catalog_payloads = LRUCache(maxsize=CATALOG_PAYLOAD_CACHE_SIZE, ttl=PRODUCT_CACHE_TTL)
+# Entries in both caches are linked to the products they show, so a stock-only
+# change (an order, a cart hold) drops just those entries; see invalidate_stock
+IN_STOCK_LISTINGS = "in_stock"
+stock_dependents = DependencyIndex(product_cache, catalog_payloads)
+
+# Bulk import/export: rows per INSERT batch (one commit each) and per fetch
+IMPORT_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 1000
+MAX_IMPORT_ERRORS = 1000  # errors listed in an import summary; the rest are only counted
+EXPORT_FIELDS = [column.name for column in Product.__table__.columns]
+# Errors for an imported row the database can't store (OverflowError: an integer too large for SQLite)
+DATABASE_ERRORS = (SQLAlchemyError, OverflowError)
+
+
+def stock_items(products: Iterable[Dict[str, Any]], in_stock: bool = False) -> List[Hashable]:
+    """What a cached catalog entry depends on for stock: its products, and restocks if it filters on stock."""
+    items: List[Hashable] = [p["id"] for p in products]
+    if in_stock:
+        items.append(IN_STOCK_LISTINGS)
+    return items
+
+
+def invalidate_stock(product_ids: Iterable[int], restocked: bool = False) -> None:
+    """
+    Drop the cached entries showing these products after a stock-only change,
+    leaving the rest of the catalog cached. A restock can bring a product back
+    into in_stock listings, so those are dropped as well.
+    """
+    items: List[Hashable] = list(product_ids)
+    if restocked:
+        items.append(IN_STOCK_LISTINGS)
+    stock_dependents.invalidate(items)
+
+
+def _cursor_key(sort: str, product: Product) -> List[Any]:
+    return [product.id] if sort == "id" else [product.price, product.id]
+
+
+# Statement builders
+
+def _page_statement(
+    limit: int,
+    cursor: Optional[str],
+    sort: str,
+    min_price: Optional[float],
+    max_price: Optional[float],
+    in_stock: bool,
+    name_prefix: Optional[str],
+) -> Select:
+    """Keyset query for one catalog page (fetches one extra row to detect the next page)."""
+    if sort not in SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"Unsupported sort key: {sort}")
+
+    stmt = select(Product)
+    if min_price is not None:
+        stmt = stmt.where(Product.price >= min_price)
+    if max_price is not None:
+        stmt = stmt.where(Product.price <= max_price)
+    if in_stock:
+        stmt = stmt.where(Product.stock > 0)
+    if name_prefix:
+        # Range comparison instead of LIKE so the name index can be used
+        stmt = stmt.where(Product.name >= name_prefix, Product.name < name_prefix + "\uffff")
+
+    if sort == "id":
+        if cursor:
+            (last_id,) = decode_cursor(sort, cursor, 1)
+            stmt = stmt.where(Product.id > last_id)
+        stmt = stmt.order_by(Product.id)
+    else:
+        stmt = stmt.where(Product.price.isnot(None))
+        if cursor:
+            last_price, last_id = decode_cursor(sort, cursor, 2)
+            stmt = stmt.where(or_(
+                Product.price > last_price,
+                and_(Product.price == last_price, Product.id > last_id),
+            ))
+        stmt = stmt.order_by(Product.price, Product.id)
+
+    return stmt.limit(limit + 1)
+
+
+def _page_result(rows: List[Product], limit: int, sort: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Split the extra row off a keyset page and build the next cursor."""
+    if len(rows) <= limit:
+        return [p.to_dict() for p in rows], None
+    page = rows[:limit]
+    return [p.to_dict() for p in page], encode_cursor(sort, _cursor_key(sort, page[-1]))
+
+
+def _search_statement(bind, query: str, match: str, limit: int, offset: int):
+    """Full-text search query; falls back to ILIKE where FTS5 isn't available."""
+    if not fts_available(bind):
+        # Every term must appear in the name or the description
+        stmt = select(Product)
+        for term in search_terms(query):
+            pattern = f"%{term}%"
+            stmt = stmt.where(or_(Product.name.ilike(pattern), Product.description.ilike(pattern)))
+        return stmt.order_by(Product.id).offset(offset).limit(limit)
+
+    # bm25 weights: a hit in the name counts ten times more than in the description
+    statement = text(f"""
+        SELECT products.* FROM {FTS_TABLE}
+        JOIN products ON products.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH :match
+        ORDER BY bm25({FTS_TABLE}, 10.0, 1.0), products.id
+        LIMIT :limit OFFSET :offset
+    """).bindparams(match=match, limit=limit, offset=offset)
+    return select(Product).from_statement(statement)
+
+
+def _product_statement(product_id: int) -> Select:
+    return select(Product).where(Product.id == product_id)
+
+
+def _row_statement(product_id: int) -> Select:
+    # populate_existing so a retry sees the row's current values and version
+    return _product_statement(product_id).execution_options(populate_existing=True)
+
+
+def _split_version(product_data: ProductUpdate) -> Tuple[Dict[str, Any], Optional[int]]:
+    """The changes to apply and the version the caller expects the row to have."""
+    changes = product_data.dict(exclude_unset=True)
+    return changes, changes.pop("version", None)
+
+
+def _version_conflict(product_id: int, version: Optional[int] = None) -> HTTPException:
+    detail = f"Product {product_id} was modified concurrently"
+    if version is not None:
+        detail += f" (current version {version})"
+    return HTTPException(status_code=409, detail=detail + "; reload it and retry")
+
+
+def _import_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate one imported record into INSERT parameters."""
+    row = ProductCreate(**record).dict()
+    row["image_url"] = record.get("image_url") or None
+    return row
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors()
+    )
+
+
+def _database_message(error: Exception) -> str:
+    """The driver's own message for a rejected row, without SQLAlchemy's statement dump."""
+    return str(getattr(error, "orig", None) or error)
+
+
+def _add_import_error(summary: Dict[str, Any], line: int, error: str) -> None:
+    summary["failed"] += 1
+    if len(summary["errors"]) < MAX_IMPORT_ERRORS:
+        summary["errors"].append({"line": line, "error": error})
+
+
+class AsyncProductService:
+    """Catalog reads and writes on an AsyncSession, through the shared product cache."""
+
+    def __init__(self, db: AsyncSession):
         self.db = db
 
-    def get_products(self) -> List[Product]:
+    async def _scalars(self, stmt) -> List[Product]:
+        result = await self.db.execute(stmt)
+        return result.scalars().all()
+
+    async def _read_through(self, key: Hashable, load: Callable[[], Awaitable[Any]],
+                            products: Callable[[Any], Iterable[Dict[str, Any]]] = lambda value: value,
+                            in_stock: bool = False) -> Any:
+        """
+        product_cache lookup; a miss is loaded and cached linked to the products
+        it holds. Misses loaded from a replica are returned but not cached.
+        """
+        value = product_cache.get(key)
+        if value is None:
+            generation = stock_dependents.generation
+            value = await load()
+            if not from_replica(self.db):
+                stock_dependents.store(product_cache, key, value,
+                                       stock_items(products(value), in_stock), generation)
+        return value
+
+    async def get_products(self) -> List[Dict[str, Any]]:
         """Get all products."""
-        return self.db.query(Product).all()
+        async def load():
+            return [p.to_dict() for p in await self._scalars(select(Product))]
+        return await self._read_through(("all", catalog_version.value), load)
+
+    async def get_product_page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        sort: str = "id",
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        in_stock: bool = False,
+        name_prefix: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Get one page of products using keyset pagination.
+        Returns the page and the cursor for the next one (None on the last page).
+        """
+        stmt = _page_statement(limit, cursor, sort, min_price, max_price, in_stock, name_prefix)
+        key = ("page", catalog_version.value, limit, cursor, sort,
+               min_price, max_price, in_stock, name_prefix)
+
+        async def load():
+            return _page_result(await self._scalars(stmt), limit, sort)
+        return await self._read_through(key, load, products=lambda page: page[0], in_stock=in_stock)
+
+    async def search_products(self, query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Full-text search over name and description, best matches first."""
+        match = build_match_query(query)
+        if not match:
+            return []
+        stmt = _search_statement(self.db.get_bind(), query, match, limit, offset)
+        key = ("search", catalog_version.value, match, limit, offset)
+
+        async def load():
+            return [p.to_dict() for p in await self._scalars(stmt)]
+        return await self._read_through(key, load)
+
+    async def get_product(self, product_id: int) -> Optional[Dict[str, Any]]:
+        """Get a product by ID (served from the catalog cache when possible)."""
+        async def load():
+            return (await self._get_product_row(product_id)).to_dict()
+        return await self._read_through(("product", catalog_version.value, product_id), load,
+                                        products=lambda product: [product])
 
-    def get_product(self, product_id: int) -> Optional[Product]:
-        """Get a product by ID."""
-        product = self.db.query(Product).filter(Product.id == product_id).first()
+    async def _get_product_row(self, product_id: int) -> Product:
+        """Load the Product row for writes, bypassing the cache."""
+        result = await self.db.execute(_row_statement(product_id))
+        product = result.scalars().first()
         if not product:
             raise HTTPException(status_code=404, detail="Product not found")
         return product
 
-    def create_product(self, product_data: ProductCreate) -> Product:
+    async def create_product(self, product_data: ProductCreate) -> Product:
         """Create a new product."""
         new_product = Product(**product_data.dict())
         self.db.add(new_product)
-        self.db.commit()
-        self.db.refresh(new_product)
+        await self.db.commit()
+        catalog_version.bump()
+        await self.db.refresh(new_product)
+        product_index.upsert(new_product.to_dict())
         return new_product
 
-    def update_product(self, product_id: int, product_data: ProductUpdate) -> Optional[Product]:
-        """Update a product."""
-        product = self.get_product(product_id)
-        if not product:
-            return None
-        for key, value in product_data.dict(exclude_unset=True).items():
+    async def update_product(self, product_id: int, product_data: ProductUpdate) -> Optional[Product]:
+        """
+        Update a product. The UPDATE only applies if the row's version is the
+        one loaded, so a concurrent change (e.g. an order taking stock) is never
+        silently overwritten: it is a 409, whether or not the caller sent the
+        `version` it expects. The changes are absolute values, so they are
+        never re-applied to a row the caller hasn't seen.
+        """
+        changes, expected = _split_version(product_data)
+        product = await self._get_product_row(product_id)
+        if expected is not None and product.version != expected:
+            raise _version_conflict(product_id, product.version)
+        for key, value in changes.items():
             setattr(product, key, value)
-        self.db.commit()
-        self.db.refresh(product)
+        try:
+            await self.db.commit()
+        except StaleDataError:
+            await self.db.rollback()
+            raise _version_conflict(product_id)
+        catalog_version.bump()
+        await self.db.refresh(product)
+        product_index.upsert(product.to_dict())
         return product
 
-    def delete_product(self, product_id: int) -> Dict[str, str]:
+    async def delete_product(self, product_id: int) -> Dict[str, str]:
         """Delete a product."""
-        product = self.get_product(product_id)
-        if not product:
-            return None
-        self.db.delete(product)
-        self.db.commit()
-        return {"message": "Product deleted successfully"}
\ No newline at end of file
+        product = await self._get_product_row(product_id)
+        await self.db.delete(product)
+        await self.db.commit()
+        catalog_version.bump()
+        product_index.remove(product_id)
+        return {"message": "Product deleted successfully"}
+
+    async def import_products(
+        self, records: AsyncIterator[BulkRecord], batch_size: int = IMPORT_BATCH_SIZE
+    ) -> Dict[str, Any]:
+        """
+        Insert parsed records in batches of `batch_size`: one executemany INSERT
+        and one commit per batch, so memory stays bounded by the batch.
+        Invalid rows are skipped and reported by line number; a batch the
+        database rejects is rolled back and retried row by row, so only the
+        rows it rejects are skipped, each reported with the database's error.
+        """
+        summary: Dict[str, Any] = {"imported": 0, "failed": 0, "batches": 0, "errors": []}
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+        async for line, record, error in records:
+            if error is None:
+                try:
+                    batch.append((line, _import_row(record)))
+                except ValidationError as e:
+                    error = _validation_message(e)
+            if error is not None:
+                _add_import_error(summary, line, error)
+            if len(batch) >= batch_size:
+                await self._insert_batch(batch, summary)
+                batch = []
+        if batch:
+            await self._insert_batch(batch, summary)
+        return summary
+
+    async def _insert_batch(self, batch: List[Tuple[int, Dict[str, Any]]], summary: Dict[str, Any]) -> None:
+        table = Product.__table__
+        try:
+            result = await self.db.execute(insert(table).returning(*table.c), [row for _, row in batch])
+            products = result.mappings().all()
+            await self.db.commit()
+        except DATABASE_ERRORS:
+            await self.db.rollback()
+            # Find the rows the database rejects, and why, one row at a time
+            products = []
+            for line, row in batch:
+                try:
+                    result = await self.db.execute(insert(table).returning(*table.c), row)
+                    product = result.mappings().one()
+                    await self.db.commit()
+                except DATABASE_ERRORS as e:
+                    await self.db.rollback()
+                    _add_import_error(summary, line, _database_message(e))
+                else:
+                    products.append(product)
+            if not products:
+                return
+        catalog_version.bump()
+        # Embed the whole batch in one step, off the event loop
+        await run_in_threadpool(product_index.upsert_many, [dict(product) for product in products])
+        summary["imported"] += len(products)
+        summary["batches"] += 1
+
+    async def export_products(self, fmt: str, batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[str]:
+        """
+        Stream the whole catalog as NDJSON or CSV, ordered by id. Rows come
+        from a server-side cursor `batch_size` at a time as plain table rows
+        (no ORM identity map), so memory doesn't grow with the catalog.
+        """
+        stmt = select(Product.__table__).order_by(Product.id).execution_options(yield_per=batch_size)
+        result = await self.db.stream(stmt)
+        header = fmt == "csv"
+        async for partition in result.mappings().partitions():
+            yield format_rows(partition, fmt, EXPORT_FIELDS, header=header)
+            header = False
+        if header:
+            yield format_rows([], fmt, EXPORT_FIELDS, header=True)
+
+    @staticmethod
+    def cache_stats() -> Dict[str, Any]:
+        """Return product cache counters and the current catalog version."""
+        return {
+            "catalog_version": catalog_version.value,
+            **product_cache.stats(),
+            "payloads": catalog_payloads.stats(),
+            "stock_invalidations": stock_dependents.invalidations,
+        }
@@ -0,0 +1,393 @@
+"""
+In-process vector retrieval over the product catalog.
+
+Products are embedded with a signed feature-hashing vectorizer (word
+unigrams and bigrams, log-scaled term frequency, name terms boosted). Each
+product is stored sparsely, as its max_features heaviest hashed features
+(bucket and weight arrays, 8 bytes per feature), so memory per product does
+not depend on the number of buckets. Rows are L2-normalised, and a query is
+a dense vector over the buckets, so gathering the query's weight at each
+stored bucket gives cosine similarity against every product.
+Queries are additionally IDF-weighted from per-bucket document frequencies.
+Nothing else is fitted on the corpus, so products can be added, changed or
+removed one row at a time.
+
+Writes made through this process update the index directly. Every
+refresh_interval seconds the next query also checks the database, so
+changes made by other workers (including stock taken by orders) are picked
+up too: rows updated since the newest one indexed are re-embedded, and the
+whole index is reloaded when the product count no longer matches.
+"""
+
+import math
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import settings
+from app.services.intent_matcher import tokenize
+
+# Hash buckets (only queries are dense); fewer buckets means more hash collisions
+DEFAULT_DIM = 1 << 16
+# Features kept per product: 48 * (int32 bucket + float32 weight) = 384 bytes
+MAX_FEATURES = 48
+NAME_WEIGHT = 3.0
+SCORE_CHUNK = 16384  # rows scored per step, bounding the per-query scratch memory
+
+
+STOP_WORDS = frozenset(
+    "a an and any anything are as at be best by can do does for from have i in is it "
+    "me my of on or phone phones please show that the their them there these this to "
+    "what which with you your".split()
+)
+
+
+def _normalize(token: str) -> str:
+    # Fold simple plurals ("iphones" -> "iphone", "cameras" -> "camera")
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def _features(text: str) -> List[str]:
+    tokens = [_normalize(t) for t in tokenize(text) if t not in STOP_WORDS]
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class HashingVectorizer:
+    def __init__(self, dim: int = DEFAULT_DIM, max_features: int = MAX_FEATURES):
+        self.dim = dim
+        self.max_features = max_features
+
+    def _accumulate(self, weights: Dict[int, float], text: str, weight: float) -> None:
+        counts: Dict[str, int] = {}
+        for feature in _features(text or ""):
+            counts[feature] = counts.get(feature, 0) + 1
+        for feature, count in counts.items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            bucket = h % self.dim
+            weights[bucket] = weights.get(bucket, 0.0) + sign * weight * (1.0 + math.log(count))
+
+    def _weights(self, name: str, description: str) -> Dict[int, float]:
+        weights: Dict[int, float] = {}
+        self._accumulate(weights, name, NAME_WEIGHT if description else 1.0)
+        self._accumulate(weights, description, 1.0)
+        return weights
+
+    def embed(self, name: str, description: str = "") -> np.ndarray:
+        """Embed a query (or product) as a dense unit vector over all buckets."""
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for bucket, weight in self._weights(name, description).items():
+            vec[bucket] = weight
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def embed_sparse(self, name: str, description: str = "") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Embed a product as (buckets, weights) arrays of length max_features:
+        its heaviest features as a unit vector, zero-padded.
+        """
+        top = sorted(
+            ((bucket, weight) for bucket, weight in self._weights(name, description).items() if weight),
+            key=lambda item: -abs(item[1]),
+        )[: self.max_features]
+        buckets = np.zeros(self.max_features, dtype=np.int32)
+        weights = np.zeros(self.max_features, dtype=np.float32)
+        if top:
+            buckets[: len(top)] = [bucket for bucket, _ in top]
+            weights[: len(top)] = [weight for _, weight in top]
+            weights /= np.linalg.norm(weights)
+        return buckets, weights
+
+
+class RetrievalResult:
+    __slots__ = ("products", "scores", "latency_ms")
+
+    def __init__(self, products: List[Dict[str, Any]], scores: List[float], latency_ms: float):
+        self.products = products
+        self.scores = scores
+        self.latency_ms = latency_ms
+
+
+class ProductIndex:
+    """Sparse product embeddings with incremental upsert/remove and top-k cosine search."""
+
+    def __init__(self, dim: int = DEFAULT_DIM,
+                 loader: Optional[Callable[[Optional[datetime]], Tuple[int, List[Dict[str, Any]]]]] = None,
+                 refresh_interval: Optional[float] = None, max_features: int = MAX_FEATURES):
+        self.vectorizer = HashingVectorizer(dim, max_features)
+        # loader(since) -> (product count, rows updated at or after `since`; all rows when None)
+        self._loader = loader
+        self._loaded = loader is None
+        self.refresh_interval = refresh_interval  # seconds between checks for other writers' changes
+        self._checked_at = 0.0
+        self._watermark: Optional[datetime] = None  # newest updated_at loaded from the database
+        self._lock = threading.RLock()
+        self._buckets = np.zeros((0, max_features), dtype=np.int32)  # per row: its features' buckets
+        self._weights = np.zeros((0, max_features), dtype=np.float32)  # ...and their weights (0 = padding)
+        self._df = np.zeros(dim, dtype=np.float64)  # products with a non-zero weight per bucket
+        self._prices = np.zeros(0, dtype=np.float64)
+        self._in_stock = np.zeros(0, dtype=bool)
+        self._ids = np.zeros(0, dtype=np.int64)  # 0 marks a free row
+        self._rows: Dict[int, int] = {}  # product id -> row
+        self._products: Dict[int, Dict[str, Any]] = {}
+        self._free: List[int] = []
+        self._size = 0  # rows in use or freed (high-water mark)
+        self.version = 0  # bumped whenever a change could alter an answer
+        self.refreshes = 0
+        self.queries = 0
+        self.total_latency_ms = 0.0
+        self.last_latency_ms = 0.0
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._reload()
+
+    def _reload(self) -> None:
+        count, products = self._loader(None)
+        self.rebuild(products)
+        self._advance(products)
+        self._checked_at = time.monotonic()
+
+    def _advance(self, products: List[Dict[str, Any]]) -> None:
+        stamps = [p["updated_at"] for p in products if p.get("updated_at") is not None]
+        if stamps and (self._watermark is None or max(stamps) > self._watermark):
+            self._watermark = max(stamps)
+
+    def refresh(self) -> None:
+        """
+        Load the index on first use; afterwards, at most every refresh_interval
+        seconds, apply the changes other workers made to the catalog.
+        """
+        if self._loader is None:
+            return
+        if not self._loaded:
+            self._ensure_loaded()
+            return
+        with self._lock:
+            if self.refresh_interval is None or time.monotonic() - self._checked_at < self.refresh_interval:
+                return
+            self._checked_at = time.monotonic()  # one caller refreshes; the rest keep the current index
+            since = self._watermark
+        # `>=` since: rows sharing the newest timestamp are re-read rather than missed
+        count, products = self._loader(since)
+        with self._lock:
+            self.upsert_many(products)
+            self._advance(products)
+            self.refreshes += 1
+            if count != len(self._rows):  # products were deleted elsewhere
+                self._reload()
+
+    def rebuild(self, products: List[Dict[str, Any]]) -> None:
+        """Replace the whole index with `products`."""
+        with self._lock:
+            capacity, width = max(len(products), 16), self.vectorizer.max_features
+            self._buckets = np.zeros((capacity, width), dtype=np.int32)
+            self._weights = np.zeros((capacity, width), dtype=np.float32)
+            self._df = np.zeros(self.vectorizer.dim, dtype=np.float64)
+            self._prices = np.full(capacity, np.inf)
+            self._in_stock = np.zeros(capacity, dtype=bool)
+            self._ids = np.zeros(capacity, dtype=np.int64)
+            self._rows, self._products, self._free, self._size = {}, {}, [], 0
+            self._loaded = True
+            self.version += 1
+            self.upsert_many(products)
+
+    def _grow(self) -> None:
+        # Grow by half rather than doubling, to bound the slack on large catalogs
+        capacity = max(16, len(self._ids) + len(self._ids) // 2)
+        buckets = np.zeros((capacity, self.vectorizer.max_features), dtype=np.int32)
+        buckets[: len(self._buckets)] = self._buckets
+        weights = np.zeros((capacity, self.vectorizer.max_features), dtype=np.float32)
+        weights[: len(self._weights)] = self._weights
+        prices = np.full(capacity, np.inf)
+        prices[: len(self._prices)] = self._prices
+        in_stock = np.zeros(capacity, dtype=bool)
+        in_stock[: len(self._in_stock)] = self._in_stock
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[: len(self._ids)] = self._ids
+        self._buckets, self._weights = buckets, weights
+        self._prices, self._in_stock, self._ids = prices, in_stock, ids
+
+    def upsert(self, product: Dict[str, Any]) -> None:
+        """Add or re-embed one product (a dict with id, name, description, price, ...)."""
+        self.upsert_many([product])
+
+    def upsert_many(self, products: Iterable[Dict[str, Any]]) -> None:
+        """
+        Add or re-embed many products, writing their rows and bucket
+        frequencies in one step. Embedding is CPU-bound: call this from a
+        worker thread, not the event loop, for large batches.
+        """
+        if not self._loaded:
+            return  # the first search loads everything, including these products
+        with self._lock:
+            latest = {product["id"]: product for product in products}
+            rows, buckets, weights, prices, in_stock = [], [], [], [], []
+            for product_id, product in latest.items():
+                stock = product.get("stock")
+                available = stock is None or stock > 0  # rows without a stock figure count as available
+                previous = self._products.get(product_id)
+                if previous is not None and all(
+                    previous.get(field) == product.get(field) for field in ("name", "description", "price")
+                ) and self._in_stock[self._rows[product_id]] == available:
+                    # Only fields no answer shows changed (e.g. a stock count that stays positive)
+                    self._products[product_id] = dict(product)
+                    continue
+                row = self._rows.get(product_id)
+                if row is None:
+                    if self._free:
+                        row = self._free.pop()
+                    else:
+                        if self._size == len(self._ids):
+                            self._grow()
+                        row = self._size
+                        self._size += 1
+                    self._rows[product_id] = row
+                row_buckets, row_weights = self.vectorizer.embed_sparse(
+                    product.get("name") or "", product.get("description") or ""
+                )
+                rows.append(row)
+                buckets.append(row_buckets)
+                weights.append(row_weights)
+                price = product.get("price")
+                prices.append(price if price is not None else np.inf)
+                in_stock.append(available)
+                self._ids[row] = product_id
+                self._products[product_id] = dict(product)
+            if not rows:
+                return
+            rows = np.array(rows)
+            buckets, weights = np.array(buckets), np.array(weights)
+            # Freed and new rows are all zero weights, so only re-embedded rows are subtracted
+            np.subtract.at(self._df, self._buckets[rows][self._weights[rows] != 0], 1)
+            np.add.at(self._df, buckets[weights != 0], 1)
+            self._buckets[rows], self._weights[rows] = buckets, weights
+            self._prices[rows] = prices
+            self._in_stock[rows] = in_stock
+            self.version += 1
+
+    def remove(self, product_id: int) -> None:
+        """Drop one product from the index."""
+        with self._lock:
+            row = self._rows.pop(product_id, None)
+            if row is None:
+                return
+            np.subtract.at(self._df, self._buckets[row][self._weights[row] != 0], 1)
+            self._buckets[row] = 0
+            self._weights[row] = 0.0
+            self._prices[row] = np.inf
+            self._in_stock[row] = False
+            self._ids[row] = 0
+            self._products.pop(product_id, None)
+            self._free.append(row)
+            self.version += 1
+
+    def _record(self, started: float) -> float:
+        latency_ms = (time.perf_counter() - started) * 1000
+        self.queries += 1
+        self.total_latency_ms += latency_ms
+        self.last_latency_ms = latency_ms
+        return latency_ms
+
+    def search(self, query: str, k: int = 3) -> RetrievalResult:
+        """Top-k products by cosine similarity to `query`."""
+        started = time.perf_counter()
+        self.refresh()
+        q = self.vectorizer.embed(query)
+        with self._lock:
+            ids, size, products = self._ids, self._size, self._products
+            # Down-weight query terms that occur in many products
+            q = q * (np.log((1.0 + len(self._rows)) / (1.0 + self._df)) + 1.0)
+            norm = np.linalg.norm(q)
+            if norm:
+                q = (q / norm).astype(np.float32)
+            scores = np.empty(size, dtype=np.float32)
+            for start in range(0, size, SCORE_CHUNK):
+                end = min(start + SCORE_CHUNK, size)
+                scores[start:end] = (q[self._buckets[start:end]] * self._weights[start:end]).sum(axis=1)
+            scores[ids[:size] == 0] = -np.inf
+            k = min(k, size)
+            if k <= 0 or not q.any():
+                return RetrievalResult([], [], self._record(started))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            hits = [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+            found = [products[pid] for pid, _ in hits]
+        return RetrievalResult(found, [s for _, s in hits], self._record(started))
+
+    def cheapest(self, k: int = 3) -> RetrievalResult:
+        """The k lowest-priced products that are in stock."""
+        started = time.perf_counter()
+        self.refresh()
+        with self._lock:
+            prices = np.where(self._in_stock[: self._size], self._prices[: self._size], np.inf)
+            ids = self._ids
+            k = min(k, int(np.isfinite(prices).sum()))
+            if k <= 0:
+                return RetrievalResult([], [], self._record(started))
+            top = np.argpartition(prices, k - 1)[:k]
+            top = top[np.argsort(prices[top])]
+            found = [self._products[int(ids[i])] for i in top if ids[i]]
+        return RetrievalResult(found, [float(p["price"]) for p in found], self._record(started))
+
+    def price_range(self) -> RetrievalResult:
+        """The lowest- and highest-priced products."""
+        started = time.perf_counter()
+        self.refresh()
+        with self._lock:
+            if not self._rows:
+                return RetrievalResult([], [], self._record(started))
+            prices, ids = self._prices[: self._size], self._ids[: self._size]
+            priced = np.isfinite(prices)
+            if not priced.any():
+                return RetrievalResult([], [], self._record(started))
+            low = int(np.argmin(np.where(priced, prices, np.inf)))
+            high = int(np.argmax(np.where(priced, prices, -np.inf)))
+            found = [self._products[int(ids[low])], self._products[int(ids[high])]]
+        return RetrievalResult(found, [float(p["price"]) for p in found], self._record(started))
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "products": len(self._rows),
+            "dim": self.vectorizer.dim,
+            "max_features": self.vectorizer.max_features,
+            "version": self.version,
+            "refreshes": self.refreshes,
+            "queries": self.queries,
+            "last_latency_ms": self.last_latency_ms,
+            "avg_latency_ms": self.total_latency_ms / self.queries if self.queries else 0.0,
+        }
+
+
+def _load_catalog(since: Optional[datetime] = None) -> Tuple[int, List[Dict[str, Any]]]:
+    from sqlalchemy import func, select
+
+    from app.db.database import SessionLocal
+    from app.models.product import Product
+
+    db = SessionLocal()
+    try:
+        count = db.scalar(select(func.count(Product.id)))
+        stmt = select(Product)
+        if since is not None:
+            stmt = stmt.where(Product.updated_at >= since)
+        return count, [p.to_dict() for p in db.scalars(stmt)]
+    finally:
+        db.close()
+
+
+# Shared instance; filled from the database on first use, kept in sync by
+# AsyncProductService and refreshed from the database for other workers' writes
+product_index = ProductIndex(loader=_load_catalog, refresh_interval=settings.CHAT_INDEX_REFRESH_INTERVAL)
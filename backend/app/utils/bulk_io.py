@@ -0,0 +1,107 @@
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+BULK_FORMATS = ("ndjson", "csv")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+# (line number, parsed record or None, error message or None)
+BulkRecord = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+
+def detect_format(content_type: Optional[str]) -> str:
+    """Pick the bulk format from a Content-Type header (NDJSON unless it says CSV)."""
+    if content_type and "csv" in content_type.lower():
+        return "csv"
+    return "ndjson"
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], encoding: str = "utf-8") -> AsyncIterator[str]:
+    """Split a byte stream into text lines without reading it all into memory."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_records(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[BulkRecord]:
+    """
+    Parse NDJSON objects or CSV rows (first row is the header) one at a time.
+    Unparseable rows are reported with their line number instead of aborting
+    the stream. A quoted CSV field may span several lines.
+    """
+    if fmt not in BULK_FORMATS:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+    header: Optional[List[str]] = None
+    record, start = "", 0
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if fmt == "ndjson":
+            if not line.strip():
+                continue
+            try:
+                value = json.loads(line)
+            except ValueError as e:
+                yield line_no, None, f"Invalid JSON: {e}"
+                continue
+            if isinstance(value, dict):
+                yield line_no, value, None
+            else:
+                yield line_no, None, "Expected a JSON object"
+            continue
+
+        # CSV: a record is complete once its double quotes are balanced
+        if not record:
+            start = line_no
+            record = line
+        else:
+            record += "\n" + line
+        if record.count('"') % 2:
+            continue
+        text, record = record, ""
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [name.strip() for name in values]
+        elif len(values) != len(header):
+            yield start, None, f"Expected {len(header)} columns, got {len(values)}"
+        else:
+            yield start, dict(zip(header, values)), None
+
+    if record:
+        yield start, None, "Unterminated quoted field"
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def format_rows(rows: Iterable[Dict[str, Any]], fmt: str, fields: List[str], header: bool = False) -> str:
+    """Serialize a batch of rows as NDJSON lines or CSV records."""
+    if fmt == "ndjson":
+        return "".join(
+            json.dumps({field: row[field] for field in fields}, default=_json_default) + "\n" for row in rows
+        )
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(fields)
+    writer.writerows(
+        [row[field].isoformat() if isinstance(row[field], datetime) else row[field] for field in fields]
+        for row in rows
+    )
+    return buffer.getvalue()
@@ -0,0 +1,177 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Set
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU cache with per-entry TTL.
+    Keeps hit/miss/eviction counters so the cache can be sized from real traffic.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if maxsize <= 0:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for `key`, or `default` if missing or expired."""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store `value`, evicting the least recently used entries past `maxsize`."""
+        expires_at = self._clock() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_set(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Read-through helper: return the cached value or compute and store it."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = factory()
+            self.set(key, value)
+        return value
+
+    async def aget_or_set(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """Async variant of get_or_set for coroutine factories."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = await factory()
+            self.set(key, value)
+        return value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove `key` and return its value (`default` if it wasn't cached)."""
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        return default if entry is _MISSING else entry[0]
+
+    def clear(self) -> None:
+        """Drop all entries (counters are kept)."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return cache counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class VersionCounter:
+    """Monotonic counter used to invalidate caches keyed on a data version."""
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> int:
+        return self._value
+
+    def bump(self) -> int:
+        with self._lock:
+            self._value += 1
+            return self._value
+
+
+class DependencyIndex:
+    """
+    Remembers which cache entries were built from which items (e.g. product
+    ids), so a change to a few items drops just those entries instead of
+    bumping a VersionCounter and emptying the caches.
+
+    Entries are stored through `store`, passing the `generation` read before
+    the data was loaded: if one of its items changed meanwhile, the entry is
+    not cached, so a load racing with a change can't resurrect stale data.
+    """
+
+    def __init__(self, *caches: LRUCache, max_refs: int = 500_000):
+        self.caches = caches
+        self.max_refs = max_refs  # past this many item -> key links, all caches are cleared
+        self._keys: Dict[Hashable, Set[Hashable]] = {}
+        self._refs = 0
+        self._generation = 0
+        self._changed_at: Dict[Hashable, int] = {}  # item -> generation of its last change
+        self._lock = threading.Lock()
+        self.invalidations = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def store(self, cache: LRUCache, key: Hashable, value: Any,
+              items: Iterable[Hashable], generation: int) -> None:
+        """Cache `value` under `key` as built from `items`, unless they changed since `generation`."""
+        items = set(items)
+        with self._lock:
+            if any(self._changed_at.get(item, 0) > generation for item in items):
+                return
+            if self._refs >= self.max_refs:
+                # Links to evicted entries pile up; start over rather than grow without bound
+                for each in self.caches:
+                    each.clear()
+                self._keys.clear()
+                self._refs = 0
+            for item in items:
+                keys = self._keys.setdefault(item, set())
+                if key not in keys:
+                    keys.add(key)
+                    self._refs += 1
+            cache.set(key, value)
+
+    def invalidate(self, items: Iterable[Hashable]) -> int:
+        """Drop every cached entry built from any of `items`. Returns how many keys were dropped."""
+        with self._lock:
+            self._generation += 1
+            keys: Set[Hashable] = set()
+            for item in set(items):
+                self._changed_at[item] = self._generation
+                linked = self._keys.pop(item, ())
+                self._refs -= len(linked)
+                keys.update(linked)
+            for key in keys:
+                for cache in self.caches:
+                    cache.pop(key)
+            self.invalidations += 1
+            return len(keys)
@@ -0,0 +1,171 @@
+"""
+Response compression.
+
+- `CompressionMiddleware` gzip/brotli-encodes complete responses above a
+  size threshold whose content type is on an allowlist. Streaming responses
+  (SSE, exports) and responses that are already encoded pass through.
+- `CachedPayload` holds an already serialized response body and memoizes
+  its compressed variants, so a cached catalog response is serialized and
+  compressed once per catalog version instead of on every request.
+"""
+
+import gzip
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.utils.http_cache import is_not_modified, not_modified, validator_headers
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024  # bytes; smaller bodies aren't worth the CPU or the header overhead
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+    "text/",
+)
+# Streamed bodies are never buffered for compression
+_NEVER_COMPRESS = ("text/event-stream",)
+
+# On-the-fly levels favour speed; cached payloads are compressed once, so harder
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+CACHED_GZIP_LEVEL = 9
+CACHED_BROTLI_QUALITY = 9
+
+
+def supported_encodings() -> Iterable[str]:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Best supported encoding the client accepts (brotli first), or None."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str, cached: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=CACHED_BROTLI_QUALITY if cached else BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=CACHED_GZIP_LEVEL if cached else GZIP_LEVEL, mtime=0)
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    content_type = content_type.lower()
+    if content_type.startswith(_NEVER_COMPRESS):
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+def _add_vary(headers: MutableHeaders) -> None:
+    vary = headers.get("vary")
+    if not vary:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = MIN_COMPRESS_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        held_start = None
+
+        async def send_wrapper(message):
+            nonlocal held_start
+            if message["type"] == "http.response.start":
+                held_start = message  # wait for the body to decide
+                return
+            if message["type"] != "http.response.body" or held_start is None:
+                await send(message)
+                return
+
+            start, held_start = held_start, None
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=list(start.get("headers", [])))
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or "content-encoding" in headers
+                or not is_compressible(headers.get("content-type"))
+            ):
+                await send(start)
+                await send(message)
+                return
+
+            encoded = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(encoded))
+            _add_vary(headers)
+            await send({**start, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": encoded})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class CachedPayload:
+    """A rendered response body with its validators, plus lazily built compressed copies."""
+
+    def __init__(self, body: bytes, etag: str, modified: Optional[datetime] = None,
+                 headers: Optional[Dict[str, str]] = None, media_type: str = "application/json"):
+        self.body = body
+        self.etag = etag
+        self.modified = modified
+        self.headers = headers or {}  # sent with 200 and 304 alike, e.g. X-Next-Cursor
+        self.media_type = media_type
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: str) -> bytes:
+        body = self._encoded.get(encoding)
+        if body is None:
+            # Two racing requests may both compress; either result is fine to keep
+            body = self._encoded[encoding] = compress(self.body, encoding, cached=True)
+        return body
+
+    def response(self, request: Request, minimum_size: int = MIN_COMPRESS_SIZE) -> Response:
+        """304, or the body in the best encoding the client accepts."""
+        if is_not_modified(request, self.etag, self.modified):
+            return not_modified(self.etag, self.modified, extra_headers=self.headers)
+        headers = {**validator_headers(self.etag, self.modified), **self.headers}
+        body = self.body
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        if encoding is not None and len(body) >= minimum_size:
+            body = self.encoded(encoding)
+            headers["Content-Encoding"] = encoding
+        if len(self.body) >= minimum_size:
+            headers["Vary"] = "Accept-Encoding"
+        return Response(body, media_type=self.media_type, headers=headers)
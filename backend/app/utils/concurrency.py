@@ -0,0 +1,112 @@
+import asyncio
+import math
+from collections import deque
+from typing import Any, Deque, Dict
+
+from fastapi import HTTPException
+
+
+class ConcurrencyLimiter:
+    """
+    Admission control for an expensive operation:
+    - at most `max_in_flight` callers hold a slot at once;
+    - up to `max_queue` more wait in FIFO order for at most `queue_timeout` seconds;
+    - beyond that callers are turned away right away with 429 (queue full),
+      and waiters that time out get 503, both with a Retry-After header.
+    A released slot is handed directly to the oldest waiter, so newcomers
+    can't overtake the queue.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float,
+                 name: str = "operation"):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.name = name
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def _retry_after(self) -> str:
+        return str(max(1, math.ceil(self.queue_timeout)))
+
+    async def acquire(self) -> None:
+        """Take a slot, waiting in the queue if needed; raises 429/503 when overloaded."""
+        if self._in_flight < self.max_in_flight and not self.waiting:
+            self._in_flight += 1
+            self.admitted += 1
+            return
+
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many concurrent {self.name} requests",
+                headers={"Retry-After": self._retry_after()},
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise HTTPException(
+                status_code=503,
+                detail=f"Timed out waiting for a free {self.name} slot",
+                headers={"Retry-After": self._retry_after()},
+            )
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+        self.admitted += 1
+
+    def release(self) -> None:
+        """Give the slot to the oldest live waiter, or free it."""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight -= 1
+
+    async def __aenter__(self) -> "ConcurrencyLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "in_flight": self._in_flight,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
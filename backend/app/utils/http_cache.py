@@ -0,0 +1,86 @@
+"""
+Conditional GET helpers (ETag / Last-Modified / 304) for catalog reads.
+
+ETags are derived from the rows' versions (id + updated_at), so they are
+identical across workers and restarts and change whenever a row on the page
+is updated, added or removed. They are weak validators: the same tag is sent
+for the identity, gzip and br bodies, which differ byte for byte but carry
+the same representation (RFC 9110 8.8.1), so a strong tag would be wrong.
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Iterable, Optional
+
+from fastapi import Request, Response
+
+# Browsers/CDNs may reuse a catalog response for a few seconds, then must revalidate
+CATALOG_CACHE_CONTROL = "public, max-age=10, stale-while-revalidate=30"
+
+
+def row_version(product: Dict[str, Any]) -> str:
+    updated_at = product.get("updated_at")
+    if updated_at is not None:
+        return f"{product['id']}@{updated_at.isoformat()}"
+    # Rows written before updated_at existed: fall back to their content
+    return hashlib.sha1(repr(sorted(product.items())).encode()).hexdigest()
+
+
+def make_etag(products: Iterable[Dict[str, Any]], *extra: Any) -> str:
+    """Weak ETag for a representation built from `products` (plus e.g. the next cursor)."""
+    digest = hashlib.sha1()
+    for product in products:
+        digest.update(row_version(product).encode())
+        digest.update(b"\0")
+    for part in extra:
+        digest.update(repr(part).encode())
+    return f'W/"{digest.hexdigest()[:32]}"'
+
+
+def last_modified(product: Dict[str, Any]) -> Optional[datetime]:
+    """updated_at as an aware UTC datetime truncated to HTTP-date precision."""
+    updated_at = product.get("updated_at")
+    if updated_at is None:
+        return None
+    return updated_at.replace(microsecond=0, tzinfo=updated_at.tzinfo or timezone.utc)
+
+
+def is_not_modified(request: Request, etag: str, modified: Optional[datetime] = None) -> bool:
+    """
+    Evaluate If-None-Match (weak comparison, as RFC 7232 allows for GET) or,
+    only when it is absent, If-Modified-Since.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {_opaque(tag) for tag in if_none_match.split(",")}
+        return "*" in tags or _opaque(etag) in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return modified <= since
+    return False
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def validator_headers(etag: str, modified: Optional[datetime] = None) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": CATALOG_CACHE_CONTROL}
+    if modified is not None:
+        headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+    return headers
+
+
+def not_modified(etag: str, modified: Optional[datetime] = None,
+                 extra_headers: Optional[Dict[str, str]] = None) -> Response:
+    """Empty 304 carrying the same validators a 200 would have had."""
+    return Response(status_code=304, headers={**validator_headers(etag, modified), **(extra_headers or {})})
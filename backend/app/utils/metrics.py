@@ -0,0 +1,284 @@
+"""
+In-process request and database metrics with Prometheus text exposition.
+
+`MetricsMiddleware` (plain ASGI, a handful of counter updates per request)
+records per-route latency histograms, status counters and an
+in-flight gauge. `instrument_engine` hooks SQLAlchemy cursor events so each
+request also reports how many queries it ran and how long they took; the
+per-request counters travel in a ContextVar, which follows the request into
+the threadpool and into SQLAlchemy's async greenlets.
+
+These are the only statement timing hooks: the query diagnostics in
+app/db/query_log.py subscribe to them (`add_query_observer`) and read the
+per-request statement counts (`request_observers`) instead of adding their own.
+"""
+
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+QUERY_LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5, 1.0)
+
+UNMATCHED_ROUTE = "unmatched"  # keeps label cardinality bounded for 404 scans
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label set."""
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float]):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        # labels -> per-bucket counts (the last one for values above every bound), then the sum
+        self._series: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: Labels = ()) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self) -> Dict[Labels, Tuple[List[int], int, float]]:
+        """Cumulative bucket counts, total count and sum for every label set."""
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        result = {}
+        for labels, series in snapshot.items():
+            cumulative, running = [], 0
+            for count in series[: len(self.buckets) + 1]:
+                running += count
+                cumulative.append(running)
+            result[labels] = (cumulative, running, series[-1])
+        return result
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, (cumulative, count, total) in sorted(self.collect().items()):
+            for bound, value in zip(self.buckets + (float("inf"),), cumulative):
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', le),))} {value}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: Labels = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines.extend(f"{self.name}{_format_labels(labels)} {_format_value(value)}" for labels, value in values)
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def add(self, amount: float) -> None:
+        with self._lock:
+            self.value += amount
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge",
+                f"{self.name} {_format_value(self.value)}"]
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels) + "}"
+
+
+class RequestStats:
+    """DB work done on behalf of one request."""
+
+    __slots__ = ("queries", "db_seconds", "statements")
+
+    def __init__(self, track_statements: bool = False):
+        self.queries = 0
+        self.db_seconds = 0.0
+        # statement text -> executions, kept only when a request observer needs it
+        self.statements: Optional[Dict[str, int]] = {} if track_statements else None
+
+    def repeated(self, threshold: int) -> List[Tuple[str, int]]:
+        """Statements executed at least `threshold` times, most frequent first."""
+        counts = sorted((self.statements or {}).items(), key=lambda item: -item[1])
+        return [(statement, count) for statement, count in counts if count >= threshold]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.request_duration = Histogram(
+            "http_request_duration_seconds", "HTTP request latency by route.", LATENCY_BUCKETS)
+        self.requests = Counter("http_requests_total", "HTTP responses by route and status code.")
+        self.in_flight = Gauge("http_requests_in_flight", "HTTP requests currently being served.")
+        self.request_queries = Histogram(
+            "http_request_db_queries", "Database queries issued per HTTP request.", QUERY_COUNT_BUCKETS)
+        self.request_db_seconds = Counter(
+            "http_request_db_seconds_total", "Time spent in database queries by route.")
+        self.query_duration = Histogram(
+            "db_query_duration_seconds", "Latency of individual database queries.", QUERY_LATENCY_BUCKETS)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in (self.request_duration, self.requests, self.in_flight,
+                       self.request_queries, self.request_db_seconds, self.query_duration):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+_request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+_QUERY_START_KEY = "metrics_query_start"
+
+# (conn, statement, parameters, executemany, seconds) callbacks per engine
+QueryObserver = Callable[[Any, str, Any, bool, float], None]
+_query_observers: "weakref.WeakKeyDictionary[Engine, List[QueryObserver]]" = weakref.WeakKeyDictionary()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_QUERY_START_KEY, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get(_QUERY_START_KEY)
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    metrics.query_duration.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if stats.statements is not None:
+            stats.statements[statement] = stats.statements.get(statement, 0) + 1
+    for observer in _query_observers.get(conn.engine, ()):
+        observer(conn, statement, parameters, executemany, elapsed)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    conn = exception_context.connection
+    if conn is not None and conn.info.get(_QUERY_START_KEY):
+        conn.info[_QUERY_START_KEY].pop()
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every query run through `engine` (pass `async_engine.sync_engine` for async engines)."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+
+def add_query_observer(engine: Engine, observer: QueryObserver) -> None:
+    """Call `observer` with every statement `engine` completes and its duration (instruments the engine)."""
+    instrument_engine(engine)
+    _query_observers.setdefault(engine, []).append(observer)
+
+
+def _route_template(scope) -> str:
+    """
+    Path template of the matched route, e.g. /api/products/{product_id}.
+    Routes of included routers may only know their own part of the path, so
+    the prefix is recovered from the request path.
+    """
+    route = scope.get("route")
+    template = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if not template:
+        return UNMATCHED_ROUTE
+    path = scope.get("path", "")
+    try:
+        suffix = template.format(**{key: str(value) for key, value in scope.get("path_params", {}).items()})
+    except (KeyError, IndexError, ValueError):
+        return template
+    if suffix and path.endswith(suffix):
+        return path[: len(path) - len(suffix)] + template
+    return template
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and DB usage for every HTTP request.
+    Each of `request_observers` is called with (scope, RequestStats) when a
+    request finishes; with any of them the stats also count statements.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry = metrics,
+                 request_observers: Sequence[Callable[[dict, RequestStats], None]] = ()):
+        self.app = app
+        self.registry = registry
+        self.request_observers = tuple(request_observers)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        status = 500
+        stats = RequestStats(track_statements=bool(self.request_observers))
+        token = _request_stats.set(stats)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        registry.in_flight.add(1)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            registry.in_flight.add(-1)
+            _request_stats.reset(token)
+            labels = (("method", scope["method"]), ("route", _route_template(scope)))
+            registry.request_duration.observe(elapsed, labels)
+            registry.requests.inc(labels + (("status", str(status)),))
+            registry.request_queries.observe(stats.queries, labels)
+            if stats.db_seconds:
+                registry.request_db_seconds.inc(labels, stats.db_seconds)
+            for observer in self.request_observers:
+                observer(scope, stats)
@@ -0,0 +1,24 @@
+import base64
+import json
+from typing import Any, List
+
+from fastapi import HTTPException
+
+
+def encode_cursor(sort: str, key: List[Any]) -> str:
+    """Encode a keyset position (the sort key values of the last row) as an opaque cursor."""
+    payload = json.dumps({"s": sort, "k": key}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(sort: str, cursor: str, size: int) -> List[Any]:
+    """Decode a cursor produced by `encode_cursor`, checking it matches the sort order."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        key = payload["k"]
+        if payload["s"] != sort or not isinstance(key, list) or len(key) != size:
+            raise ValueError("cursor does not match sort order")
+        return key
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,3 @@
+# backend/benchmarks/__init__.py
+
+# This file is intentionally left blank.
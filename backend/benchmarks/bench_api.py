@@ -0,0 +1,279 @@
+"""
+In-process API benchmark: drives the ASGI app through httpx's ASGI transport
+against a database seeded with `app.db.seed --scale`, so the numbers cover
+routing, validation, services and SQL but no network or server.
+
+Every scenario (product list/detail/search, cart, orders, chat) runs at each
+concurrency level and reports p50/p95/p99 latency, requests per second and
+non-2xx responses. Results can be written to JSON and compared against a
+stored baseline; a scenario regresses when its p95 grows or its throughput
+drops by more than --threshold, or when its share of non-2xx responses
+rises by more than --threshold of the baseline's share (and at least
+MIN_ERROR_RATE_RISE). Latency is not compared for a scenario that is mostly
+rejected (e.g. chat at high concurrency answered with 429s), since failing
+fast would look like a speed-up.
+
+Usage (from backend/):
+    python -m benchmarks.bench_api --scale 0.1 --output results.json
+    python -m benchmarks.bench_api --compare benchmarks/baselines/api.json
+    python -m benchmarks.bench_api --results results.json --compare benchmarks/baselines/api.json
+
+Absolute numbers depend on the machine; refresh the baseline (--output over
+it) when moving to different hardware. Tail latencies of single runs are
+noisy on shared machines, so re-run before acting on one flagged scenario.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+DEFAULT_CONCURRENCY = "1,8,32"
+DEFAULT_THRESHOLD = 0.30
+# Smallest rise in the non-2xx share that counts as a regression (absolute, 0-1)
+MIN_ERROR_RATE_RISE = 0.02
+# Above this non-2xx share a scenario's latency and throughput are not compared
+MOSTLY_REJECTED = 0.5
+SEARCH_TERMS = ["galaxy", "pixel", "titanium", "camera zoom", "iphone pro", "battery", "fold", "xperia"]
+CHAT_MESSAGES = [
+    "What's your cheapest phone?",
+    "Do you have Samsung phones?",
+    "What price range do you have?",
+    "phone with a good camera",
+    "hello",
+]
+
+
+# Each scenario returns (method, url, request kwargs) for one request
+
+def product_list(rng, ctx):
+    params = {"limit": 50}
+    if rng.random() < 0.5:
+        params.update(sort="price", min_price=rng.randint(100, 1500))
+    return "GET", "/api/products/", {"params": params}
+
+
+def product_detail(rng, ctx):
+    return "GET", f"/api/products/{rng.randint(*ctx['products'])}", {}
+
+
+def product_search(rng, ctx):
+    return "GET", "/api/products/search", {"params": {"q": rng.choice(SEARCH_TERMS), "limit": 20}}
+
+
+def cart_add(rng, ctx):
+    headers = {"X-User-Id": str(rng.randint(*ctx["users"]))}
+    body = {"product_id": rng.randint(*ctx["products"]), "quantity": 1}
+    return "POST", "/api/cart/", {"json": body, "headers": headers}
+
+
+def cart_view(rng, ctx):
+    return "GET", "/api/cart/", {"headers": {"X-User-Id": str(rng.randint(*ctx["users"]))}}
+
+
+def order_list(rng, ctx):
+    return "GET", "/api/orders/", {"params": {"limit": 20, "user_id": rng.randint(*ctx["users"])}}
+
+
+def order_create(rng, ctx):
+    items = [{"product_id": rng.randint(*ctx["products"]), "quantity": 1} for _ in range(rng.randint(1, 3))]
+    return "POST", "/api/orders/", {"json": {"user_id": rng.randint(*ctx["users"]), "items": items}}
+
+
+def chat(rng, ctx):
+    return "POST", "/api/chat", {"json": {"message": rng.choice(CHAT_MESSAGES), "user_id": f"bench{rng.randint(1, 100)}"}}
+
+
+SCENARIOS = {
+    "product_list": product_list,
+    "product_detail": product_detail,
+    "product_search": product_search,
+    "cart_add": cart_add,
+    "cart_view": cart_view,
+    "order_list": order_list,
+    "order_create": order_create,
+    "chat": chat,
+}
+
+
+def percentile(sorted_values, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(q / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+async def run_scenario(client, name: str, requests: int, concurrency: int, ctx: dict, seed: int) -> dict:
+    build = SCENARIOS[name]
+    rng = random.Random(f"{seed}-{name}-{concurrency}")
+    calls = [build(rng, ctx) for _ in range(requests)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], Counter()
+
+    async def one(method, url, kwargs):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(*call) for call in calls))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "scenario": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "errors": sum(count for status, count in statuses.items() if status >= 300),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def prepare_database(args) -> dict:
+    """Point the app at the benchmark database (seeding it if needed); return id ranges."""
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        tmpdir = tempfile.mkdtemp(prefix="bench-api-")
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+
+    # Imported only now: both modules build their engines from DATABASE_URL
+    from sqlalchemy import func, select
+    from app.db import seed
+    from app.models.product import Product
+    from app.models.user import User
+
+    if not args.database_url:
+        print(f"Seeding scale {args.scale} dataset into {os.environ['DATABASE_URL']} ...")
+        seed.seed_scale(args.scale, seed=args.seed)
+    with seed.engine.connect() as conn:
+        ranges = {
+            "products": tuple(conn.execute(select(func.min(Product.id), func.max(Product.id))).one()),
+            "users": tuple(conn.execute(select(func.min(User.id), func.max(User.id))).one()),
+        }
+    seed.engine.dispose()
+    if None in ranges["products"] or None in ranges["users"]:
+        raise SystemExit("The benchmark database needs products and users; seed it with --scale")
+    return ranges
+
+
+async def run_all(args, ctx: dict) -> list:
+    import httpx
+    from app.main import app
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in names:
+            # Warm-up: connection pools, statement caches, the lazily built product index
+            await run_scenario(client, name, min(20, args.requests), 1, ctx, args.seed + 1)
+            for level in levels:
+                result = await run_scenario(client, name, args.requests, level, ctx, args.seed)
+                results.append(result)
+                print_result(result)
+    return results
+
+
+def print_header() -> None:
+    print(f"{'scenario':<16}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+
+
+def print_result(r: dict) -> None:
+    print(f"{r['scenario']:<16}{r['concurrency']:>6}{r['rps']:>10.1f}{r['p50_ms']:>10.2f}"
+          f"{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['errors']:>8}")
+
+
+def error_rate(result: dict) -> float:
+    """Share of the scenario's responses that were not 2xx."""
+    return result["errors"] / result["requests"] if result["requests"] else 0.0
+
+
+def compare(results: list, baseline: list, threshold: float) -> list:
+    """Return a description of every scenario that regressed against the baseline."""
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        base = previous.get((r["scenario"], r["concurrency"]))
+        if base is None:
+            continue
+        rate, base_rate = error_rate(r), error_rate(base)
+        if rate - base_rate > max(base_rate * threshold, MIN_ERROR_RATE_RISE):
+            regressions.append(f"{r['scenario']}@{r['concurrency']}: non-2xx {base_rate:.1%} -> {rate:.1%} "
+                               f"({base['statuses']} -> {r['statuses']})")
+        if max(rate, base_rate) > MOSTLY_REJECTED:
+            continue  # latency of mostly failed requests says nothing about the route
+        if base["p95_ms"] and r["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{r['scenario']}@{r['concurrency']}: p95 {base['p95_ms']:.2f} -> {r['p95_ms']:.2f} ms")
+        if base["rps"] and r["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{r['scenario']}@{r['concurrency']}: rps {base['rps']:.1f} -> {r['rps']:.1f}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="In-process API latency/throughput benchmark")
+    parser.add_argument("--scale", type=float, default=0.1, help="Seeder scale for the generated database")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", help="Benchmark an already seeded database instead")
+    parser.add_argument("--requests", type=int, default=300, help="Requests per scenario and concurrency level")
+    parser.add_argument("--concurrency", default=DEFAULT_CONCURRENCY, help="Comma-separated levels")
+    parser.add_argument("--scenarios", help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--results", help="Compare this results file instead of running the benchmark")
+    parser.add_argument("--compare", help="Baseline JSON file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed relative p95 increase / rps decrease / non-2xx share increase (default 0.30)")
+    args = parser.parse_args()
+
+    if args.results:
+        with open(args.results) as f:
+            report = json.load(f)
+    else:
+        ctx = prepare_database(args)
+        print_header()
+        results = asyncio.run(run_all(args, ctx))
+        report = {
+            "meta": {
+                "scale": None if args.database_url else args.scale,
+                "seed": args.seed,
+                "requests": args.requests,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+            },
+            "results": results,
+        }
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2)
+                f.write("\n")
+            print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(report["results"], baseline["results"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
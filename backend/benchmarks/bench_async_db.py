@@ -0,0 +1,149 @@
+"""
+Concurrency benchmark: sync Session vs AsyncSession inside async handlers.
+
+Runs the same catalog query from many concurrent `async def` tasks, once
+through a blocking sync Session (the old route pattern) and once through an
+AsyncSession (aiosqlite), and reports throughput, latency and how long the
+event loop was stalled. The loop lag column is the headline number: with
+sync sessions every other request (health checks, cached reads, chat) waits
+behind each query. Throughput gains additionally depend on having more than
+one core or a networked database.
+
+Usage (from backend/):
+    python -m benchmarks.bench_async_db --products 50000 --requests 400 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.db.database import Base, to_async_url
+import app.models  # noqa: F401
+
+QUERY = text(
+    "SELECT count(*), avg(price) FROM products "
+    "WHERE description LIKE :pattern AND price BETWEEN :low AND :high"
+)
+
+
+def seed(url: str, count: int) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    words = ["camera", "battery", "display", "titanium", "charging", "zoom", "foldable", "budget"]
+    rows = [
+        {
+            "name": f"Phone {i}",
+            "description": " ".join(rng.choice(words) for _ in range(30)),
+            "price": round(rng.uniform(100, 2000), 2),
+            "stock": rng.randint(0, 100),
+        }
+        for i in range(count)
+    ]
+    with engine.begin() as conn:
+        conn.execute(
+            text("INSERT INTO products (name, description, price, stock) "
+                 "VALUES (:name, :description, :price, :stock)"),
+            rows,
+        )
+    engine.dispose()
+
+
+def params(i: int) -> dict:
+    low = 100 + (i * 37) % 1500
+    return {"pattern": "%zoom%", "low": low, "high": low + 400}
+
+
+async def heartbeat(stop: asyncio.Event, lags: list, interval: float = 0.001) -> None:
+    """Measure how late the event loop wakes us up; large values mean it was blocked."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lags.append(loop.time() - start - interval)
+
+
+async def run(label: str, handler, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await handler(i)
+            latencies.append(time.perf_counter() - start)
+
+    stop = asyncio.Event()
+    lags: list = []
+    beat = asyncio.create_task(heartbeat(stop, lags))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await beat
+
+    latencies.sort()
+    return {
+        "mode": label,
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "max_loop_lag_ms": max(lags, default=0.0) * 1000,
+    }
+
+
+async def main_async(args) -> None:
+    tmpdir = tempfile.mkdtemp(prefix="bench-async-db-")
+    url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+    print(f"Seeding {args.products} products into {url} ...")
+    seed(url, args.products)
+
+    sync_engine = create_engine(url, connect_args={"check_same_thread": False})
+    SyncSession = sessionmaker(bind=sync_engine)
+    async_engine = create_async_engine(to_async_url(url), pool_size=args.concurrency)
+    AsyncSessionFactory = sessionmaker(bind=async_engine, class_=AsyncSession)
+
+    async def blocking_handler(i: int) -> None:
+        with SyncSession() as db:  # type: Session
+            db.execute(QUERY, params(i)).all()
+
+    async def async_handler(i: int) -> None:
+        async with AsyncSessionFactory() as db:
+            (await db.execute(QUERY, params(i))).all()
+
+    # Warm up both pools and the page cache
+    await blocking_handler(0)
+    await async_handler(0)
+
+    results = [
+        await run("sync Session", blocking_handler, args.requests, args.concurrency),
+        await run("AsyncSession", async_handler, args.requests, args.concurrency),
+    ]
+
+    print(f"\n{args.requests} requests, concurrency {args.concurrency}")
+    print(f"{'mode':<14}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'max loop lag ms':>18}")
+    for r in results:
+        print(f"{r['mode']:<14}{r['rps']:>10.1f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['max_loop_lag_ms']:>18.2f}")
+
+    sync_engine.dispose()
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Sync vs async DB session concurrency benchmark")
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
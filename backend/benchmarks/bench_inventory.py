@@ -0,0 +1,187 @@
+"""
+Contention benchmark: hundreds of concurrent buyers on one SKU.
+
+Every buyer tries to take one unit of a product that has far less stock
+than there are buyers. Four strategies are compared on the same database
+file:
+
+- read-modify-write: read the stock, then write back stock - 1. This is
+  what overwriting `stock` through the ORM amounted to before the version
+  column, and it loses updates and oversells.
+- version CAS: read stock and version, then UPDATE ... WHERE version = the
+  one read. A buyer who loses the race re-reads and retries, with jittered
+  exponential backoff and at most --max-retries retries.
+- guarded decrement: the single UPDATE ... WHERE stock >= 1 that orders use
+  (inventory_service.decrement_stock_statement). It never retries.
+- cart hold: InventoryService.hold, which reserves one unit per cart the way
+  add-to-cart does. After the run every hold is expired and swept, and the
+  stock must be back to its starting value.
+
+For each strategy the benchmark reports units sold, final stock, oversold
+units, retries, buyers who gave up, p95 latency per buyer and throughput.
+
+Usage (from backend/):
+    python -m benchmarks.bench_inventory --buyers 500 --stock 100
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.database import Base, create_async_db_engine, create_db_engine
+from app.models.product import Product
+from app.services.inventory_service import InventoryService, decrement_stock_statement
+import app.models  # noqa: F401
+
+SKU = 1
+
+
+async def read_modify_write(db: AsyncSession, buyer: int, args, rng) -> tuple:
+    stock = (await db.execute(select(Product.stock).where(Product.id == SKU))).scalar_one()
+    if stock <= 0:
+        return False, 0
+    await db.execute(update(Product).where(Product.id == SKU).values(stock=stock - 1))
+    await db.commit()
+    return True, 0
+
+
+async def version_cas(db: AsyncSession, buyer: int, args, rng) -> tuple:
+    for attempt in range(args.max_retries + 1):
+        row = (await db.execute(select(Product.stock, Product.version).where(Product.id == SKU))).one()
+        if row.stock <= 0:
+            await db.commit()
+            return False, attempt
+        result = await db.execute(
+            update(Product)
+            .where(Product.id == SKU, Product.version == row.version)
+            .values(stock=row.stock - 1, version=row.version + 1)
+        )
+        await db.commit()
+        if result.rowcount == 1:
+            return True, attempt
+        await asyncio.sleep(rng.uniform(0, min(args.backoff_cap, args.backoff * 2 ** attempt)))
+    return None, args.max_retries  # gave up
+
+
+async def guarded_decrement(db: AsyncSession, buyer: int, args, rng) -> tuple:
+    rows = (await db.execute(decrement_stock_statement({SKU: 1}))).all()
+    await db.commit()
+    return bool(rows), 0
+
+
+async def cart_hold(db: AsyncSession, buyer: int, args, rng) -> tuple:
+    try:
+        await InventoryService(db).hold(cart_id=buyer, product_id=SKU, quantity=1)
+    except HTTPException:
+        await db.rollback()
+        return False, 0
+    await db.commit()
+    return True, 0
+
+
+STRATEGIES = {
+    "read-modify-write": read_modify_write,
+    "version CAS": version_cas,
+    "guarded decrement": guarded_decrement,
+    "cart hold": cart_hold,
+}
+
+
+async def run(engine, strategy, args) -> dict:
+    async with AsyncSession(engine) as db:
+        await db.execute(update(Product).where(Product.id == SKU).values(stock=args.stock, version=1))
+        await db.commit()
+
+    gate = asyncio.Event()
+    latencies, retries, outcomes = [], [], []
+
+    async def buyer(index: int):
+        rng = random.Random(index)
+        await gate.wait()  # everyone starts at once
+        start = time.perf_counter()
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            bought, attempts = await strategy(db, index + 1, args, rng)
+        latencies.append(time.perf_counter() - start)
+        retries.append(attempts)
+        outcomes.append(bought)
+
+    tasks = [asyncio.create_task(buyer(i)) for i in range(args.buyers)]
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    gate.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    async with AsyncSession(engine) as db:
+        final_stock = (await db.execute(select(Product.stock).where(Product.id == SKU))).scalar_one()
+
+    sold = sum(1 for outcome in outcomes if outcome)
+    return {
+        "sold": sold,
+        "final_stock": final_stock,
+        "oversold": max(0, sold - args.stock),
+        "lost_updates": sold - (args.stock - final_stock),
+        "retries": sum(retries),
+        "max_retries": max(retries),
+        "gave_up": sum(1 for outcome in outcomes if outcome is None),
+        "p95_ms": statistics.quantiles(latencies, n=20)[-1] * 1000,
+        "rps": args.buyers / elapsed,
+    }
+
+
+async def sweep_holds(engine) -> tuple:
+    async with AsyncSession(engine) as db:
+        released = await InventoryService(db).release_expired(now=datetime.utcnow() + timedelta(days=1))
+        stock = (await db.execute(select(Product.stock).where(Product.id == SKU))).scalar_one()
+    return released, stock
+
+
+async def main_async(args) -> None:
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='bench-inventory-'), 'inventory.db')}"
+    sync_engine = create_db_engine(url)
+    Base.metadata.create_all(sync_engine)
+    with sync_engine.begin() as conn:
+        conn.execute(insert(Product).values(id=SKU, name="Flash Sale Phone", description="", price=499.0,
+                                            stock=args.stock))
+    sync_engine.dispose()
+
+    engine = create_async_db_engine(url)
+    print(f"{args.buyers} buyers, {args.stock} units of one SKU")
+    print(f"{'strategy':<19}{'sold':>6}{'stock':>7}{'oversold':>10}{'lost':>6}{'retries':>9}"
+          f"{'max':>5}{'gave up':>9}{'p95 ms':>9}{'buyers/s':>10}")
+    try:
+        for name, strategy in STRATEGIES.items():
+            result = await run(engine, strategy, args)
+            print(f"{name:<19}{result['sold']:>6}{result['final_stock']:>7}{result['oversold']:>10}"
+                  f"{result['lost_updates']:>6}{result['retries']:>9}{result['max_retries']:>5}"
+                  f"{result['gave_up']:>9}{result['p95_ms']:>9.1f}{result['rps']:>10.0f}")
+            if name == "cart hold":
+                released, stock = await sweep_holds(engine)
+                print(f"{'':<19}{released} expired holds swept; stock back to {stock}"
+                      f"{'' if stock == args.stock else ' (MISMATCH)'}")
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inventory contention benchmark")
+    parser.add_argument("--buyers", type=int, default=500)
+    parser.add_argument("--stock", type=int, default=100)
+    parser.add_argument("--max-retries", type=int, default=20)
+    parser.add_argument("--backoff", type=float, default=0.001, help="first retry backoff, seconds")
+    parser.add_argument("--backoff-cap", type=float, default=0.05, help="largest retry backoff, seconds")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Microbenchmark: rendering a product listing through the standard
+response_model path vs the FAST_JSON orjson path.
+
+Both paths start from the row dicts the catalog service returns. The
+standard path validates one pydantic Product per row, runs the list through
+jsonable_encoder and encodes it with json; the fast path projects the rows
+onto the schema fields and encodes them with orjson. The benchmark checks
+that both produce the same bytes before timing them.
+
+Usage (from backend/):
+    python -m benchmarks.bench_serialization --rows 10000 --iterations 20
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from app.api.routes.products import ProductSchema, _render
+from app.db.seed import BRANDS, COLORS, FEATURES, STORAGE
+from app.utils.serialization import dump_products, fast_json_available
+
+
+def make_rows(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    epoch = datetime(2024, 1, 1)
+    rows = []
+    for i in range(1, count + 1):
+        brand = rng.choice(list(BRANDS))
+        model = rng.choice(BRANDS[brand])
+        rows.append({
+            "id": i,
+            "name": f"{brand} {model} {rng.choice(STORAGE)}GB {rng.choice(COLORS)}",
+            "description": f"{brand} {model} with {', '.join(rng.sample(FEATURES, 3))}.",
+            "price": round(rng.uniform(79, 1999), 2),
+            "stock": rng.randint(0, 500),
+            "image_url": None,
+            "updated_at": epoch + timedelta(seconds=rng.randint(0, 10_000_000), microseconds=rng.randint(0, 999_999)),
+            "version": rng.randint(1, 20),
+        })
+    return rows
+
+
+def standard(rows):
+    return _render([ProductSchema(**p) for p in rows])
+
+
+def median_time(fn, rows, iterations: int) -> float:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(rows)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Product listing serialization microbenchmark")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    if not fast_json_available():
+        raise SystemExit("orjson is not installed (pip install orjson)")
+
+    print(f"{'rows':>7}{'standard ms':>13}{'fast ms':>10}{'speedup':>9}{'bytes':>10}")
+    for count in args.rows:
+        rows = make_rows(count)
+        body = dump_products(rows)
+        if body != standard(rows):
+            raise SystemExit(f"Outputs differ at {count} rows")
+        standard_time = median_time(standard, rows, args.iterations)
+        fast_time = median_time(dump_products, rows, args.iterations)
+        print(f"{count:>7}{standard_time * 1e3:>13.2f}{fast_time * 1e3:>10.2f}"
+              f"{standard_time / fast_time:>8.1f}x{len(body):>10}")
+
+
+if __name__ == "__main__":
+    main()
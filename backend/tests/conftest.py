@@ -0,0 +1,22 @@
+import os
+import tempfile
+
+import pytest
+
+# Point the app at a throwaway database before app.db.database is imported
+_db_dir = tempfile.mkdtemp(prefix="phone-ecommerce-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+
+
+@pytest.fixture
+def query_budget():
+    """
+    `with query_budget(3): client.get(...)` fails the test when the block runs
+    more than 3 statements (or, with max_repeats, repeats one statement too often).
+    """
+    from app.db.database import async_engine, engine
+    from app.db.query_log import assert_query_budget
+
+    def budget(max_queries, max_repeats=None):
+        return assert_query_budget(max_queries, engine, async_engine.sync_engine, max_repeats=max_repeats)
+    return budget
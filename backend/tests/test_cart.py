@@ -4,22 +4,224 @@ from app.main import app
 
 client = TestClient(app)
 
+
 def test_add_to_cart():
     response = client.post("/api/cart", json={"product_id": 1, "quantity": 2})
     assert response.status_code == 200
     assert response.json() == {"message": "Product added to cart", "cart_id": 1}
 
+
 def test_get_cart():
     response = client.get("/api/cart")
     assert response.status_code == 200
     assert isinstance(response.json(), list)
 
+
 def test_remove_from_cart():
     response = client.delete("/api/cart/1")
     assert response.status_code == 200
     assert response.json() == {"message": "Product removed from cart"}
 
+
 def test_update_cart_item():
     response = client.put("/api/cart/1", json={"quantity": 3})
     assert response.status_code == 200
-    assert response.json() == {"message": "Cart item updated"}
\ No newline at end of file
+    assert response.json() == {"message": "Cart item updated"}
+
+
+def test_carts_are_per_user_and_persisted():
+    from app.services.cart_service import cart_store
+
+    client.post("/api/cart/", json={"product_id": 7, "quantity": 1}, headers={"X-User-Id": "101"})
+    client.post("/api/cart/", json={"product_id": 7, "quantity": 2}, headers={"X-User-Id": "101"})
+    client.post("/api/cart/", json={"product_id": 8, "quantity": 1}, headers={"X-User-Id": "102"})
+
+    # Drop the in-memory working set so the carts are reloaded from the database
+    cart_store.clear()
+
+    items = client.get("/api/cart/", headers={"X-User-Id": "101"}).json()
+    assert [(i["product_id"], i["quantity"]) for i in items] == [(7, 3)]
+    items = client.get("/api/cart/", headers={"X-User-Id": "102"}).json()
+    assert [(i["product_id"], i["quantity"]) for i in items] == [(8, 1)]
+
+    response = client.put("/api/cart/9", json={"items": [{"product_id": 9, "quantity": 1}]}, headers={"X-User-Id": "101"})
+    assert response.status_code == 404
+
+
+def test_anonymous_clients_get_their_own_carts(monkeypatch):
+    from app.services import cart_service
+    from app.utils.cache import LRUCache
+
+    first, second = TestClient(app), TestClient(app)
+    first.post("/api/cart/", json={"product_id": 1, "quantity": 1})
+    second.post("/api/cart/", json={"product_id": 2, "quantity": 4})
+    assert first.cookies.get("cart_session") != second.cookies.get("cart_session")
+    assert [(i["product_id"], i["quantity"]) for i in first.get("/api/cart/").json()] == [(1, 1)]
+    assert [(i["product_id"], i["quantity"]) for i in second.get("/api/cart/").json()] == [(2, 4)]
+
+    # Another worker (with its own working set) changes the cart; this one must not serve its stale copy
+    local_store = cart_service.cart_store
+    monkeypatch.setattr(cart_service, "cart_store", LRUCache())
+    first.put("/api/cart/1", json={"items": [{"product_id": 1, "quantity": 3}]})
+    first.post("/api/cart/", json={"product_id": 2, "quantity": 1})
+    monkeypatch.setattr(cart_service, "cart_store", local_store)
+    assert [(i["product_id"], i["quantity"]) for i in first.get("/api/cart/").json()] == [(1, 3), (2, 1)]
+
+
+def test_cart_prices_resolved_in_one_query():
+    from sqlalchemy import event, select
+    from app.db.database import SessionLocal, async_engine
+    from app.models.cart import Cart
+
+    headers = {"X-User-Id": "201"}
+    products = [
+        client.post("/api/products/", json={
+            "name": f"Cart Phone {i}",
+            "description": "Cart pricing test phone.",
+            "price": 100.0 * (i + 1),
+            "stock": 10,
+        }).json()
+        for i in range(5)
+    ]
+    for product in products:
+        client.post("/api/cart/", json={"product_id": product["id"], "quantity": 2}, headers=headers)
+    assert client.get("/api/cart/total", headers=headers).json() == {"total": 3000.0}
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        items = client.get("/api/cart/", headers=headers).json()
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+    assert [i["price"] for i in items] == [100.0, 200.0, 300.0, 400.0, 500.0]
+    assert sum(1 for s in statements if "FROM products" in s) == 1
+
+    client.put(f"/api/cart/{products[0]['id']}", json={"items": [{"product_id": products[0]["id"], "quantity": 5}]}, headers=headers)
+    client.delete(f"/api/cart/{products[4]['id']}", headers=headers)
+    assert client.get("/api/cart/total", headers=headers).json() == {"total": 2300.0}
+
+    client.put(f"/api/products/{products[1]['id']}", json={
+        "name": "Cart Phone 1",
+        "description": "Cart pricing test phone.",
+        "price": 250.0,
+        "stock": 10,
+    })
+    def stored_total():
+        with SessionLocal() as db:
+            return db.scalar(select(Cart.total_price).where(Cart.user_id == 201))
+
+    statements.clear()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        assert client.get("/api/cart/total", headers=headers).json() == {"total": 2400.0}
+        assert [i["subtotal"] for i in client.get("/api/cart/", headers=headers).json()][:2] == [500.0, 500.0]
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", listener)
+    # Reads report the re-priced total without writing it...
+    assert not [s for s in statements if not s.lstrip().upper().startswith("SELECT")]
+    assert stored_total() == 2300.0
+    # ...the next change to the cart stores it
+    client.post("/api/cart/", json={"product_id": products[2]["id"], "quantity": 1}, headers=headers)
+    assert stored_total() == 2700.0
+    assert client.get("/api/cart/total", headers=headers).json() == {"total": 2700.0}
+
+
+def test_cart_holds_stock_until_released_or_expired():
+    import asyncio
+    from datetime import datetime, timedelta
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.db.database import DATABASE_URL, create_async_db_engine
+    from app.services.inventory_service import InventoryService
+    from app.services.product_service import catalog_payloads, catalog_version
+
+    product = client.post("/api/products/", json={
+        "name": "Held Phone", "description": "reservations", "price": 50.0, "stock": 5,
+    }).json()
+    bystander = client.post("/api/products/", json={
+        "name": "Bystander Phone", "description": "reservations", "price": 60.0, "stock": 5,
+    }).json()
+    client.get(f"/api/products/{bystander['id']}")
+    version = catalog_version.value
+    url = f"/api/products/{product['id']}"
+    line = lambda quantity: {"product_id": product["id"], "quantity": quantity}
+    stock = lambda: client.get(url).json()["stock"]
+
+    assert client.post("/api/cart/", json=line(3), headers={"X-User-Id": "301"}).status_code == 200
+    assert stock() == 2
+    assert client.post("/api/cart/", json=line(3), headers={"X-User-Id": "302"}).status_code == 409
+    client.put(f"/api/cart/{product['id']}", json={"items": [line(1)]}, headers={"X-User-Id": "301"})
+    assert stock() == 4
+
+    # Naming user 301 in the body doesn't let another client use up their hold
+    client.post("/api/orders/", json={"user_id": 301, "items": [line(1)]}, headers={"X-User-Id": "304"})
+    assert stock() == 3
+    # Their own order uses up the cart's hold instead of taking the stock a second time
+    client.post("/api/orders/", json={"user_id": 301, "items": [line(1)]}, headers={"X-User-Id": "301"})
+    assert stock() == 3
+
+    # Guest carts don't hold stock
+    assert TestClient(app).post("/api/cart/", json=line(3)).status_code == 200
+    assert stock() == 3
+
+    client.post("/api/cart/", json=line(2), headers={"X-User-Id": "303"})
+    assert stock() == 1
+
+    async def sweep():
+        engine = create_async_db_engine(DATABASE_URL)
+        try:
+            async with AsyncSession(engine) as db:
+                return await InventoryService(db).release_expired(now=datetime.utcnow() + timedelta(days=1))
+        finally:
+            await engine.dispose()
+    assert asyncio.run(sweep()) >= 1
+    assert stock() == 3
+
+    # Holds and the sweep only drop the cached entries of the products whose stock moved
+    assert catalog_version.value == version
+    assert catalog_payloads.get(("product", version, bystander["id"])) is not None
+
+
+def test_guest_cart_rows_are_created_on_write_and_swept_when_idle():
+    import asyncio
+    from datetime import datetime, timedelta
+    from sqlalchemy import func, select
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from app.db.database import DATABASE_URL, SessionLocal, create_async_db_engine
+    from app.models.cart import Cart, CartItem
+    from app.services.cart_service import delete_idle_guest_carts
+
+    def carts():
+        with SessionLocal() as db:
+            return db.scalar(select(func.count(Cart.id)))
+
+    before = carts()
+    # Cookie-less reads (crawlers, first page views) store nothing
+    for _ in range(3):
+        reader = TestClient(app)
+        assert reader.get("/api/cart/").json() == []
+        assert reader.get("/api/cart/total").json() == {"total": 0}
+        assert reader.put("/api/cart/1", json={"items": [{"product_id": 1, "quantity": 2}]}).status_code == 404
+        assert reader.delete("/api/cart/").status_code == 200
+    assert carts() == before
+
+    guest = TestClient(app)
+    guest.post("/api/cart/", json={"product_id": 1, "quantity": 1})
+    assert carts() == before + 1
+    client.post("/api/cart/", json={"product_id": 1, "quantity": 1}, headers={"X-User-Id": "401"})
+
+    async def sweep(days):
+        engine = create_async_db_engine(DATABASE_URL)
+        try:
+            async with AsyncSession(engine) as db:
+                return await delete_idle_guest_carts(db, now=datetime.utcnow() + timedelta(days=days))
+        finally:
+            await engine.dispose()
+    assert asyncio.run(sweep(1)) == 0
+    assert asyncio.run(sweep(31)) >= 1
+    # The idle guest cart and its items are gone; the user's cart stays
+    assert guest.get("/api/cart/").json() == []
+    with SessionLocal() as db:
+        assert db.scalar(select(func.count(Cart.id)).where(Cart.guest_token.isnot(None))) == 0
+        assert db.scalar(select(func.count(CartItem.id)).where(~CartItem.cart_id.in_(select(Cart.id)))) == 0
+    assert [i["product_id"] for i in client.get("/api/cart/", headers={"X-User-Id": "401"}).json()] == [1]
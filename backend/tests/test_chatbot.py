@@ -1,15 +1,258 @@
+import asyncio
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
+from app.services.chatbot_service import chatbot_service
 
 client = TestClient(app)
 
+
 def test_chatbot_response():
     response = client.post("/api/chat", json={"message": "Hello, how can I help you?"})
     assert response.status_code == 200
     assert "response" in response.json()
 
+
 def test_chatbot_invalid_input():
     response = client.post("/api/chat", json={"message": ""})
     assert response.status_code == 400
-    assert response.json() == {"detail": "Message cannot be empty."}
\ No newline at end of file
+    assert response.json() == {"detail": "Message cannot be empty."}
+
+
+def test_intent_matching_uses_word_boundaries_and_priority():
+    matcher = chatbot_service.intent_matcher
+    assert matcher.match("Is this shipping soon?") is None
+    assert matcher.match("hi there").name == "greeting"
+    # Several intents mentioned: the highest-priority one wins
+    assert matcher.match("What does the Galaxy camera cost compared to an iPhone?").name == "apple"
+    assert matcher.match("How   much is it?").name == "price"
+
+
+def test_chat_history_is_per_session_and_bounded():
+    from app.services.chatbot_service import ChatHistoryStore, ChatMessage
+
+    now = [0.0]
+    store = ChatHistoryStore(max_messages_per_session=3, max_total_messages=5, idle_ttl=10, clock=lambda: now[0])
+    for i in range(4):
+        store.append("alice", ChatMessage(user="User", message=f"a{i}"))
+    assert [m.message for m in store.get("alice")] == ["a1", "a2", "a3"]
+
+    now[0] = 1
+    store.append("bob", ChatMessage(user="User", message="b0"))
+    store.append("bob", ChatMessage(user="User", message="b1"))
+    store.append("carol", ChatMessage(user="User", message="c0"))
+    # 6 messages > cap of 5: the least recently used session (alice) goes
+    assert store.get("alice") == []
+    assert store.stats()["messages"] == 3
+
+    now[0] = 20
+    store.append("dave", ChatMessage(user="User", message="d0"))
+    assert store.get("bob") == [] and store.get("carol") == []
+    assert store.stats()["sessions"] == 1
+
+
+def test_chat_endpoint_keeps_history_per_user():
+    client.post("/api/chat", json={"message": "hello", "user_id": "history-user"})
+    history = chatbot_service.get_history("history-user")
+    assert [m.user for m in history] == ["User", "Bot"]
+    assert chatbot_service.get_history("someone-else") == []
+
+
+def test_chat_answers_come_from_catalog():
+    product = client.post("/api/products/", json={
+        "name": "Zorblax Phone X",
+        "description": "A zorblax handset with a huge battery.",
+        "price": 1.5,
+        "stock": 5,
+    }).json()
+
+    response = client.post("/api/chat", json={"message": "Tell me about the zorblax"})
+    body = response.json()
+    assert "Zorblax Phone X ($1.50)" in body["response"]
+    assert body["retrieval_ms"] is not None
+
+    response = client.post("/api/chat", json={"message": "What is your cheapest phone?"})
+    assert response.json()["response"].splitlines()[1] == "- Zorblax Phone X ($1.50)"
+
+    client.delete(f"/api/products/{product['id']}")
+    response = client.post("/api/chat", json={"message": "Tell me about the zorblax"})
+    assert "Zorblax" not in response.json()["response"]
+
+
+def test_product_index_incremental_updates():
+    from app.services.retrieval_service import ProductIndex
+
+    index = ProductIndex(dim=256)
+    for i in range(40):
+        index.upsert({"id": i + 1, "name": f"Filler {i}", "description": "generic phone", "price": 100 + i})
+    index.upsert({"id": 99, "name": "Galaxy Fold", "description": "foldable screen", "price": 1800})
+    assert index.search("foldable galaxy", k=1).products[0]["id"] == 99
+
+    index.upsert({"id": 99, "name": "Galaxy Fold", "description": "foldable screen", "price": 50})
+    assert index.cheapest(1).products[0]["price"] == 50
+
+    index.remove(99)
+    assert all(p["id"] != 99 for p in index.search("foldable galaxy", k=5).products)
+    assert len(index) == 40
+
+
+def test_chat_responses_are_memoized_per_catalog_version():
+    first = chatbot_service.get_response("What's your CHEAPEST phone?")
+    second = chatbot_service.get_response("  what's your cheapest   phone ")
+    assert not first.cached and second.cached
+    assert second.response == first.response
+
+    client.post("/api/products/", json={
+        "name": "Memo Phone",
+        "description": "Cache invalidation test phone.",
+        "price": 0.5,
+        "stock": 1,
+    })
+    third = chatbot_service.get_response("what's your cheapest phone?")
+    assert not third.cached
+    assert "Memo Phone" in third.response
+    assert client.get("/api/chatbot/stats").json()["response_cache"]["hits"] >= 1
+
+
+def _sse_events(body: str):
+    events = []
+    for frame in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_chat_stream_sends_start_chunks_and_done():
+    with client.stream("POST", "/api/chat/stream", json={"message": "hello", "user_id": "sse"}) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = _sse_events(response.read().decode())
+
+    assert events[0] == ("start", {"session_id": "sse"})
+    assert events[-1][0] == "done"
+    chunks = [data["delta"] for event, data in events if event == "chunk"]
+    assert len(chunks) > 1
+    answer = client.post("/api/chat", json={"message": "hello"}).json()["response"]
+    assert "".join(chunks) == answer
+
+    history = chatbot_service.get_history("sse")
+    assert [m.user for m in history] == ["User", "Bot"]
+    assert history[-1].message == answer
+
+
+def test_chat_stream_stops_and_skips_history_when_closed_early():
+    async def consume_one_chunk():
+        stream = chatbot_service.stream_response("hello", "sse-cancelled")
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(consume_one_chunk())
+    history = chatbot_service.get_history("sse-cancelled")
+    assert [m.user for m in history] == ["User"]
+
+
+def test_concurrency_limiter_queues_then_rejects():
+    from fastapi import HTTPException
+    from app.utils.concurrency import ConcurrencyLimiter
+
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+        await limiter.acquire()
+
+        # Second caller queues and gets the slot once it is released
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.waiting == 1
+
+        # Queue full: rejected immediately
+        with pytest.raises(HTTPException) as full:
+            await limiter.acquire()
+        assert full.value.status_code == 429 and full.value.headers["Retry-After"] == "1"
+
+        limiter.release()
+        await waiter
+        assert limiter.in_flight == 1 and limiter.waiting == 0
+
+        # Nobody releases: the queued caller times out
+        with pytest.raises(HTTPException) as timeout:
+            await limiter.acquire()
+        assert timeout.value.status_code == 503 and "Retry-After" in timeout.value.headers
+
+        limiter.release()
+        assert limiter.in_flight == 0
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats["admitted"], stats["rejected"], stats["timed_out"]) == (2, 1, 1)
+
+
+def test_chat_overload_returns_429_while_catalog_stays_up(monkeypatch):
+    from app.utils.concurrency import ConcurrencyLimiter
+
+    limiter = ConcurrencyLimiter(max_in_flight=1, max_queue=0, queue_timeout=1)
+    monkeypatch.setattr(chatbot_service, "limiter", limiter)
+    asyncio.run(limiter.acquire())  # every slot busy
+
+    for path, body in (("/api/chat", {"message": "hello"}),
+                       ("/api/chat/stream", {"message": "hello"}),
+                       ("/api/chatbot/chat", {"user_message": "hello"})):
+        response = client.post(path, json=body)
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+    assert client.get("/api/products/").status_code == 200
+
+    limiter.release()
+    assert client.post("/api/chat", json={"message": "hello"}).status_code == 200
+    assert limiter.in_flight == 0
+
+
+def test_product_index_picks_up_other_workers_writes(monkeypatch):
+    from sqlalchemy import delete, insert, update
+    from app.db.database import SessionLocal
+    from app.models.product import Product
+    from app.services.retrieval_service import product_index
+
+    product_index.refresh()
+    monkeypatch.setattr(product_index, "refresh_interval", 0)
+    # Written straight to the database, as another worker would: this process's index isn't told
+    with SessionLocal() as db:
+        cheap = db.execute(insert(Product).values(
+            name="Quuxphone Lite", description="quux budget handset", price=0.01, stock=3,
+        ).returning(Product.id)).scalar_one()
+        db.commit()
+    assert product_index.cheapest(1).products[0]["id"] == cheap
+    assert product_index.search("quuxphone", k=1).products[0]["id"] == cheap
+
+    with SessionLocal() as db:
+        db.execute(update(Product).where(Product.id == cheap).values(stock=0))
+        db.commit()
+    assert product_index.cheapest(1).products[0]["id"] != cheap
+
+    with SessionLocal() as db:
+        db.execute(delete(Product).where(Product.id == cheap))
+        db.commit()
+    assert all(p["id"] != cheap for p in product_index.search("quuxphone", k=3).products)
+
+
+def test_product_index_stores_sparse_rows_and_upserts_in_batches():
+    from app.services.retrieval_service import ProductIndex
+
+    index = ProductIndex(max_features=16)
+    index.rebuild([])
+    index.upsert_many([
+        {"id": i + 1, "name": f"Model {i}", "description": f"phone number {i} with a camera", "price": 100 + i}
+        for i in range(1000)
+    ] + [{"id": 5000, "name": "Pixel Fold", "description": "foldable camera phone", "price": 1700, "stock": 0}])
+    # Memory per product is max_features buckets and weights, however many buckets queries use
+    assert index._weights.shape[1] == 16 and index._weights.nbytes + index._buckets.nbytes < 1001 * 16 * 8 * 1.5
+    assert len(index) == 1001 and index.search("pixel fold", k=1).products[0]["id"] == 5000
+    assert index.cheapest(1).products[0]["id"] == 1  # the sold-out fold is skipped
+
+    version = index.version
+    index.upsert_many([{"id": 5000, "name": "Pixel Fold", "description": "foldable camera phone", "price": 1700, "stock": 0}])
+    assert index.version == version  # unchanged rows are not re-embedded
+    index.remove(5000)
+    assert all(p["id"] != 5000 for p in index.search("pixel fold", k=3).products)
+    assert index._df.min() >= 0
@@ -0,0 +1,227 @@
+import asyncio
+import os
+import tempfile
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.db.database import (
+    DATABASE_URL, create_async_db_engine, create_db_engine, engine, engine_options,
+)
+
+
+def test_engines_follow_settings():
+    assert DATABASE_URL == settings.DATABASE_URL == os.environ["DATABASE_URL"]
+    assert str(engine.url) == DATABASE_URL
+    assert engine.pool.size() == settings.DB_POOL_SIZE
+
+    options = engine_options("sqlite:///./some.db")
+    assert options["pool_size"] == settings.DB_POOL_SIZE
+    assert options["connect_args"]["cached_statements"] == settings.SQLITE_STATEMENT_CACHE_SIZE
+    # An in-memory database is a single connection, so there is no pool to size
+    assert "pool_size" not in engine_options("sqlite://")
+    assert "connect_args" not in engine_options("postgresql://user@localhost/db")
+
+
+def test_sqlite_pragmas_applied_to_sync_and_async_connections():
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pragmas.db')}"
+    pragmas = [text(f"PRAGMA {name}") for name in ("journal_mode", "synchronous", "mmap_size", "cache_size")]
+    expected = ("wal", 1, settings.SQLITE_MMAP_SIZE, settings.SQLITE_CACHE_SIZE)  # synchronous 1 = NORMAL
+
+    sync_engine = create_db_engine(url)
+    with sync_engine.connect() as conn:
+        assert tuple(conn.execute(pragma).scalar() for pragma in pragmas) == expected
+    sync_engine.dispose()
+
+    async def check():
+        async_engine = create_async_db_engine(url)
+        async with async_engine.connect() as conn:
+            values = tuple([(await conn.execute(pragma)).scalar() for pragma in pragmas])
+        await async_engine.dispose()
+        return values
+    assert asyncio.run(check()) == expected
+
+
+def test_replica_selection():
+    from app.db.routing import ReplicaRouter
+
+    urls = [f"sqlite:///{os.path.join(tempfile.mkdtemp(), f'r{i}.db')}" for i in range(3)]
+    round_robin = ReplicaRouter(urls)
+    assert [round_robin.choose().url for _ in range(4)] == urls + urls[:1]
+
+    least_loaded = ReplicaRouter(urls, "least_loaded")
+    least_loaded.replicas[0].in_flight = 2
+    least_loaded.replicas[2].in_flight = 1
+    assert {least_loaded.choose().url for _ in range(3)} == {urls[1]}
+
+    assert ReplicaRouter([]).choose() is None
+
+
+def test_reads_go_to_replicas_except_right_after_a_write(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.db import routing
+    from app.main import app
+
+    replica_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'replica.db')}"
+    writer, reader = TestClient(app), TestClient(app)
+    writer.post("/api/products/", json={"name": "Replicated", "description": "r", "price": 1.0, "stock": 1})
+    assert routing.refresh_sqlite_replicas(DATABASE_URL, [replica_url])
+
+    router = routing.ReplicaRouter([replica_url])
+    monkeypatch.setattr(routing, "replica_router", router)
+    try:
+        replicated = reader.get("/api/products/", params={"name_prefix": "Replicated"})
+        assert len(replicated.json()) == 1 and router.replicas[0].sessions == 1
+
+        # The replica copy doesn't have the new product yet; only its writer reads from the primary
+        created = writer.post("/api/products/", json={"name": "Fresh", "description": "f", "price": 1.0, "stock": 1})
+        assert routing.STICKY_COOKIE in created.cookies
+        url = f"/api/products/{created.json()['id']}"
+        assert reader.get(url).status_code == 404
+        assert writer.get(url).status_code == 200
+        assert router.replicas[0].sessions == 2 and router.replicas[0].in_flight == 0
+    finally:
+        asyncio.run(router.dispose())
+
+def test_clients_read_back_their_own_writes_through_the_caches(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.db import routing
+    from app.main import app
+
+    replica_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'replica.db')}"
+    writer, reader = TestClient(app), TestClient(app)
+    product = writer.post("/api/products/", json={
+        "name": "Lagging", "description": "l", "price": 10.0, "stock": 1,
+    }).json()
+    assert routing.refresh_sqlite_replicas(DATABASE_URL, [replica_url])
+
+    router = routing.ReplicaRouter([replica_url])
+    monkeypatch.setattr(routing, "replica_router", router)
+    url = f"/api/products/{product['id']}"
+    listing = {"name_prefix": "Lagging"}
+    try:
+        writer.put(url, json={"name": "Lagging", "description": "l", "price": 20.0, "stock": 1})
+        # Another client reads the replica copy, which hasn't caught up yet...
+        assert reader.get(url).json()["price"] == 10.0
+        assert reader.get("/api/products/", params=listing).json()[0]["price"] == 10.0
+        assert router.replicas[0].sessions == 2
+        # ...which must not end up in the caches the writer reads through
+        assert writer.get(url).json()["price"] == 20.0
+        assert writer.get("/api/products/", params=listing).json()[0]["price"] == 20.0
+    finally:
+        asyncio.run(router.dispose())
+
+# Schema of a database created before this series (the original models, as create_all() built them)
+BASELINE_SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR UNIQUE, email VARCHAR UNIQUE,"
+    " hashed_password VARCHAR, is_active BOOLEAN)",
+    "CREATE TABLE products (id INTEGER PRIMARY KEY, name VARCHAR(255), description TEXT, price FLOAT,"
+    " stock INTEGER, image_url VARCHAR(500))",
+    "CREATE TABLE carts (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (id), total_price INTEGER)",
+    "CREATE TABLE cart_items (id INTEGER PRIMARY KEY, cart_id INTEGER REFERENCES carts (id),"
+    " product_id INTEGER REFERENCES products (id), quantity INTEGER)",
+    "CREATE TABLE orders (id INTEGER PRIMARY KEY, user_id INTEGER REFERENCES users (id),"
+    " total_amount FLOAT NOT NULL, status VARCHAR)",
+    "CREATE TABLE order_items (id INTEGER PRIMARY KEY, order_id INTEGER REFERENCES orders (id),"
+    " product_id INTEGER REFERENCES products (id), quantity INTEGER NOT NULL)",
+    "CREATE INDEX ix_products_id ON products (id)",
+    "CREATE INDEX ix_products_name ON products (name)",
+    "INSERT INTO products (name, description, price, stock) VALUES ('Old Phone', 'From before the upgrade', 99.0, 3)",
+    "INSERT INTO carts (user_id, total_price) VALUES (NULL, 0)",
+]
+
+def baseline_engine():
+    db_engine = create_db_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'baseline.db')}")
+    with db_engine.begin() as conn:
+        for statement in BASELINE_SCHEMA:
+            conn.execute(text(statement))
+    return db_engine
+
+def test_init_db_upgrades_a_database_missing_columns():
+    from sqlalchemy import inspect
+    from app.db.database import Base, init_db
+
+    db_engine = baseline_engine()
+    try:
+        init_db(db_engine)
+        inspector = inspect(db_engine)
+        for table in Base.metadata.sorted_tables:
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            assert {column.name for column in table.columns} <= columns, table.name
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            assert {index.name for index in table.indexes} <= indexes, table.name
+        # Running it again on the upgraded database is a no-op
+        init_db(db_engine)
+    finally:
+        db_engine.dispose()
+
+def test_init_db_indexes_updated_at_on_an_existing_products_table():
+    from sqlalchemy import inspect
+    from app.db.database import init_db
+
+    db_engine = baseline_engine()
+    try:
+        init_db(db_engine)
+        indexes = {index["name"]: index["column_names"] for index in inspect(db_engine).get_indexes("products")}
+        assert indexes["ix_products_updated_at"] == ["updated_at"]
+        with db_engine.connect() as conn:
+            # Rows from before the upgrade have no updated_at; the chatbot's index reads them on its first full load
+            rows = conn.execute(text("SELECT name, updated_at, version FROM products")).all()
+        assert [tuple(row) for row in rows] == [("Old Phone", None, 1)]
+    finally:
+        db_engine.dispose()
+
+def test_init_db_adds_guest_carts_to_an_existing_carts_table():
+    import pytest
+    from sqlalchemy import inspect
+    from sqlalchemy.exc import IntegrityError
+    from app.db.database import init_db
+
+    db_engine = baseline_engine()
+    try:
+        init_db(db_engine)
+        indexes = {index["name"]: index for index in inspect(db_engine).get_indexes("carts")}
+        assert indexes["ux_carts_guest_token"]["column_names"] == ["guest_token"]
+        assert indexes["ux_carts_guest_token"]["unique"]
+        with db_engine.begin() as conn:
+            assert conn.execute(text("SELECT guest_token, version FROM carts")).one() == (None, 1)
+            conn.execute(text("INSERT INTO carts (guest_token, total_price) VALUES ('guest', 0)"))
+        with pytest.raises(IntegrityError), db_engine.begin() as conn:
+            conn.execute(text("INSERT INTO carts (guest_token, total_price) VALUES ('guest', 0)"))
+    finally:
+        db_engine.dispose()
+
+def test_seed_create_tables_upgrades_an_existing_database(monkeypatch):
+    from sqlalchemy import inspect
+    from app.db import seed
+
+    db_engine = baseline_engine()
+    monkeypatch.setattr(seed, "engine", db_engine)
+    try:
+        seed.create_tables()
+        columns = {column["name"] for column in inspect(db_engine).get_columns("products")}
+        assert {"updated_at", "version"} <= columns
+    finally:
+        db_engine.dispose()
+
+def test_product_delete_keeps_the_read_your_writes_cookie(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app.db import routing
+    from app.main import app
+
+    replica_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'replica.db')}"
+    writer = TestClient(app)
+    product = writer.post("/api/products/", json={"name": "Doomed", "description": "d", "price": 1.0, "stock": 1}).json()
+    assert routing.refresh_sqlite_replicas(DATABASE_URL, [replica_url])
+
+    router = routing.ReplicaRouter([replica_url])
+    monkeypatch.setattr(routing, "replica_router", router)
+    try:
+        response = TestClient(app).delete(f"/api/products/{product['id']}")
+        assert response.status_code == 204 and response.content == b""
+        assert routing.STICKY_COOKIE in response.cookies
+        # The deleter's next read goes to the primary, not the replica that still has the row
+        deleter = TestClient(app, cookies=response.cookies)
+        assert deleter.get(f"/api/products/{product['id']}").status_code == 404
+    finally:
+        asyncio.run(router.dispose())
@@ -0,0 +1,40 @@
+import re
+
+from fastapi.testclient import TestClient
+from app.main import app
+
+client = TestClient(app)
+
+def _sample(body: str, name: str, **labels) -> float:
+    """Value of one sample from a Prometheus text exposition."""
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = "^" + re.escape(f"{name}{{{label_text}}}" if labels else name) + r" (\S+)$"
+    match = re.search(pattern, body, re.MULTILINE)
+    assert match, f"{name} {labels} not found"
+    return float(match.group(1))
+
+def test_metrics_record_routes_statuses_and_db_queries():
+    before = client.get("/metrics").text
+    assert "# TYPE http_request_duration_seconds histogram" in before
+
+    for _ in range(3):
+        assert client.get("/api/orders/", params={"limit": 5}).status_code == 200
+    client.get("/api/products/999999")
+    client.get("/no/such/path")
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+
+    orders = {"method": "GET", "route": "/api/orders/"}
+    assert _sample(body, "http_request_duration_seconds_count", **orders) >= 3
+    assert _sample(body, "http_requests_total", **orders, status="200") >= 3
+    # Each order listing runs a fixed number of queries, all attributed to the route
+    assert _sample(body, "http_request_db_queries_sum", **orders) >= 3
+    assert _sample(body, "http_request_db_seconds_total", **orders) > 0
+
+    product = {"method": "GET", "route": "/api/products/{product_id}", "status": "404"}
+    assert _sample(body, "http_requests_total", **product) >= 1
+    assert _sample(body, "http_requests_total", method="GET", route="unmatched", status="404") >= 1
+    assert _sample(body, "http_requests_in_flight") == 1  # the /metrics request itself
+    assert _sample(body, "db_query_duration_seconds_count") > 0
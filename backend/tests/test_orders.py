@@ -0,0 +1,112 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+client = TestClient(app)
+
+def _create_product(name, price, stock):
+    return client.post("/api/products/", json={
+        "name": name,
+        "description": "Order test phone.",
+        "price": price,
+        "stock": stock,
+    }).json()
+
+def test_create_order_decrements_stock_in_one_transaction(query_budget):
+    products = [_create_product(f"Order Phone {i}", 100.0 + i, 10) for i in range(4)]
+    items = [{"product_id": p["id"], "quantity": 2} for p in products]
+
+    # The same statement count as a one-item order: nothing runs per item
+    with query_budget(7, max_repeats=1) as queries:
+        response = client.post("/api/orders/", json={"user_id": 1, "items": items})
+    statements = queries.statements
+
+    assert response.status_code == 201
+    order = response.json()
+    assert order["total_amount"] == pytest.approx(2 * (100 + 101 + 102 + 103))
+    assert sorted((i["product_id"], i["quantity"]) for i in order["items"]) == sorted(
+        (p["id"], 2) for p in products
+    )
+    assert sum(1 for s in statements if s.startswith("UPDATE products")) == 1
+    assert sum(1 for s in statements if s.startswith("INSERT INTO order_items")) == 1
+
+    for product in products:
+        assert client.get(f"/api/products/{product['id']}").json()["stock"] == 8
+
+def test_create_order_fails_atomically_when_out_of_stock():
+    plenty = _create_product("Plenty Phone", 200.0, 10)
+    scarce = _create_product("Scarce Phone", 300.0, 1)
+
+    response = client.post("/api/orders/", json={"user_id": 1, "items": [
+        {"product_id": plenty["id"], "quantity": 3},
+        {"product_id": scarce["id"], "quantity": 2},
+    ]})
+    assert response.status_code == 409
+    assert str(scarce["id"]) in response.json()["detail"]
+    assert client.get(f"/api/products/{plenty['id']}").json()["stock"] == 10
+    assert client.get(f"/api/products/{scarce['id']}").json()["stock"] == 1
+
+    response = client.post("/api/orders/", json={"user_id": 1, "items": [
+        {"product_id": 999999, "quantity": 1},
+    ]})
+    assert response.status_code == 404
+
+def test_order_listing_uses_fixed_number_of_queries(query_budget):
+    products = [_create_product(f"Listing Phone {i}", 50.0 + i, 100) for i in range(3)]
+    for i in range(6):
+        client.post("/api/orders/", json={"user_id": 42, "items": [
+            {"product_id": p["id"], "quantity": 1 + i % 2} for p in products[: 1 + i % 3]
+        ]})
+
+    with query_budget(3, max_repeats=1):
+        small = client.get("/api/orders/", params={"user_id": 42, "limit": 1})
+    with query_budget(3, max_repeats=1):
+        large = client.get("/api/orders/", params={"user_id": 42, "limit": 6})
+    assert len(small.json()) == 1 and len(large.json()) == 6
+    assert all(item["product"]["name"].startswith("Listing Phone")
+               for order in large.json() for item in order["items"])
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"user_id": 42, "limit": 4}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/orders/", params=params)
+        seen.extend(order["id"] for order in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == sorted(seen, reverse=True) and len(seen) == 6
+
+    with query_budget(3, max_repeats=1):
+        detail = client.get(f"/api/orders/{seen[0]}")
+    assert detail.status_code == 200
+
+def test_order_routes_stay_within_query_budget(query_budget):
+    product = _create_product("Budget Phone", 10.0, 100)
+    for _ in range(5):
+        client.post("/api/orders/", json={"user_id": 77, "items": [{"product_id": product["id"], "quantity": 1}]})
+
+    with query_budget(3, max_repeats=1):
+        assert len(client.get("/api/orders/", params={"user_id": 77}).json()) == 5
+    # Create: cart holds consumed, stock decrement, order and items inserts, then the 3-query reload
+    with query_budget(7, max_repeats=1):
+        client.post("/api/orders/", json={"user_id": 77, "items": [{"product_id": product["id"], "quantity": 1}]})
+
+def test_order_only_invalidates_the_products_it_took_stock_from():
+    from app.services.product_service import catalog_payloads, catalog_version
+
+    ordered = _create_product("Invalidated Phone", 20.0, 5)
+    other = _create_product("Untouched Phone", 30.0, 5)
+    listing = {"name_prefix": "Invalidated Phone", "in_stock": True}
+    assert client.get("/api/products/", params=listing).json()[0]["stock"] == 5
+    client.get(f"/api/products/{other['id']}")
+    version = catalog_version.value
+
+    client.post("/api/orders/", json={"user_id": 1, "items": [{"product_id": ordered["id"], "quantity": 5}]})
+    assert catalog_version.value == version
+    assert catalog_payloads.get(("product", version, other["id"])) is not None
+    assert client.get(f"/api/products/{ordered['id']}").json()["stock"] == 0
+    assert client.get("/api/products/", params=listing).json() == []
@@ -1,3 +1,7 @@
+import csv
+import io
+import json
+
 import pytest
 from fastapi.testclient import TestClient
 from app.main import app
@@ -40,4 +44,311 @@ def test_delete_product():
     response = client.delete("/api/products/1")
     assert response.status_code == 204
     response = client.get("/api/products/1")
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_get_products_keyset_pagination():
+    for i in range(5):
+        client.post("/api/products/", json={
+            "name": f"Paged Phone {i}",
+            "description": "Pagination test phone.",
+            "price": 100.0 + (i % 2),
+            "stock": i,
+        })
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "sort": "price", "name_prefix": "Paged Phone"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/products/", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= 2
+        seen.extend(page)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert len(seen) == 5
+    keys = [(p["price"], p["id"]) for p in seen]
+    assert keys == sorted(keys)
+
+    response = client.get("/api/products/", params={"name_prefix": "Paged Phone", "in_stock": True, "min_price": 101})
+    assert all(p["stock"] > 0 and p["price"] >= 101 for p in response.json())
+    assert len(response.json()) == 2
+
+
+def test_get_products_invalid_cursor():
+    response = client.get("/api/products/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def test_product_cache_invalidated_on_write():
+    created = client.post("/api/products/", json={
+        "name": "Cached Phone",
+        "description": "Cache test phone.",
+        "price": 500.0,
+        "stock": 3,
+    }).json()
+
+    before = client.get("/api/products/cache/stats").json()
+    client.get(f"/api/products/{created['id']}")
+    client.get(f"/api/products/{created['id']}")
+    after = client.get("/api/products/cache/stats").json()
+    # The repeat read is served from the rendered-payload cache in front of the row cache
+    assert after["payloads"]["hits"] >= before["payloads"]["hits"] + 1
+
+    client.put(f"/api/products/{created['id']}", json={
+        "name": "Cached Phone v2",
+        "description": "Cache test phone.",
+        "price": 450.0,
+        "stock": 3,
+    })
+    assert client.get("/api/products/cache/stats").json()["catalog_version"] > after["catalog_version"]
+    assert client.get(f"/api/products/{created['id']}").json()["name"] == "Cached Phone v2"
+
+
+def test_search_products():
+    client.post("/api/products/", json={
+        "name": "Searchable Zephyrphone",
+        "description": "Phone with a periscope camera.",
+        "price": 650.0,
+        "stock": 4,
+    })
+    other = client.post("/api/products/", json={
+        "name": "Plain Phone",
+        "description": "Mentions zephyrphone only in the description.",
+        "price": 300.0,
+        "stock": 4,
+    }).json()
+
+    response = client.get("/api/products/search", params={"q": "zephyr"})
+    assert response.status_code == 200
+    names = [p["name"] for p in response.json()]
+    assert names == ["Searchable Zephyrphone", "Plain Phone"]
+
+    client.put(f"/api/products/{other['id']}", json={
+        "name": "Plain Phone",
+        "description": "No longer matches.",
+        "price": 300.0,
+        "stock": 4,
+    })
+    response = client.get("/api/products/search", params={"q": "zephyr", "limit": 1})
+    assert [p["name"] for p in response.json()] == ["Searchable Zephyrphone"]
+
+def test_bulk_import_ndjson_reports_bad_rows():
+    body = "\n".join([
+        '{"name": "Bulk A", "description": "imported", "price": 10, "stock": 1}',
+        '{"name": "Bulk B", "description": "imported", "price": "not a price", "stock": 1}',
+        '',
+        'not json',
+        '{"name": "Bulk C", "description": "imported", "price": 30, "stock": 3, "image_url": "c.png"}',
+    ])
+    response = client.post(
+        "/api/products/import?batch_size=1",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    summary = response.json()
+    assert (summary["imported"], summary["failed"], summary["batches"]) == (2, 2, 2)
+    assert [error["line"] for error in summary["errors"]] == [2, 4]
+    assert "price" in summary["errors"][0]["error"]
+
+    found = client.get("/api/products/", params={"name_prefix": "Bulk "}).json()
+    assert [p["name"] for p in found] == ["Bulk A", "Bulk C"]
+
+def test_bulk_import_csv_and_export_round_trip():
+    body = (
+        "name,description,price,stock\r\n"
+        'Csv One,"multi\nline, quoted",5.5,2\r\n'
+        "Csv Two,short,abc,1\r\n"
+        "Csv Three,short,7\r\n"
+    )
+    summary = client.post(
+        "/api/products/import", content=body, headers={"Content-Type": "text/csv"}
+    ).json()
+    assert summary["imported"] == 1
+    assert [error["line"] for error in summary["errors"]] == [4, 5]
+
+    with client.stream("GET", "/api/products/export", params={"format": "csv", "batch_size": 2}) as response:
+        assert response.headers["content-type"].startswith("text/csv")
+        exported = response.read().decode()
+    rows = list(csv.DictReader(io.StringIO(exported)))
+    assert rows[0].keys() == {"id", "name", "description", "price", "stock", "image_url", "updated_at", "version"}
+    assert [int(row["id"]) for row in rows] == sorted(int(row["id"]) for row in rows)
+    csv_one = next(row for row in rows if row["name"] == "Csv One")
+    assert csv_one["description"] == "multi\nline, quoted"
+
+    lines = client.get("/api/products/export", params={"batch_size": 2}).text.splitlines()
+    assert len(lines) == len(rows)
+    assert json.loads(lines[0])["id"] == int(rows[0]["id"])
+
+def test_product_detail_conditional_get():
+    product = client.post("/api/products/", json={
+        "name": "ETag Phone", "description": "conditional get", "price": 321.0, "stock": 4,
+    }).json()
+    url = f"/api/products/{product['id']}"
+
+    first = client.get(url)
+    etag, modified = first.headers["ETag"], first.headers["Last-Modified"]
+    assert first.headers["Cache-Control"].startswith("public")
+    assert first.json()["updated_at"]
+
+    unchanged = client.get(url, headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304 and unchanged.content == b""
+    assert unchanged.headers["ETag"] == etag
+    assert client.get(url, headers={"If-Modified-Since": modified}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": '"other"', "If-Modified-Since": modified}).status_code == 200
+
+    client.put(url, json={"name": "ETag Phone", "description": "conditional get", "price": 300.0, "stock": 4})
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert changed.json()["price"] == 300.0
+
+    # Stock decremented by an order (a Core UPDATE) also changes the row version
+    client.post("/api/orders/", json={"user_id": 5, "items": [{"product_id": product["id"], "quantity": 1}]})
+    assert client.get(url, headers={"If-None-Match": changed.headers["ETag"]}).status_code == 200
+
+def test_product_list_conditional_get():
+    params = {"limit": 2, "name_prefix": "Cond "}
+    for i in range(3):
+        client.post("/api/products/", json={
+            "name": f"Cond {i}", "description": "list etag", "price": 10.0 + i, "stock": 1,
+        })
+    first = client.get("/api/products/", params=params)
+    etag = first.headers["ETag"]
+    assert "Last-Modified" not in first.headers
+
+    unchanged = client.get("/api/products/", params=params, headers={"If-None-Match": f'{etag[2:]}, "x"'})
+    assert unchanged.status_code == 304
+    assert unchanged.headers["X-Next-Cursor"] == first.headers["X-Next-Cursor"]
+
+    second_page = client.get("/api/products/", params={**params, "cursor": first.headers["X-Next-Cursor"]})
+    assert second_page.headers["ETag"] != etag
+
+    client.delete(f"/api/products/{first.json()[0]['id']}")
+    assert client.get("/api/products/", params=params, headers={"If-None-Match": etag}).status_code == 200
+
+def test_catalog_responses_are_compressed_and_cached():
+    for i in range(20):
+        client.post("/api/products/", json={
+            "name": f"Gzip Phone {i}", "description": "A long description. " * 20, "price": 100.0 + i, "stock": 1,
+        })
+    params = {"name_prefix": "Gzip Phone", "limit": 20}
+
+    plain = client.get("/api/products/", params=params, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    stats = client.get("/api/products/cache/stats").json()["payloads"]
+    compressed = client.get("/api/products/", params=params, headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert compressed.json() == plain.json()  # the client decodes transparently
+    # Every encoding carries the same representation, so they share one weak validator
+    assert compressed.headers["ETag"] == plain.headers["ETag"] and plain.headers["ETag"].startswith('W/"')
+    revalidated = client.get("/api/products/", params=params,
+                             headers={"Accept-Encoding": "br", "If-None-Match": compressed.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert int(compressed.headers["content-length"]) < len(plain.content) / 4
+    assert client.get("/api/products/cache/stats").json()["payloads"]["hits"] > stats["hits"]
+
+    # Other responses are compressed by the middleware; small ones are left alone
+    search = client.get("/api/products/search", params={"q": "gzip phone"}, headers={"Accept-Encoding": "gzip"})
+    assert search.headers["content-encoding"] == "gzip"
+    health = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in health.headers
+
+    # Cached payloads render exactly what response_model serialization produces
+    by_id = lambda products: sorted(products, key=lambda p: p["id"])
+    assert by_id(search.json()) == by_id(plain.json())
+
+def test_fast_json_renders_identical_bytes(monkeypatch):
+    from datetime import datetime
+    from app.api.routes import products as product_routes
+    from app.utils.serialization import dump_products
+
+    rows = [
+        {"id": 1, "name": "Ünïcode \"phone\" 📱", "description": "line\nbreak\ttab\x7f", "price": 999.99,
+         "stock": 3, "image_url": None, "updated_at": datetime(2024, 5, 1, 12, 30, 15, 123456), "version": 4},
+        {"id": 2, "name": "Free", "description": "", "price": 0.0, "stock": 0,
+         "image_url": "x.png", "updated_at": None, "version": 1},
+    ]
+    standard = product_routes._render([product_routes.ProductSchema(**p) for p in rows])
+    assert dump_products(rows) == standard
+    # Exponent-notation floats are left to the standard path
+    assert dump_products([{**rows[1], "price": 1e16}]) is None
+
+    for i in range(3):
+        client.post("/api/products/", json={
+            "name": f"Orjson Phone {i}", "description": "fast path", "price": 10.5 * (i + 1), "stock": i,
+        })
+    params = {"q": "orjson phone"}
+    slow = client.get("/api/products/search", params=params)
+    monkeypatch.setattr(product_routes.settings, "FAST_JSON", True)
+    fast = client.get("/api/products/search", params=params)
+    assert fast.status_code == 200 and len(fast.json()) == 3
+    assert fast.content == slow.content
+    assert fast.headers["ETag"] == slow.headers["ETag"]
+
+def test_update_product_rejects_stale_version():
+    product = client.post("/api/products/", json={
+        "name": "Versioned Phone", "description": "optimistic lock", "price": 10.0, "stock": 10,
+    }).json()
+    url = f"/api/products/{product['id']}"
+    assert product["version"] == 1
+
+    body = {"name": "Versioned Phone", "description": "optimistic lock", "price": 12.0, "stock": 10, "version": 1}
+    assert client.put(url, json=body).json()["version"] == 2
+    stale = client.put(url, json={**body, "price": 13.0})
+    assert stale.status_code == 409
+
+    # An order taking stock moves the version too, so a PUT based on the old stock is refused
+    client.post("/api/orders/", json={"user_id": 5, "items": [{"product_id": product["id"], "quantity": 1}]})
+    assert client.put(url, json={**body, "version": 2}).status_code == 409
+    assert client.get(url).json()["stock"] == 9
+
+def test_update_without_version_never_overwrites_a_concurrent_change(monkeypatch):
+    from sqlalchemy import update
+    from app.db.database import engine
+    from app.models.product import Product
+    from app.services.product_service import AsyncProductService
+
+    product = client.post("/api/products/", json={
+        "name": "Contended Phone", "description": "lost update", "price": 10.0, "stock": 10,
+    }).json()
+    url = f"/api/products/{product['id']}"
+
+    load = AsyncProductService._get_product_row
+    async def load_then_sell(self, product_id):
+        row = await load(self, product_id)
+        with engine.begin() as conn:  # another worker's order takes stock in between
+            conn.execute(update(Product).where(Product.id == product_id)
+                         .values(stock=Product.stock - 1, version=Product.version + 1))
+        return row
+    monkeypatch.setattr(AsyncProductService, "_get_product_row", load_then_sell)
+    body = {"name": "Contended Phone", "description": "lost update", "price": 11.0, "stock": 10}
+    assert client.put(url, json=body).status_code == 409
+    monkeypatch.undo()
+
+    current = client.get(url).json()
+    assert (current["stock"], current["price"]) == (9, 10.0)
+
+def test_bulk_import_retries_a_rejected_batch_row_by_row():
+    body = "\n".join([
+        '{"name": "Retry A", "description": "imported", "price": 10, "stock": 1}',
+        '{"name": "Retry B", "description": "imported", "price": 20, "stock": 100000000000000000000}',
+        '{"name": "Retry C", "description": "imported", "price": 30, "stock": 3}',
+    ])
+    response = client.post(
+        "/api/products/import",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    summary = response.json()
+    assert (summary["imported"], summary["failed"], summary["batches"]) == (2, 1, 1)
+    assert summary["errors"] == [{"line": 2, "error": "Python int too large to convert to SQLite INTEGER"}]
+
+    found = client.get("/api/products/", params={"name_prefix": "Retry "}).json()
+    assert [p["name"] for p in found] == ["Retry A", "Retry C"]
@@ -0,0 +1,71 @@
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from app.db.query_log import NPlusOneDetector, assert_query_budget, enable_query_log
+from app.utils.metrics import MetricsMiddleware, MetricsRegistry, instrument_engine
+
+def _engine():
+    # One shared in-memory database, also visible from the threadpool
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text("INSERT INTO items (name) VALUES ('a'), ('b'), ('c')"))
+    return engine
+
+def test_query_budget_reports_overruns_and_repeated_statements():
+    engine = _engine()
+    with engine.connect() as conn:
+        with assert_query_budget(1, engine):
+            conn.execute(text("SELECT * FROM items")).all()
+
+        with pytest.raises(AssertionError, match="at most 2 queries, got 3"):
+            with assert_query_budget(2, engine):
+                for i in range(3):
+                    conn.execute(text("SELECT name FROM items WHERE id = :id"), {"id": i}).all()
+
+        with pytest.raises(AssertionError, match="ran 3 times"):
+            with assert_query_budget(10, engine, max_repeats=1):
+                for i in range(3):
+                    conn.execute(text("SELECT name FROM items WHERE id = :id"), {"id": i}).all()
+
+def test_slow_queries_are_logged_with_their_plan(caplog):
+    engine = _engine()
+    enable_query_log(engine, slow_query_ms=0)
+    with caplog.at_level(logging.WARNING, logger="app.db.query_log"):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT name FROM items WHERE id = :id"), {"id": 1}).all()
+    message = caplog.records[-1].getMessage()
+    assert message.startswith("Slow query")
+    assert "SEARCH items USING INTEGER PRIMARY KEY" in message
+
+def test_diagnostics_share_the_metrics_timing_hooks():
+    engine = _engine()
+    instrument_engine(engine)
+    enable_query_log(engine, slow_query_ms=1000)
+    enable_query_log(engine, slow_query_ms=2000)
+    # One pair of timing listeners, however many diagnostics are enabled
+    assert len(engine.dispatch.before_cursor_execute) == 1
+    assert len(engine.dispatch.after_cursor_execute) == 1
+
+def test_n_plus_one_detector_warns_per_request(caplog):
+    from fastapi import FastAPI
+
+    engine = _engine()
+    instrument_engine(engine)
+    api = FastAPI()
+
+    @api.get("/items")
+    def list_items():
+        with engine.connect() as conn:
+            return [conn.execute(text("SELECT name FROM items WHERE id = :id"), {"id": i}).scalar()
+                    for i in range(1, 4)]
+
+    client = TestClient(MetricsMiddleware(api, MetricsRegistry(), request_observers=[NPlusOneDetector(3)]))
+    with caplog.at_level(logging.WARNING, logger="app.db.query_log"):
+        assert client.get("/items").json() == ["a", "b", "c"]
+    assert any("Possible N+1: GET /items ran the same statement 3 times" in r.getMessage()
+               for r in caplog.records)
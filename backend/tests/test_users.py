@@ -0,0 +1,30 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.main import app
+from app.db.database import engine
+
+client = TestClient(app)
+
+
+def test_user_routes_run_on_the_async_session():
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        created = client.post("/api/users/", json={
+            "username": "async-user", "email": "async-user@example.com", "password": "secret",
+        })
+        assert created.status_code == 201
+        user_id = created.json()["id"]
+        assert client.post("/api/users/", json={
+            "username": "other", "email": "async-user@example.com", "password": "secret",
+        }).status_code == 400
+        assert client.get(f"/api/users/{user_id}").json()["username"] == "async-user"
+        assert user_id in [u["id"] for u in client.get("/api/users/").json()]
+        assert client.delete(f"/api/users/{user_id}").status_code == 200
+        assert client.get(f"/api/users/{user_id}").status_code == 404
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    # Nothing went through the blocking sync engine
+    assert statements == []
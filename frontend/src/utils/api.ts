@@ -23,6 +23,14 @@ async function fetchApi<T>(
   endpoint: string,
   options: RequestInit = {}
 ): Promise<T> {
+  return (await fetchApiWithHeaders<T>(endpoint, options)).data;
+}
+
+// Same as fetchApi, but also returns the response headers
+async function fetchApiWithHeaders<T>(
+  endpoint: string,
+  options: RequestInit = {}
+): Promise<{ data: T; headers: Headers }> {
   const url = `${API_BASE_URL}${endpoint}`;
   
   const defaultHeaders: HeadersInit = {
@@ -30,6 +38,8 @@ async function fetchApi<T>(
   };
 
   const config: RequestInit = {
+    // Send cookies cross-origin too: anonymous carts are identified by the cart_session cookie
+    credentials: 'include',
     ...options,
     headers: {
       ...defaultHeaders,
@@ -58,10 +68,10 @@ async function fetchApi<T>(
 
     // Handle empty responses (204 No Content)
     if (response.status === 204) {
-      return {} as T;
+      return { data: {} as T, headers: response.headers };
     }
 
-    return await response.json();
+    return { data: await response.json(), headers: response.headers };
   } catch (error) {
     if (error instanceof ApiError) {
       throw error;
@@ -75,6 +85,20 @@ async function fetchApi<T>(
   }
 }
 
+// Keyset-paginated listings return one page at a time; follow X-Next-Cursor to the last page
+async function fetchAllPages<T>(endpoint: string, pageSize = 1000): Promise<T[]> {
+  const items: T[] = [];
+  let cursor: string | null = null;
+  do {
+    const params = new URLSearchParams({ limit: String(pageSize) });
+    if (cursor) params.set('cursor', cursor);
+    const { data, headers } = await fetchApiWithHeaders<T[]>(`${endpoint}?${params}`);
+    items.push(...data);
+    cursor = headers.get('X-Next-Cursor');
+  } while (cursor);
+  return items;
+}
+
 // ============ PRODUCT API ============
 
 export interface Product {
@@ -104,7 +128,7 @@ export interface ProductUpdate {
 }
 
 export const productApi = {
-  getAll: () => fetchApi<Product[]>('/products/'),
+  getAll: () => fetchAllPages<Product>('/products/'),
   
   getById: (id: number) => fetchApi<Product>(`/products/${id}`),
   
@@ -121,7 +145,7 @@ export const productApi = {
     }),
   
   delete: (id: number) =>
-    fetchApi<{ message: string }>(`/products/${id}`, {
+    fetchApi<void>(`/products/${id}`, {
       method: 'DELETE',
     }),
 };